@@ -2,8 +2,10 @@
 """
 Affinity Installer - Unified Single-File Version
 Complete installer with GUI frontend and bash backend in one file
-No external dependencies except PyQt6 (auto-installed)
+No external dependencies except PyQt6 (auto-installed, GUI only)
 Version 5
+
+Run with --headless for unattended installs; that path never imports Qt.
 """
 
 import os
@@ -11,22 +13,15 @@ import sys
 import subprocess
 import shutil
 import tempfile
+import threading
+import time
+import select
+import json
+import argparse
+import shlex
 from pathlib import Path
 import re
 
-# Auto-install PyQt6 if missing
-try:
-    from PyQt6.QtWidgets import *
-    from PyQt6.QtCore import *
-    from PyQt6.QtGui import *
-except ImportError:
-    print("Installing PyQt6...")
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "--user", "PyQt6"])
-    from PyQt6.QtWidgets import *
-    from PyQt6.QtCore import *
-    from PyQt6.QtGui import *
-
-
 # ============================================================================
 # EMBEDDED BASH SCRIPT
 # ============================================================================
@@ -65,7 +60,7 @@ INSTALL_DIR="$HOME/.AffinityOnLinux"
 WINEPREFIX="$INSTALL_DIR"
 
 # Unified log file
-LOG_FILE="$HOME/affinity_install_$(date +%Y%m%d_%H%M%S).log"
+printf -v LOG_FILE '%s/affinity_install_%(%Y%m%d_%H%M%S)T.log' "$HOME" -1
 
 # Overall progress tracking
 TOTAL_STEPS=10
@@ -86,867 +81,5744 @@ PHOTO_EXISTS=false
 DESIGNER_EXISTS=false
 PUBLISHER_EXISTS=false
 
+# Machine-readable event stream (JSON lines), see emit_event
+EVENT_FD=""
+EVENT_PROTOCOL=1
+EVENT_SEQ=0
+CURRENT_PHASE=""
+PHASE_STACK=()
+
 # Optional component flags (from GUI)
 ENABLE_DXVK=false
 ENABLE_VULKAN=false
 ENABLE_TAHOMA=false
 
+# Artifact cache (shared by every prefix on this machine, or a fleet via NFS)
+CACHE_DIR="${XDG_CACHE_HOME:-$HOME/.cache}/AffinityOnLinux"
+CACHE_MAX_MB=4096
+OFFLINE=false
+
+# Golden prefix snapshots (defaults to $CACHE_DIR/golden once the cache is set up)
+GOLDEN_DIR=""
+GOLDEN_FORMAT="v1"
+EXPORT_GOLDEN=false
+
+# PROBE_* variables from the Python SystemProbe (see --probe-file)
+PROBE_FILE=""
+
+# Python interpreter and installer file, for calling back into Python helpers
+PYTHON_BIN=""
+SELF_PATH=""
+
+# Keep the extracted MSIX payload in the cache for other prefixes even where
+# it cannot be reflinked (set for batch installs)
+SHARE_PAYLOAD=false
+
+# Shader cache archive (from --shader-cache export) to seed the prefix with
+SHADER_CACHE_SEED=""
+
+# Settings tree merged into AppData/Roaming/Affinity (see --deploy-settings)
+SETTINGS_PROFILE=""
+
 # ==========================================
 # GUI Output Functions
 # ==========================================
 
+# With --event-fd, progress and messages go out as JSON events instead of
+# the PROGRESS:/SUCCESS:/ERROR:/INFO: prefixed stdout lines.
+
 gui_progress() {
     local percent=$1
     local message=$2
     CURRENT_PROGRESS=$percent
-    if [ "$GUI_MODE" = true ]; then
+    if [ -n "$EVENT_FD" ]; then
+        emit_event progress percent:=$percent message="$message"
+    elif [ "$GUI_MODE" = true ]; then
         echo "PROGRESS:${percent}:${message}"
     fi
 }
 
 gui_success() {
-    if [ "$GUI_MODE" = true ]; then
+    if [ -n "$EVENT_FD" ]; then
+        emit_event log level=success message="$1"
+    elif [ "$GUI_MODE" = true ]; then
         echo "SUCCESS:$1"
     fi
 }
 
 gui_error() {
-    if [ "$GUI_MODE" = true ]; then
+    if [ -n "$EVENT_FD" ]; then
+        emit_event log level=error message="$1"
+    elif [ "$GUI_MODE" = true ]; then
         echo "ERROR:$1"
     fi
 }
 
 gui_info() {
-    if [ "$GUI_MODE" = true ]; then
+    if [ -n "$EVENT_FD" ]; then
+        emit_event log level=info message="$1"
+    elif [ "$GUI_MODE" = true ]; then
         echo "INFO:$1"
     fi
 }
 
+# ==========================================
+# Event Stream
+# ==========================================
+#
+# One JSON object per line on $EVENT_FD, kept apart from the human log:
+#
+#   {"v":1,"seq":7,"ts":1700000000.123456,"type":"progress","phase":"dependencies",
+#    "percent":25,"message":"Installing dotnet48 (3/5)"}
+#
+# Types: start (pid, log_file), progress, log (level, message), phase_start
+# and phase_end (write_bytes, and exit_code on phase_end), download (name,
+# bytes, cached) and exit (exit_code, log_file; last event).
+
+# Sets JSON_ESCAPED to $1 escaped for use inside a JSON string
+json_escape() {
+    local s="$1"
+    s=${s//\\/\\\\}
+    s=${s//\"/\\\"}
+    s=${s//$'\n'/\\n}
+    s=${s//$'\r'/\\r}
+    s=${s//$'\t'/\\t}
+    s=${s//$'\e'/\\u001b}
+    JSON_ESCAPED=$s
+}
+
+# emit_event TYPE [key=string]... [key:=raw-json]...
+emit_event() {
+    [ -n "$EVENT_FD" ] || return 0
+
+    local type="$1"
+    shift
+    local ts=${EPOCHREALTIME:-$(date +%s)}
+    local field key
+
+    EVENT_SEQ=$((EVENT_SEQ + 1))
+    json_escape "$CURRENT_PHASE"
+    local json="{\"v\":$EVENT_PROTOCOL,\"seq\":$EVENT_SEQ,\"ts\":${ts/,/.},\"type\":\"$type\",\"phase\":\"$JSON_ESCAPED\""
+
+    for field in "$@"; do
+        key=${field%%=*}
+        if [[ "$key" == *: ]]; then
+            json+=",\"${key%:}\":${field#*=}"
+        else
+            json_escape "${field#*=}"
+            json+=",\"$key\":\"$JSON_ESCAPED\""
+        fi
+    done
+
+    printf '%s}\n' "$json" >&"$EVENT_FD"
+}
+
+# Sets IO_WRITE_BYTES to the bytes this shell and its reaped children have
+# written to storage, read without forking
+io_write_bytes() {
+    local key value
+    IO_WRITE_BYTES=0
+    [ -r "/proc/$$/io" ] || return 0
+    while read -r key value; do
+        if [ "$key" = "write_bytes:" ]; then
+            IO_WRITE_BYTES=$value
+            return 0
+        fi
+    done < "/proc/$$/io"
+}
+
+phase_begin() {
+    PHASE_STACK+=("$1")
+    CURRENT_PHASE="$1"
+    io_write_bytes
+    emit_event phase_start write_bytes:=$IO_WRITE_BYTES
+}
+
+phase_end() {
+    io_write_bytes
+    emit_event phase_end exit_code:=${1:-0} write_bytes:=$IO_WRITE_BYTES
+    if [ ${#PHASE_STACK[@]} -gt 0 ]; then
+        unset 'PHASE_STACK[-1]'
+    fi
+    CURRENT_PHASE=""
+    if [ ${#PHASE_STACK[@]} -gt 0 ]; then
+        CURRENT_PHASE=${PHASE_STACK[-1]}
+    fi
+}
+
 # ==========================================
 # Logging Functions
 # ==========================================
 
+# Timestamps come from printf's %(...)T, so logging never forks
 log() {
     local message="$1"
-    echo "[$(date '+%Y-%m-%d %H:%M:%S')] $message" | tee -a "$LOG_FILE"
+    local line
+    printf -v line '[%(%Y-%m-%d %H:%M:%S)T] %s' -1 "$message"
+    echo "$line" >> "$LOG_FILE"
+    if [ -n "$EVENT_FD" ]; then
+        # The event carries the message; stdout stays for tool output
+        emit_event log level=info message="$message"
+        return 0
+    fi
+    echo "$line"
     gui_info "$message"
 }
 
 log_command() {
     local command="$1"
-    echo "[$(date '+%Y-%m-%d %H:%M:%S')] COMMAND: $command" >> "$LOG_FILE"
+    printf '[%(%Y-%m-%d %H:%M:%S)T] COMMAND: %s\n' -1 "$command" >> "$LOG_FILE"
     eval "$command" 2>&1 | tee -a "$LOG_FILE"
     local exit_code=${PIPESTATUS[0]}
-    echo "[$(date '+%Y-%m-%d %H:%M:%S')] EXIT CODE: $exit_code" >> "$LOG_FILE"
+    printf '[%(%Y-%m-%d %H:%M:%S)T] EXIT CODE: %s\n' -1 "$exit_code" >> "$LOG_FILE"
     return $exit_code
 }
 
 # ==========================================
-# Interactive Menu Functions (Disabled in GUI mode)
+# Artifact Cache
 # ==========================================
+#
+# Layout of $CACHE_DIR:
+#   objects/<sha256>   downloaded files, addressed by content (read-only)
+#   refs/<sha256(url)> the object digest a URL resolved to
+#   winetricks/        winetricks' own download cache (W_CACHE)
+#   payload/<key>/     extracted MSIX App/ payloads shared between prefixes
+#
+# Objects, winetricks downloads and payloads share one size cap and are
+# evicted least-recently-used first (mtime is bumped on every cache hit).
+# Objects are never modified in place, so they may be hardlinked out.
 
-show_menu() {
-    if [ "$GUI_MODE" = true ]; then
+cache_init() {
+    mkdir -p "$CACHE_DIR/objects" "$CACHE_DIR/refs" "$CACHE_DIR/winetricks"
+    export W_CACHE="$CACHE_DIR/winetricks"
+    GOLDEN_DIR="${GOLDEN_DIR:-$CACHE_DIR/golden}"
+    log "Using artifact cache: $CACHE_DIR (limit ${CACHE_MAX_MB} MB)"
+    if [ "$OFFLINE" = true ]; then
+        log "Offline mode: only cached artifacts will be used"
+    fi
+}
+
+download() {
+    local url="$1"
+    local dest="$2"
+
+    if command -v curl &> /dev/null; then
+        curl --fail --location --silent --show-error --output "$dest" "$url" 2>&1 | tee -a "$LOG_FILE"
+        return ${PIPESTATUS[0]}
+    elif command -v wget &> /dev/null; then
+        wget -q -O "$dest" "$url" 2>&1 | tee -a "$LOG_FILE"
+        return ${PIPESTATUS[0]}
+    fi
+
+    log "ERROR: Neither curl nor wget available"
+    return 1
+}
+
+# place_file SOURCE TARGET [--link] - copy a file, or a directory's contents,
+# with reflinks or in-kernel copies (Python FilePlacer); --link also allows
+# hardlinks, for sources that are never modified in place
+place_file() {
+    if [ -n "$PYTHON_BIN" ] && [ -f "$SELF_PATH" ]; then
+        "$PYTHON_BIN" "$SELF_PATH" --place "$1" "$2" $3 2>&1 | tee -a "$LOG_FILE"
+        return ${PIPESTATUS[0]}
+    fi
+    if [ -d "$1" ]; then
+        mkdir -p "$2" && cp -r --reflink=auto "$1/." "$2/"
+    else
+        cp --reflink=auto --remove-destination "$1" "$2"
+    fi
+}
+
+# cache_fetch URL DEST [NAME] - copy URL's content to DEST, downloading only
+# on a miss. With an empty DEST the file is only cached. Sets CACHE_OBJECT to
+# the (read-only) cache object holding it.
+cache_fetch() {
+    local url="$1"
+    local dest="$2"
+    local name=${3:-$(basename "$dest")}
+    local ref="$CACHE_DIR/refs/$(printf '%s' "$url" | sha256sum | cut -d' ' -f1)"
+    local digest=""
+
+    [ -f "$ref" ] && read -r digest < "$ref"
+
+    if [ -n "$digest" ] && [ -f "$CACHE_DIR/objects/$digest" ]; then
+        if [ "$(sha256sum "$CACHE_DIR/objects/$digest" | cut -d' ' -f1)" = "$digest" ]; then
+            CACHE_OBJECT="$CACHE_DIR/objects/$digest"
+            touch "$CACHE_OBJECT"
+            chmod a-w "$CACHE_OBJECT"
+            if [ -n "$dest" ]; then
+                place_file "$CACHE_OBJECT" "$dest" --link > /dev/null || return 1
+            fi
+            log "Cache hit: $name (${digest:0:12})"
+            emit_event download name="$name" bytes:=$(stat -c %s "$CACHE_OBJECT") cached:=true
+            return 0
+        fi
+        log "Cached $name is corrupt, discarding"
+        rm -f "$CACHE_DIR/objects/$digest"
+    fi
+
+    if [ "$OFFLINE" = true ]; then
+        log "ERROR: $name is not in the cache and offline mode is enabled"
+        return 1
+    fi
+
+    local partial="$CACHE_DIR/objects/.partial.$$.$name"
+    if ! download "$url" "$partial"; then
+        rm -f "$partial"
+        return 1
+    fi
+
+    digest=$(sha256sum "$partial" | cut -d' ' -f1)
+    chmod a-w "$partial"
+    mv -f "$partial" "$CACHE_DIR/objects/$digest"
+    echo "$digest" > "$ref"
+    CACHE_OBJECT="$CACHE_DIR/objects/$digest"
+    if [ -n "$dest" ]; then
+        place_file "$CACHE_OBJECT" "$dest" --link > /dev/null || return 1
+    fi
+    log "Cached $name (${digest:0:12})"
+    emit_event download name="$name" bytes:=$(stat -c %s "$CACHE_OBJECT") cached:=false
+
+    cache_evict
+    return 0
+}
+
+# Mark the winetricks downloads of the given verbs as recently used
+cache_touch_verbs() {
+    local verb
+    for verb in "$@"; do
+        [ -d "$W_CACHE/$verb" ] && find "$W_CACHE/$verb" -type f -exec touch {} +
+    done
+    return 0
+}
+
+cache_evict() {
+    if [ "$CACHE_MAX_MB" -le 0 ]; then
         return 0
     fi
-    
-    local title="$1"
-    shift
-    local options=("$@")
-    local selected=0
-    local key
 
-    while true; do
-        clear
-        echo -e "${CYAN}━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━${NC}"
-        echo -e "${CYAN}$title${NC}"
-        echo -e "${CYAN}━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━${NC}"
-        echo ""
-        
-        for i in "${!options[@]}"; do
-            if [ $i -eq $selected ]; then
-                echo -e "${GREEN}▶ ${options[$i]}${NC}"
+    local limit=$((CACHE_MAX_MB * 1024 * 1024))
+    local total=0
+    local evicted=0
+    local mtime size path
+
+    # Walk newest first; everything past the cap is the least recently used.
+    # A payload is one entry: its .complete marker holds its size in bytes.
+    while read -r mtime size path; do
+        total=$((total + size))
+        if [ "$total" -gt "$limit" ]; then
+            if [[ "$path" == */.complete ]]; then
+                rm -rf -- "${path%/.complete}"
             else
-                echo -e "  ${options[$i]}"
-            fi
-        done
-        
-        echo ""
-        echo -e "${YELLOW}Use ↑/↓ arrows to navigate, Enter to select${NC}"
-        echo -e "${YELLOW}Or type number (1-${#options[@]}) and press Enter${NC}"
-        
-        IFS= read -rsn1 key
-        
-        if [[ $key =~ ^[0-9]$ ]]; then
-            local num=$((key - 1))
-            if [ $num -ge 0 ] && [ $num -lt ${#options[@]} ]; then
-                return $num
+                rm -f -- "$path"
             fi
-        elif [[ $key == $'\x1b' ]]; then
-            read -rsn2 -t 0.1 key
-            case $key in
-                '[A')
-                    ((selected--))
-                    if [ $selected -lt 0 ]; then
-                        selected=$((${#options[@]} - 1))
-                    fi
-                    ;;
-                '[B')
-                    ((selected++))
-                    if [ $selected -ge ${#options[@]} ]; then
-                        selected=0
-                    fi
-                    ;;
-            esac
-        elif [[ $key == "" ]]; then
-            return $selected
+            evicted=$((evicted + 1))
         fi
+    done < <({
+        find "$CACHE_DIR/objects" "$CACHE_DIR/winetricks" -type f ! -name '.partial.*' \
+            -printf '%T@ %s %p\n' 2>/dev/null
+        find "$CACHE_DIR/payload" -mindepth 2 -maxdepth 2 -name .complete \
+            -printf '%T@ %p\n' 2>/dev/null | while read -r mtime path; do
+                read -r size < "$path" && echo "$mtime ${size:-0} $path"
+            done
+    } | sort -rn)
+
+    if [ "$evicted" -gt 0 ]; then
+        find "$CACHE_DIR/winetricks" -mindepth 1 -type d -empty -delete 2>/dev/null
+        log "Evicted $evicted cached file(s) to stay under ${CACHE_MAX_MB} MB"
+    fi
+    return 0
+}
+
+# Directory of curl/wget/aria2c stand-ins that refuse to download, put first
+# on PATH while winetricks runs in offline mode
+offline_guard_dir() {
+    local dir="$CACHE_DIR/.offline-bin"
+    local tool
+    mkdir -p "$dir"
+    for tool in curl wget aria2c; do
+        cat > "$dir/$tool" <<EOF
+#!/bin/sh
+echo "offline mode: refusing to download (\$*)" >&2
+exit 1
+EOF
+        chmod +x "$dir/$tool"
     done
+    echo "$dir"
 }
 
 # ==========================================
-# Wine Installation (Simplified for GUI mode)
+# Golden Prefix Snapshots
 # ==========================================
+#
+# A golden prefix is a fully provisioned prefix (wineboot + all winetricks
+# verbs) exported once to $GOLDEN_DIR and stamped out on other machines.
+# Archives are keyed by snapshot format, Wine build, CPU arch and the exact
+# component list, so a mismatching Wine never restores a stale prefix:
+#
+#   golden-<format>-<wine version>-<key>.tar.zst   (.tar.gz without zstd)
+#
+# Restores unpack each archive once into $CACHE_DIR/golden-staging/<key> and
+# then copy it with "cp -a --reflink=auto", which clones extents on
+# btrfs/XFS and keeps hardlinks inside the tree intact elsewhere.
 
-check_wine_version() {
-    if ! command -v wine &> /dev/null; then
-        log "Wine not found"
+golden_prepare() {
+    probe_wine_id
+    local wine_id=$PROBE_WINE_ID
+    GOLDEN_KEY=$(printf '%s\n' "$GOLDEN_FORMAT" "$wine_id" "$(uname -m)" "$COMPONENTS" | sha256sum | cut -c1-16)
+    GOLDEN_BASE="$GOLDEN_DIR/golden-$GOLDEN_FORMAT-$(echo "${wine_id#wine-}" | tr -c 'A-Za-z0-9.\n' '_')-$GOLDEN_KEY"
+}
+
+golden_find_archive() {
+    local ext
+    for ext in tar.zst tar.gz; do
+        if [ -f "$GOLDEN_BASE.$ext" ]; then
+            echo "$GOLDEN_BASE.$ext"
+            return 0
+        fi
+    done
+    return 1
+}
+
+golden_restore() {
+    if [ -d "$WINEPREFIX" ]; then
         return 1
     fi
-    
-    local wine_version=$(wine --version 2>/dev/null | grep -oE '[0-9]+\.[0-9]+' | head -1)
-    if [ -z "$wine_version" ]; then
-        log "Could not determine Wine version"
+
+    golden_prepare
+    local archive
+    archive=$(golden_find_archive) || return 1
+
+    if [[ "$archive" == *.zst ]] && ! command -v zstd &> /dev/null; then
+        log "Golden prefix $archive found, but zstd is not installed"
         return 1
     fi
-    
-    local major=$(echo "$wine_version" | cut -d. -f1)
-    
-    log "Found Wine version: $wine_version"
-    
-    if [ "$major" -ge 10 ]; then
-        WINE_VERSION_OK=true
+
+    gui_progress 25 "Restoring golden prefix"
+    log "Restoring golden prefix from $archive"
+
+    local staging="$CACHE_DIR/golden-staging/$GOLDEN_KEY"
+
+    # Concurrent batch jobs share the staging tree; one unpacks, the rest wait
+    local lock_fd
+    mkdir -p "$CACHE_DIR/golden-staging"
+    exec {lock_fd}> "$staging.lock"
+    flock "$lock_fd" 2>/dev/null
+
+    if [ ! -f "$staging/.complete" ] || [ "$archive" -nt "$staging/.complete" ]; then
+        rm -rf "$staging"
+        mkdir -p "$staging/prefix"
+        log "Unpacking golden prefix into $staging"
+        if [[ "$archive" == *.zst ]]; then
+            zstd -dc -T0 "$archive" | tar -C "$staging/prefix" -xf -
+        else
+            gzip -dc "$archive" | tar -C "$staging/prefix" -xf -
+        fi
+        local status=("${PIPESTATUS[@]}")
+        if [ "${status[0]}" -ne 0 ] || [ "${status[1]}" -ne 0 ]; then
+            log "ERROR: Failed to unpack $archive"
+            rm -rf "$staging"
+            exec {lock_fd}>&-
+            return 1
+        fi
+        touch "$staging/.complete"
+    fi
+
+    mkdir -p "$(dirname "$WINEPREFIX")"
+    if ! cp -a --reflink=auto "$staging/prefix" "$WINEPREFIX" 2>> "$LOG_FILE"; then
+        log "ERROR: Failed to copy golden prefix into $WINEPREFIX"
+        rm -rf "$WINEPREFIX"
+        exec {lock_fd}>&-
+        return 1
+    fi
+    exec {lock_fd}>&-
+
+    golden_relocate_user
+    log "Golden prefix restored to $WINEPREFIX"
+    return 0
+}
+
+# Point a restored prefix at the current user when it was built by another one
+golden_relocate_user() {
+    local manifest="$WINEPREFIX/.aol-golden"
+    local old_user=$(sed -n 's/^user=//p' "$manifest" 2>/dev/null)
+    local old_home=$(sed -n 's/^home=//p' "$manifest" 2>/dev/null)
+    local users_dir="$WINEPREFIX/drive_c/users"
+
+    if [ -z "$old_user" ] || [ "$old_user" = "$USER" ] || [ ! -d "$users_dir/$old_user" ]; then
         return 0
     fi
-    
-    log "Wine version too old (need 10.0+)"
-    return 1
+
+    log "Relocating golden prefix profile from $old_user to $USER"
+    rm -rf "$users_dir/$USER"
+    mv "$users_dir/$old_user" "$users_dir/$USER"
+    sed -i 's|users\\\\'"$old_user"'\([\\"]\)|users\\\\'"$USER"'\1|gI' \
+        "$WINEPREFIX/user.reg" "$WINEPREFIX/system.reg" "$WINEPREFIX/userdef.reg" 2>/dev/null
+
+    # Desktop, Documents, ... are symlinks into the builder's home directory
+    local link target
+    while IFS= read -r link; do
+        target=$(readlink "$link")
+        if [ -n "$old_home" ] && [[ "$target" == "$old_home"* ]]; then
+            ln -sfn "$HOME${target#$old_home}" "$link"
+        fi
+    done < <(find "$users_dir/$USER" -maxdepth 1 -type l)
+}
+
+golden_export() {
+    golden_prepare
+    mkdir -p "$GOLDEN_DIR"
+
+    gui_info "Exporting golden prefix..."
+    log "Exporting golden prefix (key $GOLDEN_KEY)"
+
+    # Let wineserver exit so the registry files are flushed to disk
+    wineserver_stop
+
+    cat > "$WINEPREFIX/.aol-golden" <<EOF
+format=$GOLDEN_FORMAT
+wine=$PROBE_WINE_ID
+components=$COMPONENTS
+user=$USER
+home=$HOME
+created=$(date -u '+%Y-%m-%dT%H:%M:%SZ')
+EOF
+
+    local out compressor
+    if command -v zstd &> /dev/null; then
+        out="$GOLDEN_BASE.tar.zst"
+        compressor="zstd -T0 -q -10"
+    else
+        out="$GOLDEN_BASE.tar.gz"
+        compressor="gzip -6"
+    fi
+
+    local partial="$out.partial.$$"
+    tar -C "$WINEPREFIX" -cf - . | $compressor > "$partial"
+    local status=("${PIPESTATUS[@]}")
+    if [ "${status[0]}" -ne 0 ] || [ "${status[1]}" -ne 0 ]; then
+        log "ERROR: Failed to export golden prefix"
+        rm -f "$partial"
+        return 1
+    fi
+    mv -f "$partial" "$out"
+
+    log "Golden prefix exported: $out ($(du -h "$out" | cut -f1))"
+    return 0
 }
 
 # ==========================================
-# Winetricks Installation
+# Storage Placement
 # ==========================================
+#
+# Installer temp data goes to WORK_DIR (--work-dir DIR, or "tmpfs" for a
+# RAM-backed directory when enough memory is free); TMPDIR points there for
+# everything the installer runs. With --scratch-dir, the prefix's Windows
+# TEMP/TMP, where Affinity keeps its scratch files, are remapped to a drive
+# letter linked to that directory. Free space is checked before each phase
+# that has work to do; when it runs short, the phase returns
+# NO_SPACE_STATUS and main stops the install after closing the phase.
 
-check_winetricks() {
-    if command -v winetricks &> /dev/null; then
-        log "Winetricks found: $(command -v winetricks)"
-        return 0
+WORK_DIR=""
+WORK_DIR_CREATED=false
+SCRATCH_DIR=""
+# tmpfs is only used with this much room on it and twice that in free RAM
+WORK_DIR_TMPFS_MB=2048
+# Exit status of a step that did not start for lack of disk space
+NO_SPACE_STATUS=75
+
+# Space a phase needs on the prefix's filesystem, in MB; other phases 50
+declare -A PHASE_SPACE_MB=(
+    [dependencies]=1500
+    [verb:dotnet48]=1200
+    [verb:vcrun2022]=150
+    [verb:corefonts]=50
+    [app]=2500
+)
+
+# Print the free space in MB on the filesystem DIR is (or will be) on
+free_space_mb() {
+    local dir=$1
+    while [ ! -e "$dir" ] && [ "$dir" != / ]; do
+        dir=$(dirname "$dir")
+    done
+    df -Pk "$dir" 2>/dev/null | awk 'NR == 2 { print int($4 / 1024) }'
+}
+
+# require_space DIR MB WHAT - fail with a clear message if DIR has less
+# than MB free
+require_space() {
+    local free=$(free_space_mb "$1")
+    if [ -n "$free" ] && [ "$free" -lt "$2" ]; then
+        gui_error "Not enough disk space for $3: ${free} MB free in $1, ${2} MB needed"
+        log "ERROR: $3 needs ${2} MB in $1 but only ${free} MB are free"
+        return 1
     fi
-    
-    if [ -f "$HOME/winetricks" ] && [ -x "$HOME/winetricks" ]; then
-        log "Winetricks found locally: $HOME/winetricks"
-        return 0
+    return 0
+}
+
+# check_phase_space PHASE - called once PHASE is known to run (steps the
+# journal still holds as valid write nothing and are not checked)
+check_phase_space() {
+    require_space "$WINEPREFIX" "${PHASE_SPACE_MB[$1]:-50}" "$1"
+}
+
+# Print a tmpfs directory with room for the work directory, if RAM allows
+tmpfs_work_base() {
+    local available=$(awk '/^MemAvailable:/ { print int($2 / 1024) }' /proc/meminfo 2>/dev/null)
+    if [ -z "$available" ] || [ "$available" -lt $((WORK_DIR_TMPFS_MB * 2)) ]; then
+        return 1
     fi
-    
-    log "Winetricks not found"
+    local dir
+    for dir in "$XDG_RUNTIME_DIR" /dev/shm; do
+        [ -n "$dir" ] && [ -d "$dir" ] && [ -w "$dir" ] || continue
+        [ "$(stat -f -c %T "$dir" 2>/dev/null)" = tmpfs ] || continue
+        if [ "$(free_space_mb "$dir")" -ge "$WORK_DIR_TMPFS_MB" ]; then
+            echo "$dir"
+            return 0
+        fi
+    done
     return 1
 }
 
-# ==========================================
-# Component Installation (Simplified)
-# ==========================================
+setup_work_dir() {
+    local base=${WORK_DIR:-${TMPDIR:-/tmp}}
+    if [ "$WORK_DIR" = tmpfs ]; then
+        if ! base=$(tmpfs_work_base); then
+            base=${TMPDIR:-/tmp}
+            log "Not enough free RAM or tmpfs space for a RAM-backed work directory, using $base"
+        fi
+    fi
 
-install_missing_components() {
-    log "Starting component installation..."
-    
-    gui_progress 15 "Checking for Winetricks"
-    
-    if ! check_winetricks; then
-        gui_error "Winetricks not found. Please install winetricks first."
-        log "ERROR: Winetricks not found"
-        exit 1
+    mkdir -p "$base"
+    if ! WORK_DIR=$(mktemp -d "$base/aol-install.XXXXXX"); then
+        WORK_DIR=${TMPDIR:-/tmp}
+        log "WARNING: cannot create a work directory in $base, using $WORK_DIR"
+        return 0
     fi
-    
-    gui_progress 20 "Creating Wine prefix"
-    
-    if [ ! -d "$WINEPREFIX" ]; then
-        log "Creating Wine prefix at $WINEPREFIX"
-        WINEPREFIX="$WINEPREFIX" wineboot --init 2>&1 | tee -a "$LOG_FILE"
-        sleep 3
-        log "Wine prefix created successfully"
-    else
-        log "Wine prefix already exists"
+    WORK_DIR_CREATED=true
+    export TMPDIR="$WORK_DIR"
+    log "Work directory: $WORK_DIR ($(stat -f -c %T "$WORK_DIR" 2>/dev/null), $(free_space_mb "$WORK_DIR") MB free)"
+}
+
+# Link a drive letter to SCRATCH_DIR and point the prefix's TEMP and TMP,
+# and so Affinity's scratch files, at it
+configure_scratch_dir() {
+    mkdir -p "$SCRATCH_DIR/Temp" "$WINEPREFIX/dosdevices" || return 1
+    require_space "$SCRATCH_DIR" 2048 "Affinity scratch files" || return 1
+
+    # Reuse the letter already linked to SCRATCH_DIR, else take a free one
+    local letter link
+    for letter in t u v w x y; do
+        link="$WINEPREFIX/dosdevices/$letter:"
+        if [ -L "$link" ] && [ "$(readlink "$link")" = "$SCRATCH_DIR" ]; then
+            break
+        fi
+        if [ ! -e "$link" ] && [ ! -L "$link" ]; then
+            ln -s "$SCRATCH_DIR" "$link" || return 1
+            break
+        fi
+        letter=""
+    done
+    if [ -z "$letter" ]; then
+        log "ERROR: no free drive letter for the scratch directory"
+        return 1
     fi
-    
-    gui_progress 25 "Installing dependencies (this may take 30-45 minutes)"
-    
-    log "Installing all dependencies with winetricks"
-    
-    # Base components (always installed)
-    # Note: "webview2" is intentionally absent: winetricks has no such verb
-    # (passing it makes winetricks print its usage text and install nothing),
-    # and installing the WebView2 runtime by other means is known to make
-    # Affinity's onboarding/help dialogs hang under Wine.
-    COMPONENTS="remove_mono vcrun2022 dotnet48 corefonts win11"
-    
-    # Append optional components if enabled
-    if [ "$ENABLE_DXVK" = true ]; then
-        COMPONENTS="$COMPONENTS dxvk"
-        log "Adding DXVK to installation (for stability)"
+
+    local temp="${letter^^}:\\Temp"
+    reg_set 'HKEY_CURRENT_USER\Environment' TEMP "$temp"
+    reg_set 'HKEY_CURRENT_USER\Environment' TMP "$temp"
+    log "Scratch directory $SCRATCH_DIR mapped to $temp"
+}
+
+# ==========================================
+# Wine Server Session
+# ==========================================
+#
+# Every wine, wineboot and winetricks call would otherwise start its own
+# wineserver, which lingers 3 seconds after the last program exits and then
+# shuts down, so each step pays for a cold start. Instead one persistent
+# wineserver (-p) is started per prefix and reused by every step; it is
+# stopped, which writes the registry hives back, before anything reads the
+# prefix from disk, and at exit.
+#
+# winetricks runs "wineserver -w" after each installer, which waits for the
+# server itself to exit. It gets a stand-in through $WINESERVER whose -w
+# waits for the prefix's programs instead (Wine's system processes such as
+# services.exe excepted) and which passes everything else to the real one.
+
+WINESERVER_BIN=""
+WINESERVER_SOCKET=""
+WINESERVER_SHIM=""
+WINESERVER_RUNNING=false
+# Seconds the server stays up after the last program, should we be killed
+WINESERVER_PERSIST=120
+
+# Processes Wine keeps running next to a live server
+WINE_SYSTEM_PROGRAMS=" services.exe winedevice.exe plugplay.exe explorer.exe svchost.exe rpcss.exe conhost.exe "
+
+# True while a Windows program started with this WINEPREFIX is running
+wine_programs_running() {
+    local dir arg0 name var
+    local environ=()
+    for dir in /proc/[0-9]*; do
+        read -r -d '' arg0 2>/dev/null < "$dir/cmdline" || continue
+        name=${arg0##*[\\/]}
+        name=${name,,}
+        [[ "$name" == *.exe ]] || continue
+        [[ "$WINE_SYSTEM_PROGRAMS" == *" $name "* ]] && continue
+        mapfile -d '' -t environ 2>/dev/null < "$dir/environ" || continue
+        for var in "${environ[@]}"; do
+            [ "$var" = "WINEPREFIX=$WINEPREFIX" ] && return 0
+        done
+    done
+    return 1
+}
+
+# Wait until the prefix's programs have exited; the server keeps running
+wineserver_wait() {
+    while wine_programs_running; do
+        sleep 0.2
+    done
+}
+
+wineserver_write_shim() {
+    WINESERVER_SHIM="${WORK_DIR:-${TMPDIR:-/tmp}}/aol-wineserver-$$"
+    {
+        echo '#!/bin/bash'
+        echo '# wineserver stand-in for winetricks during an AffinityOnLinux install'
+        printf 'WINE_SYSTEM_PROGRAMS=%q\n' "$WINE_SYSTEM_PROGRAMS"
+        declare -f wine_programs_running
+        echo 'if [ "$1" = "-w" ]; then'
+        echo '    while wine_programs_running; do sleep 0.2; done'
+        echo '    exit 0'
+        echo 'fi'
+        printf 'exec %q "$@"\n' "$WINESERVER_BIN"
+    } > "$WINESERVER_SHIM"
+    chmod +x "$WINESERVER_SHIM"
+}
+
+# Start the prefix's persistent wineserver and wait until its socket
+# accepts connections; returns 1 (and steps start their own) if it fails
+wineserver_start() {
+    if [ "$WINESERVER_RUNNING" = true ] && [ -S "$WINESERVER_SOCKET" ]; then
+        return 0
     fi
-    
-    if [ "$ENABLE_VULKAN" = true ]; then
-        COMPONENTS="$COMPONENTS renderer=vulkan"
-        log "Adding Vulkan renderer to installation (For GPU)"
+    WINESERVER_BIN=${WINESERVER_BIN:-${WINESERVER:-$(command -v wineserver)}}
+    [ -n "$WINESERVER_BIN" ] || return 1
+
+    mkdir -p "$WINEPREFIX"
+    local dev ino i
+    read -r dev ino < <(stat -L -c '%d %i' "$WINEPREFIX")
+    printf -v WINESERVER_SOCKET '/tmp/.wine-%d/server-%x-%x/socket' "$UID" "$dev" "$ino"
+
+    WINEPREFIX="$WINEPREFIX" "$WINESERVER_BIN" -p"$WINESERVER_PERSIST" 2>> "$LOG_FILE"
+    for ((i = 0; i < 50; i++)); do
+        if [ -S "$WINESERVER_SOCKET" ]; then
+            WINESERVER_RUNNING=true
+            [ -n "$WINESERVER_SHIM" ] || wineserver_write_shim
+            log "wineserver ready, kept running across install steps"
+            return 0
+        fi
+        sleep 0.1
+    done
+
+    log "WARNING: persistent wineserver did not start; steps will start their own"
+    return 1
+}
+
+# wineserver_stop [--now] - wait for the prefix's programs (unless --now),
+# then stop the server. SIGTERM makes it write the registry hives back.
+wineserver_stop() {
+    if [ "$WINESERVER_RUNNING" != true ]; then
+        command -v wineserver &> /dev/null && WINEPREFIX="$WINEPREFIX" wineserver -w
+        return 0
     fi
-    
-    if [ "$ENABLE_TAHOMA" = true ]; then
-        COMPONENTS="$COMPONENTS tahoma"
-        log "Adding Tahoma font to installation (fonts not showing up right)"
+
+    [ "$1" = "--now" ] || wineserver_wait
+    WINEPREFIX="$WINEPREFIX" "$WINESERVER_BIN" -k15 2>> "$LOG_FILE"
+    WINEPREFIX="$WINEPREFIX" "$WINESERVER_BIN" -w 2>> "$LOG_FILE"
+    WINESERVER_RUNNING=false
+}
+
+# ==========================================
+# Registry Batching
+# ==========================================
+#
+# reg_set KEY NAME VALUE queues a string value. journal_step imports all
+# values its step queued with one "wine regedit" after the step succeeds,
+# instead of starting "wine reg add" once per value.
+
+REG_QUEUE=()
+
+reg_set() {
+    local value=$3
+    value=${value//\\/\\\\}
+    value=${value//\"/\\\"}
+    REG_QUEUE+=("$1" "\"$2\"=\"$value\"")
+}
+
+reg_apply() {
+    [ ${#REG_QUEUE[@]} -gt 0 ] || return 0
+
+    # regedit takes a Windows path, so the file goes inside the prefix
+    local name="aol-$$.reg"
+    local file="$WINEPREFIX/drive_c/windows/temp/$name"
+    local key="" i
+    mkdir -p "${file%/*}"
+    {
+        printf 'REGEDIT4\n'
+        for ((i = 0; i < ${#REG_QUEUE[@]}; i += 2)); do
+            if [ "${REG_QUEUE[i]}" != "$key" ]; then
+                key=${REG_QUEUE[i]}
+                printf '\n[%s]\n' "$key"
+            fi
+            printf '%s\n' "${REG_QUEUE[i + 1]}"
+        done
+    } > "$file"
+
+    WINEPREFIX="$WINEPREFIX" wine regedit /S "C:\\windows\\temp\\$name" 2>&1 | tee -a "$LOG_FILE"
+    local status=${PIPESTATUS[0]}
+    rm -f "$file"
+    log "Imported $((${#REG_QUEUE[@]} / 2)) registry value(s) with one regedit"
+    REG_QUEUE=()
+    return $status
+}
+
+# ==========================================
+# Install Journal
+# ==========================================
+#
+# $WINEPREFIX/.aol_journal records each completed step as a line
+# "step fingerprint timestamp"; later lines win. A rerun skips every step
+# whose journaled fingerprint still matches, so an install that failed late
+# resumes there instead of reinstalling all dependencies. Fingerprints
+# chain, so redoing a step invalidates the steps built on top of it:
+#
+#   wineboot           journal format, CPU arch
+#   verb:<verb>        wineboot + verb
+#   app                wineboot + installer name, size and mtime
+#   dxvk, shortcuts    app + step name
+#
+# Helper files are not journaled: they come from the artifact cache.
+
+JOURNAL_FORMAT="v1"
+JOURNAL_FILE=""
+RESUME=true
+WINEBOOT_FP=""
+APP_FP=""
+declare -A JOURNAL=()
+
+# journal_fp PARTS... - print a short fingerprint of its arguments
+journal_fp() {
+    printf '%s\n' "$JOURNAL_FORMAT" "$@" | sha256sum | cut -c1-16
+}
+
+journal_load() {
+    JOURNAL_FILE="$WINEPREFIX/.aol_journal"
+    JOURNAL=()
+    WINEBOOT_FP=$(journal_fp wineboot "$(uname -m)")
+
+    if [ "$RESUME" != true ]; then
+        rm -f "$JOURNAL_FILE"
+        return 0
     fi
-    
-    log "Installing components: $COMPONENTS"
-    WINEPREFIX="$WINEPREFIX" winetricks --unattended --force $COMPONENTS 2>&1 | tee -a "$LOG_FILE"
-    
-    gui_progress 60 "Dependencies installation completed"
-    
-    gui_progress 65 "Verifying installed components"
-    
-    log "Component installation completed"
+
+    local step fp stamp
+    if [ -f "$JOURNAL_FILE" ]; then
+        while read -r step fp stamp; do
+            [[ -z "$step" || "$step" == \#* ]] && continue
+            JOURNAL[$step]=$fp
+        done < "$JOURNAL_FILE"
+    fi
+
+    # Steps whose output has since been deleted have to run again
+    if [ ! -f "$WINEPREFIX/system.reg" ]; then
+        JOURNAL=()
+    fi
+    if [ -z "$(find "$WINEPREFIX/drive_c" -name "Affinity.exe" -print -quit 2>/dev/null)" ]; then
+        unset 'JOURNAL[app]' 'JOURNAL[dxvk]'
+    fi
+    if ! grep -qxF "Exec=\"$WINEPREFIX/affinity-launch\"" "$(desktop_file)" 2>/dev/null; then
+        unset 'JOURNAL[shortcuts]'
+    fi
+
+    if [ ${#JOURNAL[@]} -gt 0 ]; then
+        log "Resuming from install journal (${#JOURNAL[@]} completed steps)"
+    fi
+
+    [ -n "${JOURNAL[wineboot]}" ] && PREFIX_EXISTS=true
+    [ -n "${JOURNAL[verb:dotnet48]}" ] && DOTNET48_EXISTS=true
+    [ -n "${JOURNAL[verb:vcrun2022]}" ] && VCRUN_EXISTS=true
+    # Affinity 3 is a single application covering all three
+    if [ -n "${JOURNAL[app]}" ]; then
+        PHOTO_EXISTS=true
+        DESIGNER_EXISTS=true
+        PUBLISHER_EXISTS=true
+    fi
+}
+
+# journal_valid STEP FP - true when STEP was completed with fingerprint FP
+journal_valid() {
+    [ "$RESUME" = true ] && [ -n "$2" ] && [ "${JOURNAL[$1]}" = "$2" ]
+}
+
+journal_done() {
+    JOURNAL[$1]=$2
+    if [ ! -f "$JOURNAL_FILE" ]; then
+        echo "# AffinityOnLinux install journal $JOURNAL_FORMAT" > "$JOURNAL_FILE"
+    fi
+    printf '%s %s %(%Y-%m-%dT%H:%M:%S%z)T\n' "$1" "$2" -1 >> "$JOURNAL_FILE"
+}
+
+# journal_step STEP FP COMMAND... - run COMMAND unless STEP is journaled
+# with fingerprint FP, and journal it when COMMAND succeeds
+journal_step() {
+    local step=$1
+    local fp=$2
+    shift 2
+
+    if journal_valid "$step" "$fp"; then
+        log "Skipping $step (completed in a previous run)"
+        return 0
+    fi
+    check_phase_space "$step" || return $NO_SPACE_STATUS
+
+    "$@"
+    local status=$?
+    if [ $status -eq 0 ]; then
+        reg_apply || status=1
+    fi
+    REG_QUEUE=()
+    if [ $status -eq 0 ]; then
+        journal_done "$step" "$fp"
+    fi
+    return $status
+}
+
+# A restored golden prefix carries the journal of the machine that built
+# it; replace it with entries for this prefix
+journal_record_golden() {
+    local verb
+    rm -f "$JOURNAL_FILE"
+    JOURNAL=()
+    journal_done wineboot "$WINEBOOT_FP"
+    for verb in $COMPONENTS; do
+        journal_done "verb:$verb" "$(journal_fp "$WINEBOOT_FP" "$verb")"
+    done
 }
 
 # ==========================================
-# Download Helper Files
+# Interactive Menu Functions (Disabled in GUI mode)
 # ==========================================
 
-download_helper_files() {
-    log "Downloading helper files..."
-    
-    gui_progress 70 "Downloading helper files (wintypes.dll, Windows.winmd)"
-    
-    local temp_dir="/tmp"
-    
-    log "Downloading wintypes.dll"
+show_menu() {
+    if [ "$GUI_MODE" = true ]; then
+        return 0
+    fi
     
-    if command -v curl &> /dev/null; then
-        curl --output "$temp_dir/wintypes.dll" --follow --location \
-            "https://github.com/ElementalWarrior/wine-wintypes.dll-for-affinity/raw/refs/heads/master/wintypes_shim.dll.so" 2>&1 | tee -a "$LOG_FILE"
-    elif command -v wget &> /dev/null; then
-        wget -O "$temp_dir/wintypes.dll" \
-            "https://github.com/ElementalWarrior/wine-wintypes.dll-for-affinity/raw/refs/heads/master/wintypes_shim.dll.so" 2>&1 | tee -a "$LOG_FILE"
-    else
-        gui_error "Neither curl nor wget found"
-        log "ERROR: Neither curl nor wget available"
+    local title="$1"
+    shift
+    local options=("$@")
+    local selected=0
+    local key
+
+    while true; do
+        clear
+        echo -e "${CYAN}━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━${NC}"
+        echo -e "${CYAN}$title${NC}"
+        echo -e "${CYAN}━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━${NC}"
+        echo ""
+        
+        for i in "${!options[@]}"; do
+            if [ $i -eq $selected ]; then
+                echo -e "${GREEN}▶ ${options[$i]}${NC}"
+            else
+                echo -e "  ${options[$i]}"
+            fi
+        done
+        
+        echo ""
+        echo -e "${YELLOW}Use ↑/↓ arrows to navigate, Enter to select${NC}"
+        echo -e "${YELLOW}Or type number (1-${#options[@]}) and press Enter${NC}"
+        
+        IFS= read -rsn1 key
+        
+        if [[ $key =~ ^[0-9]$ ]]; then
+            local num=$((key - 1))
+            if [ $num -ge 0 ] && [ $num -lt ${#options[@]} ]; then
+                return $num
+            fi
+        elif [[ $key == $'\x1b' ]]; then
+            read -rsn2 -t 0.1 key
+            case $key in
+                '[A')
+                    ((selected--))
+                    if [ $selected -lt 0 ]; then
+                        selected=$((${#options[@]} - 1))
+                    fi
+                    ;;
+                '[B')
+                    ((selected++))
+                    if [ $selected -ge ${#options[@]} ]; then
+                        selected=0
+                    fi
+                    ;;
+            esac
+        elif [[ $key == "" ]]; then
+            return $selected
+        fi
+    done
+}
+
+# ==========================================
+# Wine Installation (Simplified for GUI mode)
+# ==========================================
+
+# Sets PROBE_WINE_ID ("wine-10.0"). It is normally sourced from the Python
+# probe cache; without --probe-file "wine --version" runs once per install.
+probe_wine_id() {
+    if [ -z "${PROBE_WINE_ID+set}" ]; then
+        PROBE_WINE_ID=$(wine --version 2>/dev/null)
+    fi
+}
+
+check_wine_version() {
+    if ! command -v wine &> /dev/null; then
+        log "Wine not found"
         return 1
     fi
     
-    log "Downloading Windows.winmd"
-    
-    if command -v curl &> /dev/null; then
-        curl --output "$temp_dir/Windows.winmd" --follow --location \
-            "https://github.com/microsoft/windows-rs/raw/master/crates/libs/bindgen/default/Windows.winmd" 2>&1 | tee -a "$LOG_FILE"
-    elif command -v wget &> /dev/null; then
-        wget -O "$temp_dir/Windows.winmd" \
-            "https://github.com/microsoft/windows-rs/raw/master/crates/libs/bindgen/default/Windows.winmd" 2>&1 | tee -a "$LOG_FILE"
+    probe_wine_id
+    if ! [[ "$PROBE_WINE_ID" =~ ([0-9]+)\.([0-9]+) ]]; then
+        log "Could not determine Wine version"
+        return 1
     fi
     
-    log "All helper files downloaded successfully"
+    local wine_version=${BASH_REMATCH[0]}
+    local major=${BASH_REMATCH[1]}
     
-    WINTYPES_DLL="$temp_dir/wintypes.dll"
-    WINDOWS_WINMD="$temp_dir/Windows.winmd"
+    log "Found Wine version: $wine_version"
     
-    return 0
+    if [ "$major" -ge 10 ]; then
+        WINE_VERSION_OK=true
+        return 0
+    fi
+    
+    log "Wine version too old (need 10.0+)"
+    return 1
 }
 
 # ==========================================
-# Install Affinity Application
+# Winetricks Installation
 # ==========================================
 
-install_affinity_app() {
-    if [ -z "$INSTALLER_PATH" ]; then
-        log "No installer path provided, skipping Affinity installation"
+check_winetricks() {
+    if command -v winetricks &> /dev/null; then
+        WINETRICKS_BIN=$(command -v winetricks)
+        log "Winetricks found: $WINETRICKS_BIN"
         return 0
     fi
     
-    log "Starting Affinity application installation..."
-    
-    gui_progress 80 "Installing Affinity application"
+    if [ -f "$HOME/winetricks" ] && [ -x "$HOME/winetricks" ]; then
+        WINETRICKS_BIN="$HOME/winetricks"
+        log "Winetricks found locally: $HOME/winetricks"
+        return 0
+    fi
     
-    if [ ! -f "$INSTALLER_PATH" ]; then
-        gui_error "Installer file not found: $INSTALLER_PATH"
-        log "ERROR: Installer file not found: $INSTALLER_PATH"
-        return 1
+    log "Winetricks not found"
+    return 1
+}
+
+# ==========================================
+# Dependency Scheduler
+# ==========================================
+#
+# Every winetricks verb talks to the same wineserver and registry, so verbs
+# are installed one at a time in dependency order. What runs concurrently
+# is downloading: each verb's files are prefetched into winetricks' cache in
+# the background while earlier verbs install, and winetricks then finds them
+# already cached. URLs and checksums are read from the installed winetricks
+# itself, so prefetched files always match what it will verify.
+
+WINETRICKS_BIN="winetricks"
+
+# Verbs that must be installed before the key, when both are selected
+declare -A VERB_DEPS=(
+    [dotnet48]="remove_mono"
+    [win11]="dotnet48"
+)
+
+declare -A PREFETCH_PIDS=()
+
+# Print the selected verbs in install order: a stable topological sort that
+# keeps the order of $COMPONENTS wherever dependencies allow
+schedule_verbs() {
+    local pending=($COMPONENTS)
+    local installed=" "
+    local verb dep ready next i
+
+    while [ ${#pending[@]} -gt 0 ]; do
+        next=-1
+        for i in "${!pending[@]}"; do
+            verb=${pending[$i]}
+            ready=true
+            for dep in ${VERB_DEPS[$verb]}; do
+                if [[ " $COMPONENTS " == *" $dep "* ]] && [[ "$installed" != *" $dep "* ]]; then
+                    ready=false
+                    break
+                fi
+            done
+            if [ "$ready" = true ]; then
+                next=$i
+                break
+            fi
+        done
+
+        # Dependency cycle: fall back to the listed order
+        [ "$next" -lt 0 ] && next=0
+
+        echo "${pending[$next]}"
+        installed="$installed${pending[$next]} "
+        unset 'pending[next]'
+        pending=("${pending[@]}")
+    done
+}
+
+# verb_downloads VERB - print "cache_dir file url sha256" for every download
+# winetricks' load_VERB (and the verbs it w_calls) would make
+verb_downloads() {
+    local verb="$1"
+    local seen="${2:- }"
+    local kind a b c d
+
+    [[ "$seen" == *" $verb "* ]] && return 0
+    seen="$seen$verb "
+
+    while read -r kind a b c d; do
+        case "$kind" in
+            call)
+                verb_downloads "$a" "$seen"
+                ;;
+            get)
+                echo "$a $b $c $d"
+                ;;
+        esac
+    done < <(awk -v fn="load_$verb()" -v verb="$verb" '
+        function base(url,   n, parts) { n = split(url, parts, "/"); return parts[n] }
+        index($0, fn) == 1 { inside = 1; next }
+        !inside { next }
+        /^}/ { exit }
+        {
+            gsub(/"/, "")
+            gsub(/\$\{W_PACKAGE\}/, verb)
+        }
+        /\$/ { next }
+        $1 == "w_call" { print "call", $2 }
+        $1 == "w_download" && $2 ~ /^https?:\/\// {
+            print "get", verb, ($4 != "" ? $4 : base($2)), $2, $3
+        }
+        $1 == "w_download_to" && $3 ~ /^https?:\/\// {
+            print "get", $2, ($5 != "" ? $5 : base($3)), $3, $4
+        }
+    ' "$(command -v "$WINETRICKS_BIN")" 2>/dev/null)
+}
+
+# Download VERB's files into $W_CACHE unless they are already there
+prefetch_verb() {
+    local verb="$1"
+    local dir file url sha target
+
+    while read -r dir file url sha; do
+        target="$W_CACHE/$dir/$file"
+        [ -s "$target" ] && continue
+
+        mkdir -p "$W_CACHE/$dir"
+        if ! download "$url" "$target.prefetch.$$"; then
+            rm -f "$target.prefetch.$$"
+            continue
+        fi
+
+        # A file winetricks would reject is worse than no file at all
+        if [[ "$sha" =~ ^[0-9a-f]{64}$ ]] && \
+                [ "$(sha256sum "$target.prefetch.$$" | cut -d' ' -f1)" != "$sha" ]; then
+            log "Prefetched $file does not match winetricks' checksum, discarding"
+            rm -f "$target.prefetch.$$"
+            continue
+        fi
+
+        mv -f "$target.prefetch.$$" "$target"
+        log "Prefetched $file for $verb"
+        emit_event download name="$file" bytes:=$(stat -c %s "$target") cached:=false
+    done < <(verb_downloads "$verb")
+}
+
+start_prefetch() {
+    local verb
+    if [ "$OFFLINE" = true ]; then
+        return 0
     fi
+    for verb in "$@"; do
+        prefetch_verb "$verb" &
+        PREFETCH_PIDS[$verb]=$!
+    done
+}
+
+run_winetricks() {
+    local env=(WINEPREFIX="$WINEPREFIX")
+    if [ "$WINESERVER_RUNNING" = true ]; then
+        env+=(WINESERVER="$WINESERVER_SHIM")
+    fi
+    if [ "$OFFLINE" = true ]; then
+        env+=(PATH="$(offline_guard_dir):$PATH")
+    fi
+    env "${env[@]}" "$WINETRICKS_BIN" --unattended --force "$@" 2>&1 | tee -a "$LOG_FILE"
+    local status=${PIPESTATUS[0]}
+
+    # A verb may have killed the server ("wineserver -k"); bring it back
+    if [ "$WINESERVER_RUNNING" = true ] && [ ! -S "$WINESERVER_SOCKET" ]; then
+        WINESERVER_RUNNING=false
+        wineserver_start
+    fi
+    return $status
+}
+
+# Install the verbs one by one, spreading progress over FIRST..LAST percent
+install_verbs() {
+    local first=$1
+    local last=$2
+    local verbs=($(schedule_verbs))
+    local total=${#verbs[@]}
+    local i=0
+    local verb started elapsed status
+
+    local pending=()
+    declare -A verb_fp=()
+    for verb in "${verbs[@]}"; do
+        verb_fp[$verb]=$(journal_fp "$WINEBOOT_FP" "$verb")
+        journal_valid "verb:$verb" "${verb_fp[$verb]}" || pending+=("$verb")
+    done
+
+    log "Install order: ${verbs[*]}"
+    start_prefetch "${pending[@]}"
+
+    for verb in "${verbs[@]}"; do
+        if journal_valid "verb:$verb" "${verb_fp[$verb]}"; then
+            log "Skipping $verb (installed in a previous run)"
+            i=$((i + 1))
+            continue
+        fi
+
+        gui_progress $((first + (last - first) * i / total)) "Installing $verb ($((i + 1))/$total)"
+
+        if [ -n "${PREFETCH_PIDS[$verb]}" ]; then
+            wait "${PREFETCH_PIDS[$verb]}"
+        fi
+
+        check_phase_space "verb:$verb" || return $NO_SPACE_STATUS
+        phase_begin "verb:$verb"
+        started=$SECONDS
+        run_winetricks "$verb"
+        status=$?
+        elapsed=$((SECONDS - started))
+        phase_end $status
+
+        if [ "$status" -ne 0 ]; then
+            log "WARNING: winetricks $verb exited with code $status"
+        else
+            journal_done "verb:$verb" "${verb_fp[$verb]}"
+        fi
+
+        cache_touch_verbs "$verb" $(verb_downloads "$verb" | cut -d' ' -f1)
+        i=$((i + 1))
+        gui_progress $((first + (last - first) * i / total)) "Installed $verb in ${elapsed}s ($i/$total)"
+    done
+
+    wait
+}
+
+# ==========================================
+# Component Installation (Simplified)
+# ==========================================
+
+select_components() {
+    # Base components (always installed)
+    # Note: "webview2" is intentionally absent: winetricks has no such verb
+    # (passing it makes winetricks print its usage text and install nothing),
+    # and installing the WebView2 runtime by other means is known to make
+    # Affinity's onboarding/help dialogs hang under Wine.
+    COMPONENTS="remove_mono vcrun2022 dotnet48 corefonts win11"
+    
+    # Append optional components if enabled
+    if [ "$ENABLE_DXVK" = true ]; then
+        COMPONENTS="$COMPONENTS dxvk"
+        log "Adding DXVK to installation (for stability)"
+    fi
+    
+    if [ "$ENABLE_VULKAN" = true ]; then
+        COMPONENTS="$COMPONENTS renderer=vulkan"
+        log "Adding Vulkan renderer to installation (For GPU)"
+    fi
+    
+    if [ "$ENABLE_TAHOMA" = true ]; then
+        COMPONENTS="$COMPONENTS tahoma"
+        log "Adding Tahoma font to installation (fonts not showing up right)"
+    fi
+}
+
+install_missing_components() {
+    log "Starting component installation..."
+    
+    select_components
+    
+    # A new prefix, restored or created by wineboot
+    if ! journal_valid wineboot "$WINEBOOT_FP"; then
+        check_phase_space dependencies || return $NO_SPACE_STATUS
+    fi
+    
+    if golden_restore; then
+        journal_record_golden
+        gui_progress 60 "Dependencies restored from golden prefix"
+        gui_progress 65 "Verifying installed components"
+        verify_components
+        log "Component installation completed"
+        return 0
+    fi
+    
+    gui_progress 15 "Checking for Winetricks"
+    
+    if ! check_winetricks; then
+        gui_error "Winetricks not found. Please install winetricks first."
+        log "ERROR: Winetricks not found"
+        exit 1
+    fi
+    
+    gui_progress 20 "Creating Wine prefix"
+    
+    # Starting the server creates the prefix directory; system.reg shows
+    # whether wineboot has run in it
+    local prefix_initialized=false
+    [ -f "$WINEPREFIX/system.reg" ] && prefix_initialized=true
+    wineserver_start
+    
+    if [ "$prefix_initialized" = false ]; then
+        log "Creating Wine prefix at $WINEPREFIX"
+        WINEPREFIX="$WINEPREFIX" wineboot --init 2>&1 | tee -a "$LOG_FILE"
+        wineserver_wait
+        log "Wine prefix created successfully"
+        journal_done wineboot "$WINEBOOT_FP"
+    else
+        log "Wine prefix already exists"
+        if [ -f "$WINEPREFIX/system.reg" ] && ! journal_valid wineboot "$WINEBOOT_FP"; then
+            journal_done wineboot "$WINEBOOT_FP"
+        fi
+    fi
+    
+    gui_progress 25 "Installing dependencies (this may take 30-45 minutes)"
+    
+    log "Installing all dependencies with winetricks"
+    
+    log "Installing components: $COMPONENTS"
+    install_verbs 25 60 || return $?
+    cache_evict
+    
+    gui_progress 60 "Dependencies installation completed"
+    
+    if [ "$EXPORT_GOLDEN" = true ]; then
+        golden_export || gui_error "Failed to export golden prefix"
+    fi
+    
+    gui_progress 65 "Verifying installed components"
+    verify_components
+    
+    log "Component installation completed"
+}
+
+# Check the installed components by reading the prefix directly (Python
+# PrefixVerifier); failures are reported, the install carries on
+verify_components() {
+    if [ -z "$PYTHON_BIN" ] || [ ! -f "$SELF_PATH" ]; then
+        return 0
+    fi
+
+    # wineserver writes the registry hives back when it exits
+    wineserver_stop
+
+    "$PYTHON_BIN" "$SELF_PATH" --verify-prefix "$WINEPREFIX" --components "$COMPONENTS" 2>&1 | tee -a "$LOG_FILE"
+    if [ "${PIPESTATUS[0]}" -ne 0 ]; then
+        gui_info "Some components failed verification, see the log"
+        log "WARNING: component verification failed"
+        return 1
+    fi
+    return 0
+}
+
+# ==========================================
+# Download Helper Files
+# ==========================================
+
+download_helper_files() {
+    log "Downloading helper files..."
+    
+    gui_progress 70 "Downloading helper files (wintypes.dll, Windows.winmd)"
+    
+    # The helpers are used straight from the cache and placed into the
+    # prefix later, without a staging copy in /tmp
+    log "Fetching wintypes.dll"
+    
+    if ! cache_fetch "https://github.com/ElementalWarrior/wine-wintypes.dll-for-affinity/raw/refs/heads/master/wintypes_shim.dll.so" \
+            "" wintypes.dll; then
+        gui_error "Failed to fetch wintypes.dll"
+        return 1
+    fi
+    WINTYPES_DLL="$CACHE_OBJECT"
+    
+    log "Fetching Windows.winmd"
+    
+    if ! cache_fetch "https://github.com/microsoft/windows-rs/raw/master/crates/libs/bindgen/default/Windows.winmd" \
+            "" Windows.winmd; then
+        gui_error "Failed to fetch Windows.winmd"
+        return 1
+    fi
+    WINDOWS_WINMD="$CACHE_OBJECT"
+    
+    log "All helper files ready"
+    
+    return 0
+}
+
+# ==========================================
+# Install Affinity Application
+# ==========================================
+
+install_affinity_app() {
+    if [ -z "$INSTALLER_PATH" ]; then
+        log "No installer path provided, skipping Affinity installation"
+        return 0
+    fi
+    
+    log "Starting Affinity application installation..."
+    
+    gui_progress 80 "Installing Affinity application"
+    
+    if [ ! -f "$INSTALLER_PATH" ]; then
+        gui_error "Installer file not found: $INSTALLER_PATH"
+        log "ERROR: Installer file not found: $INSTALLER_PATH"
+        return 1
+    fi
+    
+    log "Found installer: $INSTALLER_PATH"
+    
+    if [[ "$INSTALLER_PATH" =~ \.exe$ ]]; then
+        log "Using .exe installer"
+        WINEPREFIX="$WINEPREFIX" wine "$INSTALLER_PATH" 2>&1 | tee -a "$LOG_FILE"
+    elif [[ "$INSTALLER_PATH" =~ \.msix$ ]] && [ -n "$PYTHON_BIN" ] && [ -f "$SELF_PATH" ]; then
+        log "Using .msix installer (streaming App/ into the prefix)"
+        gui_info "Extracting MSIX package..."
+        
+        local affinity_install_dir="$WINEPREFIX/drive_c/Program Files/Affinity"
+        mkdir -p "$affinity_install_dir"
+        
+        # Payloads are kept in the cache when they can be reflinked into
+        # prefixes, or when several prefixes are being provisioned
+        local share=""
+        [ "$SHARE_PAYLOAD" = true ] && share="--share"
+        "$PYTHON_BIN" "$SELF_PATH" --extract-msix "$INSTALLER_PATH" "$affinity_install_dir" \
+            --store "$CACHE_DIR/payload" $share 2>&1 | tee -a "$LOG_FILE"
+        if [ "${PIPESTATUS[0]}" -ne 0 ]; then
+            gui_error "MSIX extraction failed (see log)"
+            log "ERROR: MSIX extraction failed"
+            return 1
+        fi
+    elif [[ "$INSTALLER_PATH" =~ \.msix$ ]]; then
+        log "Using .msix installer (requires extraction)"
+        gui_info "Extracting MSIX package..."
+        
+        local extract_dir="$WORK_DIR/affinity_msix_$$"
+        require_space "$WORK_DIR" 2500 "MSIX extraction" || return 1
+        mkdir -p "$extract_dir"
+        
+        if command -v 7z &> /dev/null; then
+            7z x "$INSTALLER_PATH" -o"$extract_dir" 2>&1 | tee -a "$LOG_FILE"
+        elif command -v unzip &> /dev/null; then
+            unzip -q "$INSTALLER_PATH" -d "$extract_dir" 2>&1 | tee -a "$LOG_FILE"
+        else
+            gui_error "No extraction tool found (need 7z or unzip)"
+            log "ERROR: No extraction tool available"
+            rm -rf "$extract_dir"
+            return 1
+        fi
+        
+        local affinity_install_dir="$WINEPREFIX/drive_c/Program Files/Affinity"
+        mkdir -p "$affinity_install_dir"
+        
+        place_file "$extract_dir/App" "$affinity_install_dir"
+        
+        rm -rf "$extract_dir"
+    fi
+    
+    log "Affinity installer completed"
+    
+    # Copy helper files
+    local affinity_dir="$WINEPREFIX/drive_c/Program Files/Affinity"
+    
+    if [ -d "$affinity_dir" ]; then
+        local app_dir=$(find "$affinity_dir" -maxdepth 1 -type d \( -name "Affinity*" -o -name "Affinity" \) | head -1)
+        
+        if [ -n "$app_dir" ] && [ -f "$WINTYPES_DLL" ]; then
+            place_file "$WINTYPES_DLL" "$app_dir/wintypes.dll" --link
+            log "wintypes.dll copied to $app_dir"
+        fi
+    fi
+    
+    local winmetadata_dir="$WINEPREFIX/drive_c/windows/system32/WinMetadata"
+    mkdir -p "$winmetadata_dir"
+    
+    if [ -f "$WINDOWS_WINMD" ]; then
+        place_file "$WINDOWS_WINMD" "$winmetadata_dir/Windows.winmd" --link
+        log "Windows.winmd copied to $winmetadata_dir"
+    fi
+    
+    return 0
+}
+
+# ==========================================
+# DXVK Workarounds
+# ==========================================
+
+configure_dxvk_workarounds() {
+    # Fix black right-click/context menus and flyout popups (issue #72).
+    # DXVK leaves Affinity's D3D9 popup surfaces uninitialised until they are
+    # presented (doitsujin/dxvk#2749); deferring surface creation and pinning
+    # shader model 1 works around it.
+    log "Configuring DXVK workarounds (black context menu fix)"
+
+    local affinity_exe=$(find "$WINEPREFIX/drive_c" -name "Affinity.exe" 2>/dev/null | head -1)
+
+    if [ -z "$affinity_exe" ] || [ ! -f "$affinity_exe" ]; then
+        log "Affinity.exe not found, skipping dxvk.conf setup"
+        return 0
+    fi
+
+    local affinity_dir=$(dirname "$affinity_exe")
+
+    cat > "$affinity_dir/dxvk.conf" <<EOF
+# Fix black right-click/context menus and flyout popups in Affinity under
+# Wine (doitsujin/dxvk#2749): D3D9 popup surfaces stay uninitialised (black)
+# until presented. Deferring surface creation and pinning shader model 1
+# works around it.
+d3d9.deferSurfaceCreation = True
+d3d9.shaderModel = 1
+EOF
+
+    log "Wrote $affinity_dir/dxvk.conf"
+
+    # Register the config path prefix-wide so DXVK finds it regardless of the
+    # launcher's working directory. DXVK opens the value directly as a host
+    # path, so it must be the native Linux path, not a Z:\ Windows path.
+    reg_set 'HKEY_CURRENT_USER\Environment' DXVK_CONFIG_FILE "$affinity_dir/dxvk.conf"
+
+    log "Registering DXVK_CONFIG_FILE in HKCU\\Environment"
+
+    return 0
+}
+
+# ==========================================
+# Settings Profile
+# ==========================================
+
+# Merge the settings profile (Auxiliary/Settings from a repository checkout,
+# or --settings-profile) into the prefix. Files the user already has keep
+# their values; the Python side only writes files that change, so this runs
+# on every install instead of being journaled.
+deploy_settings_profile() {
+    if [ -z "$SETTINGS_PROFILE" ]; then
+        return 0
+    fi
+    if [ ! -d "$SETTINGS_PROFILE" ] || [ -z "$PYTHON_BIN" ] || [ -z "$SELF_PATH" ]; then
+        log "WARNING: cannot deploy settings profile $SETTINGS_PROFILE"
+        return 0
+    fi
+
+    log "Deploying settings profile $SETTINGS_PROFILE"
+    "$PYTHON_BIN" "$SELF_PATH" --deploy-settings "$SETTINGS_PROFILE" "$WINEPREFIX" 2>&1 | tee -a "$LOG_FILE"
+    if [ ${PIPESTATUS[0]} -ne 0 ]; then
+        log "WARNING: some settings files could not be deployed"
+    fi
+    return 0
+}
+
+# ==========================================
+# Performance Preferences
+# ==========================================
+
+# Size Affinity's RAM limit, undo history and scratch warning to this
+# machine and turn GPU acceleration on only where it can work (see
+# --performance-prefs). Affinity's own defaults apply if this fails.
+write_performance_preferences() {
+    if [ -z "$PYTHON_BIN" ] || [ -z "$SELF_PATH" ]; then
+        log "Python installer not available, keeping Affinity's default performance preferences"
+        return 0
+    fi
+
+    # Without DXVK, Affinity's Direct3D 11 renderer would run on WineD3D
+    local acceleration=auto
+    [ "$ENABLE_DXVK" = true ] || acceleration=off
+
+    log "Writing performance preferences for this machine"
+    local scratch=()
+    [ -n "$SCRATCH_DIR" ] && scratch=(--scratch "$SCRATCH_DIR")
+    "$PYTHON_BIN" "$SELF_PATH" --performance-prefs "$WINEPREFIX" "${scratch[@]}" \
+        --hardware-acceleration "$acceleration" 2>&1 | tee -a "$LOG_FILE"
+    if [ ${PIPESTATUS[0]} -ne 0 ]; then
+        log "WARNING: could not write performance preferences, keeping Affinity's defaults"
+    fi
+    return 0
+}
+
+# ==========================================
+# Launcher
+# ==========================================
+#
+# The desktop entry runs $WINEPREFIX/affinity-launch instead of wine directly.
+# The launcher reuses a warm wineserver for the prefix (starting a persistent
+# one if none is running, so a relaunch within AFFINITY_SERVER_PERSIST
+# seconds skips the server start), applies the environment chosen here from
+# affinity-launch.env, and appends each launch's time to first window to
+# $XDG_STATE_HOME/AffinityOnLinux/launch-metrics.jsonl.
+
+# Write the launch environment for this machine and Wine build
+write_launch_env() {
+    local env_file="$WINEPREFIX/affinity-launch.env"
+    # All shader caches live in the prefix, so they can be exported and
+    # imported as one (see --shader-cache)
+    local shader_cache="$WINEPREFIX/shader-cache"
+    local settings=(
+        # Wine's debug channels cost noticeable time during startup
+        WINEDEBUG=-all
+        # Keep compiled shaders across launches and driver cache cleanups
+        DXVK_STATE_CACHE_PATH="$shader_cache/dxvk"
+        VKD3D_SHADER_CACHE_PATH="$shader_cache/vkd3d"
+        MESA_SHADER_CACHE_DIR="$shader_cache/mesa"
+        MESA_SHADER_CACHE_MAX_SIZE=1G
+        __GL_SHADER_DISK_CACHE=1
+        __GL_SHADER_DISK_CACHE_PATH="$shader_cache/nvidia"
+        __GL_SHADER_DISK_CACHE_SKIP_CLEANUP=1
+    )
+
+    # esync and fsync only exist in Staging, Proton and GE builds of Wine
+    probe_wine_id
+    if [[ "$PROBE_WINE_ID" =~ Staging|Proton|GE|tkg ]]; then
+        if [ "$(ulimit -Hn)" = unlimited ] || [ "$(ulimit -Hn)" -ge 524288 ]; then
+            settings+=(WINEESYNC=1)
+        else
+            log "Not enabling esync: the open file limit ($(ulimit -Hn)) is below 524288"
+        fi
+        # fsync needs futex_waitv (Linux 5.16)
+        local kernel=$(uname -r)
+        if [[ "$kernel" =~ ^([0-9]+)\.([0-9]+) ]] &&
+            (( BASH_REMATCH[1] > 5 || (BASH_REMATCH[1] == 5 && BASH_REMATCH[2] >= 16) )); then
+            settings+=(WINEFSYNC=1)
+        fi
+    fi
+
+    if [ -f "$(dirname "$1")/dxvk.conf" ]; then
+        settings+=(DXVK_LOG_LEVEL=none)
+    fi
+
+    mkdir -p "$shader_cache"/{dxvk,vkd3d,mesa,nvidia}
+    if [ -n "$SHADER_CACHE_SEED" ]; then
+        seed_shader_cache
+    fi
+    {
+        echo "# Launch environment chosen by the AffinityOnLinux installer for $PROBE_WINE_ID"
+        local setting
+        for setting in "${settings[@]}"; do
+            printf 'export %s=%q\n' "${setting%%=*}" "${setting#*=}"
+        done
+    } > "$env_file"
+    log "Wrote launch environment to $env_file: ${settings[*]%%=*}"
+}
+
+# Merge a shader cache archive exported on a reference machine into the
+# prefix, so the first launches skip most pipeline compilation
+seed_shader_cache() {
+    if [ ! -r "$SHADER_CACHE_SEED" ]; then
+        log "WARNING: shader cache archive $SHADER_CACHE_SEED not found"
+        return 0
+    fi
+    if [ -z "$PYTHON_BIN" ] || [ -z "$SELF_PATH" ]; then
+        log "WARNING: cannot import $SHADER_CACHE_SEED without the Python installer"
+        return 0
+    fi
+    log "Seeding shader caches from $SHADER_CACHE_SEED"
+    "$PYTHON_BIN" "$SELF_PATH" --shader-cache import "$WINEPREFIX" "$SHADER_CACHE_SEED" 2>&1 | tee -a "$LOG_FILE"
+}
+
+# write_launcher EXE - write $WINEPREFIX/affinity-launch for EXE
+write_launcher() {
+    local launcher="$WINEPREFIX/affinity-launch"
+    local wine_bin=$(command -v wine)
+    local wineserver_bin=$(command -v wineserver)
+
+    write_launch_env "$1"
+    {
+        echo '#!/bin/bash'
+        echo '# Affinity launcher generated by the AffinityOnLinux installer'
+        echo '# Usage: affinity-launch [--warm] [FILE...]'
+        printf 'WINEPREFIX=%q\n' "$WINEPREFIX"
+        printf 'AFFINITY_EXE=%q\n' "$1"
+        printf 'WINE_BIN=%q\n' "${wine_bin:-wine}"
+        printf 'WINESERVER_BIN=%q\n' "${wineserver_bin:-wineserver}"
+        cat <<'LAUNCHER'
+export WINEPREFIX
+[ -r "$WINEPREFIX/affinity-launch.env" ] && source "$WINEPREFIX/affinity-launch.env"
+
+PERSIST=${AFFINITY_SERVER_PERSIST:-600}
+METRICS="${XDG_STATE_HOME:-$HOME/.local/state}/AffinityOnLinux/launch-metrics.jsonl"
+
+now_us() {
+    if [ -n "$EPOCHREALTIME" ]; then
+        echo "${EPOCHREALTIME/[.,]/}"
+    else
+        date +%s%6N
+    fi
+}
+
+# Start a persistent wineserver unless one is running; sets SERVER
+start_server() {
+    local dev ino socket i
+    read -r dev ino < <(stat -L -c '%d %i' "$WINEPREFIX")
+    printf -v socket '/tmp/.wine-%d/server-%x-%x/socket' "$UID" "$dev" "$ino"
+    if [ -S "$socket" ]; then
+        SERVER=warm
+        return
+    fi
+    SERVER=cold
+    "$WINESERVER_BIN" -p"$PERSIST"
+    for ((i = 0; i < 50; i++)); do
+        [ -S "$socket" ] && return
+        sleep 0.1
+    done
+}
+
+window_shown() {
+    if command -v xdotool &> /dev/null; then
+        xdotool search --onlyvisible --class 'affinity\.exe' &> /dev/null
+    elif command -v wmctrl &> /dev/null; then
+        wmctrl -lx 2>/dev/null | grep -qi 'affinity\.exe'
+    else
+        return 2
+    fi
+}
+
+if [ "$1" = "--warm" ]; then
+    start_server
+    exit 0
+fi
+
+start=$(now_us)
+start_server
+"$WINE_BIN" "$AFFINITY_EXE" "$@" &
+pid=$!
+
+# Poll for the first window while the program runs
+window=null
+while kill -0 $pid 2>/dev/null; do
+    window_shown
+    case $? in
+        0) window=$(( $(now_us) - start )); break ;;
+        2) break ;;
+    esac
+    sleep 0.1
+done
+wait $pid
+status=$?
+
+if [ "$window" != null ]; then
+    printf -v window '%d.%03d' $((window / 1000000)) $((window % 1000000 / 1000))
+fi
+mkdir -p "${METRICS%/*}"
+printf '{"time": %d, "server": "%s", "window_seconds": %s, "exit_code": %d}\n' \
+    $((start / 1000000)) "$SERVER" "$window" "$status" >> "$METRICS"
+exit $status
+LAUNCHER
+    } > "$launcher"
+    chmod +x "$launcher"
+    log "Wrote launcher $launcher"
+}
+
+# ==========================================
+# Create Desktop Shortcuts
+# ==========================================
+
+# Name= of the menu entry; the desktop file is named after it, so prefixes
+# installed under different names (--shortcut-name) get separate entries
+SHORTCUT_NAME="Affinity"
+
+# desktop_file - print the path of this install's desktop entry
+desktop_file() {
+    local id
+    id=$(printf '%s' "$SHORTCUT_NAME" | tr -cs 'A-Za-z0-9._' '-' | sed 's/^-*//; s/-*$//')
+    echo "$HOME/.local/share/applications/${id:-Affinity}.desktop"
+}
+
+create_desktop_shortcuts() {
+    log "Creating desktop shortcuts..."
+    
+    gui_progress 90 "Creating desktop shortcuts"
+    
+    mkdir -p "$HOME/.local/share/applications"
+    mkdir -p "$HOME/.local/share/icons"
+    
+    # Download icons
+    log "Downloading application icons"
+    
+    cache_fetch "https://upload.wikimedia.org/wikipedia/commons/c/cf/Affinity_%28App%29_Logo.svg" \
+        "$HOME/.local/share/icons/Affinity.svg" || true
+    
+    # Find Affinity V3 executable
+    local affinity_v3_exe=$(find "$WINEPREFIX/drive_c" -name "Affinity.exe" 2>/dev/null | head -1)
+    
+    if [ -n "$affinity_v3_exe" ] && [ -f "$affinity_v3_exe" ]; then
+        log "Creating desktop shortcut for Affinity V3: $affinity_v3_exe"
+        
+        write_launcher "$affinity_v3_exe"
+        
+        local desktop
+        desktop=$(desktop_file)
+        cat > "$desktop" <<EOF
+[Desktop Entry]
+Name=$SHORTCUT_NAME
+Comment=Unified Affinity application for photo editing, design, and publishing
+Icon=$HOME/.local/share/icons/Affinity.svg
+Path=$WINEPREFIX
+Exec="$WINEPREFIX/affinity-launch"
+Terminal=false
+Type=Application
+Categories=Graphics;
+StartupNotify=true
+StartupWMClass=affinity.exe
+EOF
+        chmod +x "$desktop"
+        log "Affinity V3 desktop shortcut created: $desktop"
+    fi
+    
+    if command -v update-desktop-database &> /dev/null; then
+        update-desktop-database "$HOME/.local/share/applications" 2>&1 | tee -a "$LOG_FILE" || true
+        log "Desktop database updated"
+    fi
+    
+    log "Desktop shortcuts creation completed"
+    
+    return 0
+}
+
+# ==========================================
+# Main Installation Flow
+# ==========================================
+
+# finish_phase STATUS - phase_end, then stop the install if the phase did
+# not start for lack of disk space
+finish_phase() {
+    phase_end "$1"
+    if [ "$1" -eq "$NO_SPACE_STATUS" ]; then
+        exit 1
+    fi
+}
+
+install_cleanup() {
+    local status=$1
+    if [ "$WINESERVER_RUNNING" = true ]; then
+        wineserver_stop --now
+    fi
+    rm -f "$WINESERVER_SHIM"
+    if [ "$WORK_DIR_CREATED" = true ]; then
+        rm -rf "$WORK_DIR"
+    fi
+    emit_event exit exit_code:=$status log_file="$LOG_FILE"
+}
+
+main() {
+    # Parse command-line arguments for GUI mode
+    while [[ $# -gt 0 ]]; do
+        case $1 in
+            --gui-mode)
+                GUI_MODE=true
+                shift
+                ;;
+            --prefix)
+                INSTALL_DIR="$2"
+                WINEPREFIX="$INSTALL_DIR"
+                shift 2
+                ;;
+            --installer)
+                INSTALLER_PATH="$2"
+                shift 2
+                ;;
+            --enable-dxvk)
+                ENABLE_DXVK=true
+                shift
+                ;;
+            --enable-vulkan)
+                ENABLE_VULKAN=true
+                shift
+                ;;
+            --enable-tahoma)
+                ENABLE_TAHOMA=true
+                shift
+                ;;
+            --cache-dir)
+                CACHE_DIR="$2"
+                shift 2
+                ;;
+            --cache-max-mb)
+                CACHE_MAX_MB="$2"
+                shift 2
+                ;;
+            --offline)
+                OFFLINE=true
+                shift
+                ;;
+            --event-fd)
+                EVENT_FD="$2"
+                shift 2
+                ;;
+            --golden-dir)
+                GOLDEN_DIR="$2"
+                shift 2
+                ;;
+            --export-golden)
+                EXPORT_GOLDEN=true
+                shift
+                ;;
+            --probe-file)
+                PROBE_FILE="$2"
+                shift 2
+                ;;
+            --no-resume)
+                RESUME=false
+                shift
+                ;;
+            --log-file)
+                LOG_FILE="$2"
+                shift 2
+                ;;
+            --python)
+                PYTHON_BIN="$2"
+                shift 2
+                ;;
+            --self)
+                SELF_PATH="$2"
+                shift 2
+                ;;
+            --share-payload)
+                SHARE_PAYLOAD=true
+                shift
+                ;;
+            --shader-cache-seed)
+                SHADER_CACHE_SEED="$2"
+                shift 2
+                ;;
+            --settings-profile)
+                SETTINGS_PROFILE="$2"
+                shift 2
+                ;;
+            --work-dir)
+                WORK_DIR="$2"
+                shift 2
+                ;;
+            --scratch-dir)
+                SCRATCH_DIR="$2"
+                shift 2
+                ;;
+            --shortcut-name)
+                SHORTCUT_NAME="$2"
+                shift 2
+                ;;
+            *)
+                shift
+                ;;
+        esac
+    done
+    
+    # Only show banner in non-GUI mode
+    if [ "$GUI_MODE" = false ]; then
+        clear
+        echo -e "${GREEN}━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━${NC}"
+        echo -e "${GREEN}   Affinity Linux Installation Script - ENHANCED${NC}"
+        echo -e "${GREEN}━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━${NC}"
+        echo ""
+    fi
+    
+    # Stop the wineserver on any exit; TERM and INT go through exit so the
+    # EXIT trap runs for them too
+    trap 'install_cleanup $?' EXIT
+    trap 'exit 143' TERM
+    trap 'exit 130' INT
+    emit_event start pid:=$$ log_file="$LOG_FILE"
+    
+    if [ -n "$PROBE_FILE" ] && [ -r "$PROBE_FILE" ]; then
+        source "$PROBE_FILE"
+    fi
+    
+    gui_progress 0 "Starting Affinity installation"
+    
+    log "=========================================="
+    log "Affinity Linux Installation Started"
+    log "=========================================="
+    
+    # Check Wine first
+    phase_begin wine_check
+    gui_progress 5 "Checking Wine installation"
+    
+    if ! check_wine_version; then
+        gui_error "Wine 10.0+ is required but not found"
+        log "ERROR: Wine 10.0+ not found"
+        phase_end 1
+        exit 1
+    fi
+    
+    log "Wine 10.0+ found"
+    phase_end 0
+    
+    setup_work_dir
+    cache_init
+    journal_load
+    
+    # Install components
+    phase_begin dependencies
+    install_missing_components
+    finish_phase $?
+    
+    # Download helper files
+    phase_begin helpers
+    download_helper_files
+    local helpers_status=$?
+    if [ $helpers_status -ne 0 ]; then
+        gui_error "Failed to download helper files"
+        log "ERROR: Failed to download helper files"
+    fi
+    phase_end $helpers_status
+    
+    if [ -n "$SCRATCH_DIR" ]; then
+        phase_begin scratch
+        wineserver_start
+        journal_step scratch "$(journal_fp "$WINEBOOT_FP" scratch "$SCRATCH_DIR")" configure_scratch_dir
+        finish_phase $?
+    fi
+    
+    # Install Affinity if installer provided
+    if [ -n "$INSTALLER_PATH" ]; then
+        APP_FP=$(journal_fp "$WINEBOOT_FP" app "$(basename "$INSTALLER_PATH")" \
+            "$(stat -c '%s %Y' "$INSTALLER_PATH" 2>/dev/null)")
+        phase_begin app
+        wineserver_start
+        journal_step app "$APP_FP" install_affinity_app
+        finish_phase $?
+        if [ "$ENABLE_DXVK" = true ]; then
+            phase_begin dxvk
+            journal_step dxvk "$(journal_fp "$APP_FP" dxvk)" configure_dxvk_workarounds
+            finish_phase $?
+        fi
+        phase_begin settings
+        deploy_settings_profile
+        phase_end $?
+        phase_begin preferences
+        journal_step preferences "$(journal_fp "$APP_FP" preferences "$ENABLE_DXVK" "$SCRATCH_DIR")" \
+            write_performance_preferences
+        finish_phase $?
+        phase_begin shortcuts
+        journal_step shortcuts "$(journal_fp "$APP_FP" shortcuts "$SHORTCUT_NAME")" create_desktop_shortcuts
+        finish_phase $?
+    fi
+    
+    wineserver_stop
+    
+    # Final summary
+    gui_progress 100 "Installation completed successfully"
+    gui_success "Affinity Linux installation completed successfully!"
+    
+    log "=========================================="
+    log "Affinity Linux Installation Completed"
+    log "=========================================="
+}
+
+# Run main function only if not in GUI mode
+# When GUI_MODE=true, script is being sourced to call specific functions
+if [ "$GUI_MODE" != true ]; then
+    main "$@"
+fi
+'''
+
+
+# Version of the JSON event stream BASH_SCRIPT writes to --event-fd
+EVENT_PROTOCOL_VERSION = 1
+
+
+def default_cache_dir():
+    """Per-user cache root, the same directory as CACHE_DIR in BASH_SCRIPT"""
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'AffinityOnLinux'
+
+
+# ============================================================================
+# COMMAND RUNNER - Subprocesses with Real Timeouts
+# ============================================================================
+
+class CommandResult:
+    """Outcome of CommandRunner.run()"""
+    
+    def __init__(self, returncode, lines, stopped=None):
+        self.returncode = returncode
+        self.lines = lines  # last max_lines (stream, line) pairs, in arrival order
+        self.stopped = stopped  # None, 'timeout', 'idle' or 'cancelled'
+    
+    @property
+    def ok(self):
+        return self.returncode == 0 and self.stopped is None
+    
+    @property
+    def output(self):
+        return '\n'.join(line for _, line in self.lines)
+    
+    def describe(self):
+        """Short failure reason for logs"""
+        if self.stopped == 'timeout':
+            return "Command timed out"
+        if self.stopped == 'idle':
+            return "Command produced no output for too long"
+        if self.stopped == 'cancelled':
+            return "Command cancelled"
+        return self.output
+
+
+class CommandRunner:
+    """Run subprocesses on asyncio with wall-clock and idle timeouts
+    
+    stdout and stderr are drained concurrently, line by line, into a
+    bounded buffer that keeps the last max_lines lines, so a chatty command
+    can neither stall on a full pipe nor grow memory without limit. The
+    timeout covers the whole run, even while a hung command holds its pipes
+    open; idle_timeout fires when neither stream has produced a line for
+    that long. Each command runs in its own session, and on timeout or
+    cancel() the whole process group gets SIGTERM and, if it lingers,
+    SIGKILL. Once the command itself exits, pipes still held open by
+    daemons it started (wineserver) are abandoned after a short grace.
+    
+    run() blocks the calling thread; run_many() runs several commands
+    concurrently in one event loop.
+    """
+    
+    KILL_GRACE = 5
+    EXIT_GRACE = 2
+    
+    def __init__(self, line_callback=None, max_lines=2000):
+        self.line_callback = line_callback  # called as (stream, line)
+        self.max_lines = max_lines
+        self.lock = threading.Lock()
+        self.cancel_events = []  # (loop, asyncio.Event) of runs in progress
+        self.cancelled = False
+    
+    def run(self, cmd, **kwargs):
+        """Run one command to completion; see run_async() for options"""
+        import asyncio
+        return asyncio.run(self.run_async(cmd, **kwargs))
+    
+    def run_many(self, commands):
+        """Run [(cmd, kwargs), ...] concurrently; returns results in order"""
+        import asyncio
+        
+        async def gather():
+            return await asyncio.gather(*(self.run_async(cmd, **kwargs) for cmd, kwargs in commands))
+        return asyncio.run(gather())
+    
+    def cancel(self):
+        """Stop every command this runner is running; safe from any thread"""
+        with self.lock:
+            self.cancelled = True
+            for loop, event in self.cancel_events:
+                loop.call_soon_threadsafe(event.set)
+    
+    async def run_async(self, cmd, input=None, timeout=None, idle_timeout=None, env=None, cwd=None,
+                        pass_fds=()):
+        import asyncio
+        import collections
+        
+        loop = asyncio.get_running_loop()
+        cancel_event = asyncio.Event()
+        with self.lock:
+            if self.cancelled:
+                return CommandResult(None, [], 'cancelled')
+            self.cancel_events.append((loop, cancel_event))
+        
+        lines = collections.deque(maxlen=self.max_lines)
+        last_output = [loop.time()]
+        transports = []
+        
+        async def drain(reader, name):
+            while True:
+                try:
+                    raw = await reader.readline()
+                except ValueError:
+                    # Line longer than the stream limit: take it in pieces
+                    raw = await reader.read(1 << 16)
+                if not raw:
+                    return
+                last_output[0] = loop.time()
+                line = raw.decode('utf-8', 'replace').rstrip('\r\n')
+                lines.append((name, line))
+                if self.line_callback:
+                    self.line_callback(name, line)
+        
+        # Our own pipes rather than asyncio's: its process.wait() also waits
+        # for the pipes to close, which a daemon child can delay forever
+        pipes = [os.pipe(), os.pipe()]
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+                stdout=pipes[0][1],
+                stderr=pipes[1][1],
+                env=env,
+                cwd=cwd,
+                pass_fds=pass_fds,
+                start_new_session=True
+            )
+        except OSError as e:
+            for read_fd, _ in pipes:
+                os.close(read_fd)
+            with self.lock:
+                self.cancel_events.remove((loop, cancel_event))
+            return CommandResult(None, [('stderr', str(e))])
+        finally:
+            for _, write_fd in pipes:
+                os.close(write_fd)
+        
+        readers = []
+        for (read_fd, _), name in zip(pipes, ('stdout', 'stderr')):
+            reader = asyncio.StreamReader(limit=1 << 20)
+            transport, _ = await loop.connect_read_pipe(lambda reader=reader: asyncio.StreamReaderProtocol(reader),
+                                                        os.fdopen(read_fd, 'rb', 0))
+            transports.append(transport)
+            readers.append(drain(reader, name))
+        readers = asyncio.gather(*readers)
+        
+        if input is not None:
+            try:
+                process.stdin.write(input.encode())
+                await process.stdin.drain()
+                process.stdin.close()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        
+        exited = asyncio.ensure_future(process.wait())
+        cancelled = asyncio.ensure_future(cancel_event.wait())
+        started = loop.time()
+        stopped = None
+        exit_deadline = None
+        
+        try:
+            while not (readers.done() and exited.done()):
+                now = loop.time()
+                deadlines = []
+                if exited.done():
+                    exit_deadline = exit_deadline or now + self.EXIT_GRACE
+                    deadlines.append(exit_deadline)
+                if timeout:
+                    deadlines.append(started + timeout)
+                if idle_timeout and not exited.done():
+                    deadlines.append(last_output[0] + idle_timeout)
+                
+                await asyncio.wait({f for f in (readers, exited, cancelled) if not f.done()},
+                                   timeout=max(0, min(deadlines) - now) if deadlines else None,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                
+                now = loop.time()
+                if readers.done() and exited.done():
+                    break
+                if cancelled.done():
+                    stopped = 'cancelled'
+                elif timeout and now >= started + timeout:
+                    stopped = 'timeout'
+                elif idle_timeout and not exited.done() and now >= last_output[0] + idle_timeout:
+                    stopped = 'idle'
+                elif exit_deadline and now >= exit_deadline:
+                    break  # exited, but a daemon it spawned holds the pipes
+                if stopped:
+                    await self.kill(process, exited)
+                    break
+            
+            if not readers.done():
+                readers.cancel()
+                try:
+                    await readers
+                except asyncio.CancelledError:
+                    pass
+            await exited
+        finally:
+            cancelled.cancel()
+            for transport in transports:
+                transport.close()
+            with self.lock:
+                self.cancel_events.remove((loop, cancel_event))
+        
+        return CommandResult(process.returncode, list(lines), stopped)
+    
+    async def kill(self, process, exited):
+        """SIGTERM the process group, then SIGKILL it after KILL_GRACE"""
+        import asyncio
+        import signal
+        
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                return
+            try:
+                await asyncio.wait_for(asyncio.shield(exited), self.KILL_GRACE)
+                return
+            except asyncio.TimeoutError:
+                continue
+
+
+# ============================================================================
+# SYSTEM PROBE - Cached Environment Detection
+# ============================================================================
+
+class SystemProbe:
+    """Detect the tools and hardware the installer depends on, once
+    
+    Probes run concurrently and are cached in probe.json under the cache
+    directory. Every entry keeps a fingerprint of the files it was derived
+    from (resolved binary paths with mtime and size, /etc/os-release, the
+    Vulkan ICD directories) and is probed again only when that changes, so
+    upgrading Wine is picked up without spawning `wine --version` on every
+    start. Free disk space is never cached.
+    
+    The same results are written to probe.env as shell assignments, which
+    BASH_SCRIPT reads through --probe-file.
+    """
+    
+    CACHE_VERSION = 1
+    TOOLS = ('winetricks', 'curl', 'wget', '7z', 'unzip', 'zstd')
+    OS_RELEASE = '/etc/os-release'
+    VULKAN_ICD_DIRS = ('/usr/share/vulkan/icd.d', '/etc/vulkan/icd.d')
+    
+    def __init__(self, cache_dir=None):
+        cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+        self.cache_path = cache_dir / 'probe.json'
+        self.env_path = cache_dir / 'probe.env'
+        self.results = {}  # name -> {'fingerprint': [...], 'value': ...}
+        self.lock = threading.Lock()
+        self.checked = False
+    
+    @staticmethod
+    def stat_paths(*paths):
+        """Fingerprint a list of paths by mtime and size"""
+        prints = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+                prints.append([str(path), st.st_mtime_ns, st.st_size])
+            except (OSError, TypeError):
+                prints.append([str(path), None, None])
+        return prints
+    
+    @staticmethod
+    def which(name):
+        """Resolved path of an executable on PATH, or None"""
+        path = shutil.which(name)
+        return os.path.realpath(path) if path else None
+    
+    def fingerprints(self):
+        """Cheap fingerprints for every probe, computed without running anything"""
+        return {
+            'wine': self.stat_paths(self.which('wine')),
+            'tools': self.stat_paths(*(self.which(tool) for tool in self.TOOLS)),
+            'distro': self.stat_paths(self.OS_RELEASE),
+            'gpu': self.stat_paths('/dev/dri', *self.VULKAN_ICD_DIRS),
+        }
+    
+    def probe_wine(self):
+        """Wine binary and version"""
+        wine_cmd = shutil.which('wine')
+        info = {'path': wine_cmd, 'id': None, 'version': None, 'major': None, 'minor': None}
+        if not wine_cmd:
+            return info
+        
+        result = CommandRunner().run([wine_cmd, '--version'], timeout=10)
+        if not result.ok:
+            return info
+        
+        info['id'] = '\n'.join(line for stream, line in result.lines if stream == 'stdout').strip()
+        match = re.search(r'(\d+)\.(\d+)', info['id'])
+        if match:
+            info['major'] = int(match.group(1))
+            info['minor'] = int(match.group(2))
+            info['version'] = f"{info['major']}.{info['minor']}"
+        return info
+    
+    def probe_tools(self):
+        """Paths of the download and extraction helpers"""
+        return {tool: shutil.which(tool) for tool in self.TOOLS}
+    
+    def probe_distro(self):
+        """ID, ID_LIKE, VERSION_ID and codename from os-release"""
+        fields = {}
+        try:
+            with open(self.OS_RELEASE) as f:
+                for line in f:
+                    key, sep, value = line.strip().partition('=')
+                    if sep:
+                        fields[key] = value.strip().strip('"\'')
+        except OSError:
+            pass
+        
+        return {
+            'id': fields.get('ID'),
+            'like': fields.get('ID_LIKE', '').split(),
+            'version_id': fields.get('VERSION_ID'),
+            'codename': (fields.get('UBUNTU_CODENAME') or fields.get('VERSION_CODENAME')),
+        }
+    
+    def probe_gpu(self):
+        """DRM render nodes and installed Vulkan ICDs"""
+        try:
+            render_nodes = sorted(n for n in os.listdir('/dev/dri') if n.startswith('renderD'))
+        except OSError:
+            render_nodes = []
+        
+        icds = []
+        for icd_dir in self.VULKAN_ICD_DIRS:
+            try:
+                icds.extend(sorted(n for n in os.listdir(icd_dir) if n.endswith('.json')))
+            except OSError:
+                pass
+        
+        return {'render_nodes': render_nodes, 'vulkan_icds': icds,
+                'vulkan': bool(render_nodes and icds)}
+    
+    def load(self):
+        """Read probe.json, ignoring a missing or outdated cache"""
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('version') != self.CACHE_VERSION:
+            return {}
+        return data.get('results', {})
+    
+    def save(self):
+        """Write probe.json and probe.env atomically"""
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            for path, text in ((self.cache_path, json.dumps({'version': self.CACHE_VERSION,
+                                                             'results': self.results}, indent=1)),
+                               (self.env_path, self.shell_env())):
+                partial = path.with_name(path.name + f'.{os.getpid()}')
+                partial.write_text(text)
+                os.replace(partial, path)
+        except OSError:
+            pass
+    
+    def refresh(self, force=False):
+        """Re-run the probes whose fingerprint changed and return all results"""
+        with self.lock:
+            current = self.fingerprints()
+            cached = {} if force else (self.results or self.load())
+            stale = [name for name, fingerprint in current.items()
+                     if cached.get(name, {}).get('fingerprint') != fingerprint]
+            
+            if stale:
+                from concurrent.futures import ThreadPoolExecutor
+                with ThreadPoolExecutor(max_workers=len(stale)) as pool:
+                    values = dict(zip(stale, pool.map(lambda name: getattr(self, f'probe_{name}')(), stale)))
+                for name in stale:
+                    cached[name] = {'fingerprint': current[name], 'value': values[name]}
+            
+            self.results = cached
+            self.checked = True
+            if stale or not self.env_path.exists():
+                self.save()
+            return {name: entry['value'] for name, entry in self.results.items()}
+    
+    def get(self, name):
+        """Value of one probe, refreshing the cache on first use"""
+        if not self.checked:
+            self.refresh()
+        return self.results[name]['value']
+    
+    def invalidate(self):
+        """Force the next get() to recheck fingerprints, e.g. after installing Wine"""
+        with self.lock:
+            self.checked = False
+    
+    def wine_status(self):
+        """Return (status, version): status is 'ok', 'missing' or 'old'"""
+        wine = self.get('wine')
+        if wine['major'] is None:
+            return "missing", None
+        if wine['major'] < 10:
+            return "old", wine['version']
+        return "ok", wine['version']
+    
+    @staticmethod
+    def free_bytes(path):
+        """Free space on the filesystem holding path (or its nearest existing parent)"""
+        path = Path(path).expanduser().absolute()
+        while not path.exists() and path != path.parent:
+            path = path.parent
+        try:
+            return shutil.disk_usage(path).free
+        except OSError:
+            return None
+    
+    def shell_env(self):
+        """Probe results as PROBE_* shell assignments for BASH_SCRIPT"""
+        values = {name: entry['value'] for name, entry in self.results.items()}
+        wine = values.get('wine', {})
+        distro = values.get('distro', {})
+        gpu = values.get('gpu', {})
+        assignments = {
+            'PROBE_WINE_ID': wine.get('id'),
+            'PROBE_WINE_VERSION': wine.get('version'),
+            'PROBE_DISTRO': distro.get('id'),
+            'PROBE_CODENAME': distro.get('codename'),
+            'PROBE_VULKAN': 'true' if gpu.get('vulkan') else 'false',
+        }
+        for tool, path in values.get('tools', {}).items():
+            assignments[f"PROBE_{tool.upper().replace('7Z', 'SEVENZIP')}"] = path
+        return ''.join(f"{key}={shlex.quote(value or '')}\n" for key, value in assignments.items())
+
+
+_system_probe = None
+
+
+def system_probe():
+    """Process-wide SystemProbe instance"""
+    global _system_probe
+    if _system_probe is None:
+        _system_probe = SystemProbe()
+    return _system_probe
+
+
+# ============================================================================
+# PROGRESS MONITOR - Track Installation Activity
+# ============================================================================
+
+class ProgressMonitor:
+    """Track installation activity from the installer's output
+    
+    Output is either fed in line by line as it arrives on the installer's
+    stdout pipe, or picked up from the log file through inotify. Stall
+    detection runs on a watchdog thread that sleeps until the next deadline
+    instead of polling, so nothing wakes up while the installer is quietly
+    busy (the dotnet48 phase can go minutes without output).
+    """
+    
+    IN_MODIFY = 0x00000002
+    IN_CLOEXEC = 0o2000000
+    
+    def __init__(self, log_file=None, log_callback=None, progress_callback=None, stall_seconds=30):
+        self.log_file = log_file
+        self.log_callback = log_callback or print
+        self.progress_callback = progress_callback
+        self.stall_seconds = stall_seconds
+        
+        self.started_at = None
+        self.last_activity = None
+        self.bytes_total = 0
+        self.lines_total = 0
+        self.stalled_since = None
+        self.phase = None
+        self.phase_started = None
+        self.phases = []  # (name, seconds) of finished phases
+        
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._wake_pipe = None
+    
+    def start(self, watch_log=False):
+        """Start the stall watchdog, and the log file watcher if requested"""
+        now = time.monotonic()
+        self.started_at = now
+        self.last_activity = now
+        
+        self._threads.append(threading.Thread(target=self._watchdog, daemon=True))
+        if watch_log and self.log_file:
+            self._wake_pipe = os.pipe()
+            self._threads.append(threading.Thread(target=self._watch_log, daemon=True))
+        
+        for thread in self._threads:
+            thread.start()
+    
+    def stop(self):
+        """Stop watching and close the current phase"""
+        self._stopping.set()
+        if self._wake_pipe:
+            os.write(self._wake_pipe[1], b'x')
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self.set_phase(None)
+        if self._wake_pipe:
+            for fd in self._wake_pipe:
+                os.close(fd)
+            self._wake_pipe = None
+    
+    def feed(self, line):
+        """Record one line of installer output"""
+        self._record(len(line.encode('utf-8', 'replace')) + 1, 1)
+    
+    def set_phase(self, name):
+        """Start timing a new phase, closing the previous one"""
+        now = time.monotonic()
+        with self._lock:
+            if name == self.phase:
+                return
+            if self.phase is not None:
+                self.phases.append((self.phase, now - self.phase_started))
+            self.phase = name
+            self.phase_started = now
+        if self.progress_callback and name is not None:
+            self.progress_callback(self.get_status())
+    
+    def get_status(self):
+        """Get current status"""
+        now = time.monotonic()
+        with self._lock:
+            elapsed = now - self.started_at if self.started_at else 0.0
+            return {
+                'active': self.stalled_since is None,
+                'idle_seconds': now - self.last_activity if self.last_activity else 0.0,
+                'elapsed_seconds': elapsed,
+                'bytes_processed': self.bytes_total,
+                'lines_processed': self.lines_total,
+                'bytes_per_second': self.bytes_total / elapsed if elapsed else 0.0,
+                'lines_per_second': self.lines_total / elapsed if elapsed else 0.0,
+                'phase': self.phase,
+                'phase_seconds': now - self.phase_started if self.phase_started else 0.0,
+                'phases': list(self.phases),
+            }
+    
+    def _record(self, byte_count, line_count):
+        now = time.monotonic()
+        with self._lock:
+            self.bytes_total += byte_count
+            self.lines_total += line_count
+            self.last_activity = now
+            stalled_since = self.stalled_since
+            self.stalled_since = None
+        
+        if stalled_since is not None:
+            self.log_callback(f"  ✓ ACTIVE again after {now - stalled_since:.0f}s idle")
+    
+    def _watchdog(self):
+        """Report stalls, sleeping until the next deadline in between"""
+        report_after = self.stall_seconds
+        while True:
+            with self._lock:
+                idle = time.monotonic() - self.last_activity
+            if idle < self.stall_seconds:
+                report_after = self.stall_seconds
+            
+            # Activity only moves the deadline; it never wakes this thread
+            if self._stopping.wait(max(report_after - idle, 0.1)):
+                return
+            
+            with self._lock:
+                idle = time.monotonic() - self.last_activity
+                if idle < report_after:
+                    continue
+                if self.stalled_since is None:
+                    self.stalled_since = self.last_activity
+                phase = self.phase
+            
+            suffix = f" during: {phase}" if phase else ""
+            self.log_callback(f"  ⏸ IDLE ({idle:.0f}s){suffix}")
+            # Back off so long quiet phases are not reported every few seconds
+            report_after = min(report_after * 2, 300)
+    
+    def _watch_log(self):
+        """Feed log file growth in as it is written, via inotify if available"""
+        offset = 0
+        inotify_fd = self._inotify_watch(self.log_file)
+        wake_fd = self._wake_pipe[0]
+        
+        try:
+            while not self._stopping.is_set():
+                watched = [wake_fd] + ([inotify_fd] if inotify_fd is not None else [])
+                # Without inotify, fall back to checking once per stall window
+                timeout = None if inotify_fd is not None else self.stall_seconds
+                readable, _, _ = select.select(watched, [], [], timeout)
+                
+                if inotify_fd in readable:
+                    os.read(inotify_fd, 4096)
+                
+                try:
+                    with open(self.log_file, 'rb') as f:
+                        f.seek(offset)
+                        data = f.read()
+                except OSError:
+                    continue
+                
+                if data:
+                    offset += len(data)
+                    self._record(len(data), data.count(b'\n'))
+        finally:
+            if inotify_fd is not None:
+                os.close(inotify_fd)
+    
+    def _inotify_watch(self, path):
+        """Return an inotify fd watching path for writes, or None"""
+        try:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(self.IN_CLOEXEC)
+            if fd < 0:
+                return None
+            if libc.inotify_add_watch(fd, os.fsencode(path), self.IN_MODIFY) < 0:
+                os.close(fd)
+                return None
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+
+# ============================================================================
+# PACKAGE MIRROR - Local Repositories for Offline Wine Installs
+# ============================================================================
+
+class PackageMirror:
+    """A local or LAN copy of the packages WineInstaller needs
+    
+    location is a directory, a file:// URL or an http(s):// URL with one
+    repository per package family:
+    
+        debian/  flat apt repository (Packages index and *.deb files)
+        fedora/  dnf repository (repodata/ and *.rpm files)
+        arch/    pacman repository (affinity-local.db and packages)
+    
+    When a mirror is set, apt, dnf and pacman are pointed only at it, so
+    Wine installs at disk or LAN speed without internet access. Mirrors are
+    built with WineInstaller.seed_mirror() on a reference machine.
+    """
+    
+    REPO_NAME = 'affinity-local'
+    
+    # Files a seeded repository must contain, per family
+    INDEXES = {
+        'debian': ('Packages', 'Packages.gz', 'Packages.xz'),
+        'fedora': ('repodata/repomd.xml',),
+        'arch': (f'{REPO_NAME}.db',),
+    }
+    
+    def __init__(self, location):
+        location = str(location)
+        if '://' in location and not location.startswith('file://'):
+            self.path = None
+            self.url = location.rstrip('/')
+        else:
+            if location.startswith('file://'):
+                from urllib.parse import unquote, urlparse
+                location = unquote(urlparse(location).path)
+            self.path = Path(location).expanduser().resolve()
+            self.url = self.path.as_uri()
+    
+    def __str__(self):
+        return str(self.path or self.url)
+    
+    def family_url(self, family):
+        return f"{self.url}/{family}"
+    
+    def available(self, family):
+        """Whether the mirror has an index for family (remote ones are assumed to)"""
+        if self.path is None:
+            return True
+        return any((self.path / family / index).is_file() for index in self.INDEXES[family])
+    
+    def config_file(self, family):
+        """Write the apt sources list or pacman.conf that selects only the mirror
+        
+        Returns the path of a temporary file the caller must delete; dnf takes
+        the repository on its command line and gets None.
+        """
+        url = self.family_url(family)
+        if family == 'debian':
+            content = f"deb [trusted=yes] {url} ./\n"
+        elif family == 'arch':
+            content = (
+                "[options]\n"
+                "Architecture = auto\n"
+                "SigLevel = Optional TrustAll\n"
+                f"\n[{self.REPO_NAME}]\n"
+                f"Server = {url}\n"
+            )
+        else:
+            return None
+        
+        fd, path = tempfile.mkstemp(prefix=f"{self.REPO_NAME}-", suffix='.conf')
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        os.chmod(path, 0o644)
+        return path
+
+
+# ============================================================================
+# WINE INSTALLER - Pure Python Implementation
+# ============================================================================
+
+class WineInstaller:
+    """Pure Python Wine 10+ installer for multiple Linux distributions"""
+    
+    # Package family of each supported distribution
+    DISTRO_FAMILIES = {
+        'ubuntu': 'debian', 'debian': 'debian', 'linuxmint': 'debian', 'pop': 'debian', 'zorin': 'debian',
+        'fedora': 'fedora', 'nobara': 'fedora', 'rhel': 'fedora', 'centos': 'fedora',
+        'arch': 'arch', 'manjaro': 'arch', 'endeavouros': 'arch',
+    }
+    
+    # Packages to install (and to seed mirrors with), per family
+    PACKAGES = {
+        'debian': ['winehq-stable', 'winetricks'],
+        'fedora': ['wine', 'winetricks'],
+        'arch': ['wine', 'winetricks'],
+    }
+    
+    def __init__(self, sudo_password, log_callback=None, mirror=None):
+        self.sudo_password = sudo_password
+        self.log = log_callback or print
+        self.distro = system_probe().get('distro')['id']
+        self.family = self.DISTRO_FAMILIES.get(self.distro)
+        self.mirror = PackageMirror(mirror) if mirror else None
+    
+    def _run_sudo_command(self, cmd, timeout=300, idle_timeout=300):
+        """Run command with sudo using stored password and log output in real-time
+        
+        timeout bounds the whole command, idle_timeout the time without any
+        output; either one kills it, even while it keeps its pipes open.
+        """
+        if isinstance(cmd, str):
+            cmd = shlex.split(cmd)
+        
+        # -p '' keeps sudo's password prompt out of the output
+        full_cmd = ['sudo', '-S', '-p', ''] + cmd
+        
+        runner = CommandRunner(line_callback=lambda stream, line: self.log(f"  {line}") if line else None)
+        result = runner.run(full_cmd, input=f"{self.sudo_password}\n",
+                            timeout=timeout, idle_timeout=idle_timeout)
+        return result.ok, result.describe()
+    
+    def _run_sudo_commands(self, commands):
+        """Run independent sudo commands concurrently
+        
+        commands is a list of (cmd, timeout) pairs; returns a list of
+        (success, output) in the same order. Only use this for steps that
+        do not touch the same files or package database.
+        """
+        runner = CommandRunner(line_callback=lambda stream, line: self.log(f"  {line}") if line else None)
+        results = runner.run_many([
+            (['sudo', '-S', '-p', ''] + (shlex.split(cmd) if isinstance(cmd, str) else cmd),
+             {'input': f"{self.sudo_password}\n", 'timeout': timeout, 'idle_timeout': timeout})
+            for cmd, timeout in commands
+        ])
+        return [(result.ok, result.describe()) for result in results]
+    
+    def check_wine_version(self):
+        """Check if Wine 10+ is installed"""
+        status, version = system_probe().wine_status()
+        return status == "ok", version
+    
+    def install_wine_debian(self, progress_callback=None):
+        """Install Wine 10+ on Debian/Ubuntu from WineHQ"""
+        self.log("📥 Installing Wine 10+ on Debian/Ubuntu...")
+        if progress_callback:
+            progress_callback(5, "Checking repository setup")
+        
+        codename = self.debian_codename()
+        if self.distro == "ubuntu":
+            repo_url = f"https://dl.winehq.org/wine-builds/ubuntu/dists/{codename}/winehq-{codename}.sources"
+        else:
+            repo_url = f"https://dl.winehq.org/wine-builds/debian/dists/{codename}/winehq-{codename}.sources"
+        key_file = "/etc/apt/keyrings/winehq-archive.key"
+        sources_file = f"/etc/apt/sources.list.d/winehq-{codename}.sources"
+        
+        # Only queue the steps that are not already in place
+        steps = []
+        need_arch = "i386" not in self.foreign_architectures()
+        if need_arch:
+            self.log("🔧 Enabling 32-bit architecture...")
+            steps.append(("dpkg --add-architecture i386", 60, False))
+        else:
+            self.log("✓ 32-bit architecture already enabled")
+        
+        if os.path.isfile(key_file) and os.path.getsize(key_file) > 0:
+            self.log("✓ WineHQ repository key already present")
+        else:
+            self.log("🔑 Downloading WineHQ repository key...")
+            steps.append((["sh", "-c", f"mkdir -pm755 /etc/apt/keyrings && wget -O {key_file} https://dl.winehq.org/wine-builds/winehq.key"], 60, True))
+        
+        if os.path.exists(sources_file):
+            self.log(f"✓ WineHQ repository for {codename} already configured")
+        else:
+            self.log(f"📦 Adding WineHQ repository for {codename}...")
+            steps.append((f"wget -NP /etc/apt/sources.list.d/ {repo_url}", 60, False))
+        
+        if progress_callback:
+            progress_callback(15, "Configuring WineHQ repository")
+        
+        # The architecture, key and sources file are independent, so they
+        # are set up concurrently
+        results = self._run_sudo_commands([(cmd, timeout) for cmd, timeout, _ in steps])
+        for (cmd, _, required), (success, output) in zip(steps, results):
+            if success:
+                continue
+            if required:
+                return False, "Failed to download WineHQ key"
+            self.log(f"⚠️  Warning: {output}")
+        
+        if progress_callback:
+            progress_callback(30, "Updating package list")
+        
+        # A new architecture needs every index refreshed; otherwise only the
+        # WineHQ source can have changed
+        if need_arch or not os.path.exists(sources_file):
+            self.log("🔄 Updating package list...")
+            success, output = self._run_sudo_command("apt-get update", timeout=180)
+        else:
+            self.log("🔄 Updating WineHQ package list...")
+            success, output = self._run_sudo_command(
+                f"apt-get update -o Dir::Etc::sourcelist={sources_file} "
+                "-o Dir::Etc::sourceparts=- -o APT::Get::List-Cleanup=0",
+                timeout=180
+            )
+        if not success:
+            return False, "Failed to update package list"
+        
+        if progress_callback:
+            progress_callback(40, "Installing Wine 10+ and winetricks")
+        
+        # Install Wine and winetricks
+        self.log("📥 Installing Wine 10+ and winetricks (this may take several minutes)...")
+        success, output = self._run_sudo_command(
+            "apt install --install-recommends winehq-stable winetricks -y",
+            timeout=600
+        )
+        
+        if progress_callback:
+            progress_callback(90, "Verifying installation")
+        
+        if success:
+            self.log("✅ Wine 10+ installed successfully!")
+            if progress_callback:
+                progress_callback(100, "Wine installation complete")
+            return True, "Wine installed"
+        else:
+            return False, output
+    
+    def debian_codename(self):
+        """Release codename for the WineHQ repository URL"""
+        codename = system_probe().get('distro')['codename']
+        if codename:
+            return codename
+        
+        result = CommandRunner().run(["lsb_release", "-cs"], timeout=5)
+        stdout = [line.strip() for stream, line in result.lines if stream == 'stdout' and line.strip()]
+        if result.ok and stdout:
+            return stdout[0]
+        return "jammy"  # Default to Ubuntu 22.04
+    
+    def foreign_architectures(self):
+        """Architectures dpkg already has enabled besides the native one"""
+        result = CommandRunner().run(["dpkg", "--print-foreign-architectures"], timeout=10)
+        return result.output.split() if result.ok else []
+    
+    def install_wine_fedora(self, progress_callback=None):
+        """Install Wine on Fedora"""
+        self.log("📥 Installing Wine on Fedora...")
+        
+        if progress_callback:
+            progress_callback(30, "Installing Wine and winetricks")
+        
+        success, output = self._run_sudo_command(
+            "dnf install wine winetricks -y",
+            timeout=600
+        )
+        
+        if progress_callback:
+            progress_callback(90, "Verifying installation")
+        
+        if success:
+            self.log("✅ Wine installed successfully!")
+            if progress_callback:
+                progress_callback(100, "Wine installation complete")
+            return True, "Wine installed"
+        else:
+            return False, output
+    
+    def install_wine_arch(self, progress_callback=None):
+        """Install Wine on Arch Linux"""
+        self.log("📥 Installing Wine on Arch Linux...")
+        
+        if progress_callback:
+            progress_callback(30, "Installing Wine and winetricks")
+        
+        success, output = self._run_sudo_command(
+            "pacman -S --needed wine winetricks",
+            timeout=600
+        )
+        
+        if progress_callback:
+            progress_callback(90, "Verifying installation")
+        
+        if success:
+            self.log("✅ Wine installed successfully!")
+            if progress_callback:
+                progress_callback(100, "Wine installation complete")
+            return True, "Wine installed"
+        else:
+            return False, output
+    
+    def install_wine_mirror(self, progress_callback=None):
+        """Install Wine from the local package mirror only"""
+        family = self.family
+        url = self.mirror.family_url(family)
+        if not self.mirror.available(family):
+            return False, f"{url} has no {family} repository; seed it with --seed-mirror"
+        self.log(f"📥 Installing Wine from package mirror {url}...")
+        packages = ' '.join(self.PACKAGES[family])
+        
+        config = self.mirror.config_file(family)
+        try:
+            steps = []
+            if family == "debian":
+                if "i386" not in self.foreign_architectures():
+                    steps.append(("Enabling 32-bit architecture", "dpkg --add-architecture i386", 60))
+                # Only the mirror is listed, so nothing is fetched from the network
+                options = (f"-o Dir::Etc::sourcelist={config} -o Dir::Etc::sourceparts=- "
+                           "-o APT::Get::List-Cleanup=0")
+                steps.append(("Reading mirror package list", f"apt-get update {options}", 180))
+                steps.append(("Installing Wine 10+ and winetricks",
+                              f"apt-get install --install-recommends -y {options} {packages}", 600))
+            elif family == "fedora":
+                repo = PackageMirror.REPO_NAME
+                steps.append(("Installing Wine and winetricks",
+                              f"dnf install -y --repofrompath={repo},{url} --repo={repo} --nogpgcheck {packages}", 600))
+            else:
+                steps.append(("Installing Wine and winetricks",
+                              f"pacman -Sy --needed --noconfirm --config {config} {packages}", 600))
+            
+            for index, (message, cmd, timeout) in enumerate(steps):
+                if progress_callback:
+                    progress_callback(10 + 80 * index // len(steps), message)
+                self.log(f"🔧 {message}...")
+                success, output = self._run_sudo_command(cmd, timeout=timeout)
+                if not success:
+                    return False, output
+        finally:
+            if config:
+                os.unlink(config)
+        
+        self.log("✅ Wine installed successfully from the package mirror!")
+        if progress_callback:
+            progress_callback(100, "Wine installation complete")
+        return True, "Wine installed"
+    
+    def seed_mirror(self, directory, progress_callback=None):
+        """Download Wine and its full dependency closure into a mirror directory
+        
+        Run on a reference machine with network access and the same
+        distribution (and WineHQ repository, on Debian/Ubuntu) as the targets.
+        """
+        if not self.family:
+            return False, f"Unsupported distribution: {self.distro}"
+        
+        family = self.family
+        target = Path(directory).expanduser().resolve() / family
+        target.mkdir(parents=True, exist_ok=True)
+        packages = self.PACKAGES[family]
+        runner = CommandRunner(line_callback=lambda stream, line: self.log(f"  {line}") if stream == 'stderr' and line else None)
+        self.log(f"📦 Seeding {family} package mirror in {target}...")
+        
+        if progress_callback:
+            progress_callback(10, "Resolving dependencies")
+        
+        if family == "debian":
+            # Every package name apt could pull in, including the i386 ones
+            result = runner.run(["apt-cache", "depends", "--recurse", "--no-suggests", "--no-conflicts",
+                                 "--no-breaks", "--no-replaces", "--no-enhances"] + packages, timeout=300)
+            if not result.ok:
+                return False, result.describe()
+            names = sorted({line for stream, line in result.lines
+                            if stream == 'stdout' and line and not line[0].isspace() and not line.startswith('<')})
+            
+            if progress_callback:
+                progress_callback(30, f"Downloading {len(names)} packages")
+            result = runner.run(["apt-get", "download"] + names, cwd=str(target), timeout=3600, idle_timeout=600)
+            if not result.ok:
+                return False, result.describe()
+            
+            if progress_callback:
+                progress_callback(80, "Writing package index")
+            if shutil.which("apt-ftparchive"):
+                index_cmd = "apt-ftparchive packages . > Packages"
+            else:
+                index_cmd = "dpkg-scanpackages --multiversion . /dev/null > Packages"
+            result = runner.run(["sh", "-c", index_cmd], cwd=str(target), timeout=600)
+        
+        elif family == "fedora":
+            if progress_callback:
+                progress_callback(30, "Downloading packages")
+            result = runner.run(["dnf", "download", "--resolve", "--alldeps", f"--destdir={target}"] + packages,
+                                timeout=3600, idle_timeout=600)
+            if not result.ok:
+                return False, result.describe()
+            
+            if progress_callback:
+                progress_callback(80, "Writing package index")
+            createrepo = shutil.which("createrepo_c") or "createrepo"
+            result = runner.run([createrepo, str(target)], timeout=600)
+        
+        else:
+            # An empty database makes pacman download the whole closure
+            if progress_callback:
+                progress_callback(30, "Downloading packages")
+            # pacman fills the database as root, so only sudo can remove it again
+            dbpath = tempfile.mkdtemp(prefix=f"{PackageMirror.REPO_NAME}-db-")
+            try:
+                success, output = self._run_sudo_command(
+                    ["pacman", "-Syw", "--noconfirm", "--dbpath", dbpath, "--cachedir", str(target)] + packages,
+                    timeout=3600, idle_timeout=600
+                )
+                if success:
+                    success, output = self._run_sudo_command(
+                        ["chown", "-R", f"{os.getuid()}:{os.getgid()}", str(target)], timeout=60
+                    )
+            finally:
+                removed, removal_output = self._run_sudo_command(["rm", "-rf", dbpath], timeout=60)
+            if not success:
+                return False, output
+            if not removed:
+                return False, f"Could not remove temporary package database {dbpath}: {removal_output}"
+            
+            if progress_callback:
+                progress_callback(80, "Writing package index")
+            result = runner.run(["sh", "-c", f"repo-add -q {PackageMirror.REPO_NAME}.db.tar.gz *.pkg.tar.*"],
+                                cwd=str(target), timeout=600)
+        
+        if not result.ok:
+            return False, result.describe()
+        
+        self.log(f"✅ Package mirror ready: {target}")
+        if progress_callback:
+            progress_callback(100, "Package mirror ready")
+        return True, str(target)
+    
+    def install(self, progress_callback=None):
+        """Install Wine 10+ based on detected distribution"""
+        if not self.distro:
+            return False, "Could not detect Linux distribution"
+        
+        self.log(f"🐧 Detected distribution: {self.distro}")
+        
+        if progress_callback:
+            progress_callback(0, "Starting Wine installation")
+        
+        if self.family and self.mirror:
+            result = self.install_wine_mirror(progress_callback)
+        elif self.family == "debian":
+            result = self.install_wine_debian(progress_callback)
+        elif self.family == "fedora":
+            result = self.install_wine_fedora(progress_callback)
+        elif self.family == "arch":
+            result = self.install_wine_arch(progress_callback)
+        else:
+            return False, f"Unsupported distribution: {self.distro}"
+        
+        # The new Wine binary changes the probe fingerprint
+        system_probe().invalidate()
+        return result
+
+
+# ============================================================================
+# INSTALL TRACE - Chrome Trace / Perfetto Export
+# ============================================================================
+
+class InstallTrace:
+    """Build a Chrome Trace Event (Perfetto) JSON file of one install
+    
+    Spans come from the phase_start/phase_end events, so every phase and
+    every winetricks verb gets one, nested as they ran. Each span carries
+    the bytes written to storage over it by the installer shell and its
+    reaped children (/proc/<pid>/io). A sampler thread sums the resident
+    memory of every process in the installer's session (Wine processes
+    included), which becomes a counter track and each span's peak RSS.
+    
+    Open the file in https://ui.perfetto.dev or chrome://tracing.
+    """
+    
+    SAMPLE_INTERVAL = 0.5
+    
+    def __init__(self):
+        self.pid = None
+        self.log_file = None
+        self.origin = None
+        self.spans = []  # (name, start, end, args) with epoch-second times
+        self.instants = []
+        self.samples = []  # (epoch seconds, RSS KiB)
+        self.open = {}  # phase -> [start, write_bytes, peak RSS KiB]
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+    
+    def handle_event(self, event):
+        """Feed one installer event"""
+        kind = event.get('type')
+        ts = event.get('ts')
+        if ts is None:
+            return
+        if self.origin is None:
+            self.origin = ts
+        
+        if kind == 'start':
+            self.pid = event.get('pid')
+            self.log_file = event.get('log_file')
+            if self.pid and self.thread is None:
+                self.thread = threading.Thread(target=self.sample, daemon=True)
+                self.thread.start()
+        
+        elif kind == 'phase_start':
+            with self.lock:
+                self.open[event.get('phase')] = [ts, event.get('write_bytes'), 0]
+            self.record_sample()
+        
+        elif kind == 'phase_end':
+            # Short phases can fall between two samples
+            self.record_sample()
+            with self.lock:
+                started = self.open.pop(event.get('phase'), None)
+            if started:
+                start, write_bytes, peak = started
+                args = {'exit_code': event.get('exit_code')}
+                if write_bytes is not None and event.get('write_bytes') is not None:
+                    args['write_bytes'] = event['write_bytes'] - write_bytes
+                if peak:
+                    args['peak_rss_kb'] = peak
+                self.spans.append((event.get('phase'), start, ts, args))
+        
+        elif kind == 'download':
+            self.instants.append((f"download {event.get('name')}", ts,
+                                  {'bytes': event.get('bytes'), 'cached': event.get('cached')}))
+        
+        elif kind == 'exit':
+            self.log_file = event.get('log_file') or self.log_file
+    
+    def session_rss(self):
+        """Total RSS in KiB of the processes in the installer's session"""
+        page_kb = os.sysconf('SC_PAGE_SIZE') // 1024
+        total = 0
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat', 'rb') as f:
+                    fields = f.read().rsplit(b')', 1)[1].split()
+            except (OSError, IndexError):
+                continue
+            # fields[0] is field 3 (state) of proc(5): session is 6, rss is 24
+            if int(fields[3]) == self.pid:
+                total += int(fields[21]) * page_kb
+        return total
+    
+    def record_sample(self):
+        if not self.pid:
+            return
+        rss = self.session_rss()
+        with self.lock:
+            self.samples.append((time.time(), rss))
+            for span in self.open.values():
+                span[2] = max(span[2], rss)
+    
+    def sample(self):
+        while not self.stopping.is_set():
+            self.record_sample()
+            self.stopping.wait(self.SAMPLE_INTERVAL)
+    
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=2)
+    
+    def path(self):
+        """Trace file next to the log, or None if the log is unknown"""
+        if not self.log_file:
+            return None
+        log_path = Path(self.log_file)
+        return log_path.with_name(log_path.stem + '.trace.json')
+    
+    def to_json(self):
+        """Trace Event Format dict; times are microseconds from the first event"""
+        def us(ts):
+            return round((ts - self.origin) * 1e6)
+        
+        pid = self.pid or 0
+        events = [
+            {'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': pid, 'args': {'name': 'Affinity installer'}},
+        ]
+        for name, start, end, args in self.spans:
+            category = 'verb' if name.startswith('verb:') else 'phase'
+            events.append({'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': pid,
+                           'ts': us(start), 'dur': us(end) - us(start), 'args': args})
+        for name, ts, args in self.instants:
+            events.append({'name': name, 'cat': 'download', 'ph': 'i', 's': 't', 'pid': pid, 'tid': pid,
+                           'ts': us(ts), 'args': args})
+        for ts, rss in self.samples:
+            if ts >= self.origin:
+                events.append({'name': 'session RSS (MiB)', 'ph': 'C', 'pid': pid,
+                               'ts': us(ts), 'args': {'rss': round(rss / 1024, 1)}})
+        
+        return {
+            'traceEvents': sorted(events, key=lambda event: event.get('ts', -1)),
+            'displayTimeUnit': 'ms',
+            'otherData': {'started': self.origin, 'log_file': self.log_file},
+        }
+    
+    def write(self):
+        """Write the trace next to the log; returns its path or None"""
+        path = self.path()
+        if path is None or self.origin is None:
+            return None
+        path.write_text(json.dumps(self.to_json()) + '\n')
+        return path
+
+
+# ============================================================================
+# BASH INSTALLER - Bridge to the Embedded Script
+# ============================================================================
+
+class BashInstaller:
+    """Run the embedded bash installer and decode its event stream
+    
+    Qt-free: the GUI drives it through BashInstallerThread, headless mode
+    calls run() directly. Output is reported through plain callbacks.
+    """
+    
+    def __init__(self, bash_script, prefix_path, installer_path=None, enable_dxvk=True, enable_vulkan=True, enable_tahoma=True,
+                 cache_dir=None, cache_max_mb=None, offline=False, golden_dir=None, export_golden=False,
+                 resume=True, log_file=None, env=None, use_probe=True, share_payload=False,
+                 shader_cache_seed=None, settings_profile=None, work_dir=None, scratch_dir=None,
+                 shortcut_name=None, log_callback=None, progress_callback=None, event_callback=None):
+        self.bash_script = bash_script
+        self.prefix_path = prefix_path
+        self.installer_path = installer_path
+        self.enable_dxvk = enable_dxvk
+        self.enable_vulkan = enable_vulkan
+        self.enable_tahoma = enable_tahoma
+        self.cache_dir = cache_dir
+        self.cache_max_mb = cache_max_mb
+        self.offline = offline
+        self.golden_dir = golden_dir
+        self.export_golden = export_golden
+        self.resume = resume
+        self.log_file = log_file
+        self.env = env
+        self.use_probe = use_probe
+        self.share_payload = share_payload
+        self.shader_cache_seed = shader_cache_seed
+        self.settings_profile = settings_profile
+        self.work_dir = work_dir
+        self.scratch_dir = scratch_dir
+        self.shortcut_name = shortcut_name
+        self.log = log_callback or (lambda message, level: print(message))
+        self.progress = progress_callback or (lambda percent, message: None)
+        self.event_callback = event_callback
+        self.runner = CommandRunner(line_callback=self.output_line)
+    
+    def run(self):
+        """Run bash installer and return its exit code"""
+        # Create temporary bash script file
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.sh', delete=False) as f:
+            f.write(self.bash_script)
+            script_path = f.name
+        
+        try:
+            # Make script executable
+            os.chmod(script_path, 0o755)
+            
+            cmd = [
+                'bash',
+                script_path,
+                '--gui-mode',
+                '--prefix', str(self.prefix_path)
+            ]
+            
+            if self.installer_path:
+                cmd.extend(['--installer', str(self.installer_path)])
+            
+            # Add optional component flags
+            if self.enable_dxvk:
+                cmd.append('--enable-dxvk')
+            if self.enable_vulkan:
+                cmd.append('--enable-vulkan')
+            if self.enable_tahoma:
+                cmd.append('--enable-tahoma')
+            
+            # Artifact cache options
+            if self.cache_dir:
+                cmd.extend(['--cache-dir', str(self.cache_dir)])
+            if self.cache_max_mb is not None:
+                cmd.extend(['--cache-max-mb', str(self.cache_max_mb)])
+            if self.offline:
+                cmd.append('--offline')
+            
+            # Golden prefix: restore a matching snapshot, or publish a new one
+            if self.golden_dir:
+                cmd.extend(['--golden-dir', str(self.golden_dir)])
+            if self.export_golden:
+                cmd.append('--export-golden')
+            
+            # Completed steps are journaled in the prefix; a rerun resumes
+            if not self.resume:
+                cmd.append('--no-resume')
+            if self.log_file:
+                cmd.extend(['--log-file', str(self.log_file)])
+            if self.share_payload:
+                cmd.append('--share-payload')
+            if self.shader_cache_seed:
+                cmd.extend(['--shader-cache-seed', os.path.abspath(self.shader_cache_seed)])
+            
+            # Settings from Auxiliary/Settings when run from a checkout
+            settings_profile = self.settings_profile or default_settings_profile()
+            if settings_profile:
+                cmd.extend(['--settings-profile', os.path.abspath(settings_profile)])
+            
+            # Installer temp data ("tmpfs" picks a RAM-backed directory) and
+            # the prefix's TEMP, where Affinity keeps its scratch files
+            if self.work_dir:
+                work_dir = self.work_dir if self.work_dir == 'tmpfs' else os.path.abspath(self.work_dir)
+                cmd.extend(['--work-dir', work_dir])
+            if self.scratch_dir:
+                cmd.extend(['--scratch-dir', os.path.abspath(self.scratch_dir)])
+            if self.shortcut_name:
+                cmd.extend(['--shortcut-name', self.shortcut_name])
+            
+            # Lets the script call back into this file, e.g. --extract-msix
+            cmd.extend(['--python', sys.executable, '--self', os.path.abspath(__file__)])
+            
+            # Share the probe results instead of re-detecting them in bash
+            probe = system_probe()
+            if self.use_probe:
+                probe.refresh()
+            if self.use_probe and probe.env_path.exists():
+                cmd.extend(['--probe-file', str(probe.env_path)])
+            
+            # Dedicated pipe for the JSON event stream, separate from the log
+            event_read, event_write = os.pipe()
+            cmd.extend(['--event-fd', str(event_write)])
+            
+            self.monitor = ProgressMonitor(log_callback=lambda message: self.log(message, 'warning'))
+            self.monitor.start()
+            self.phase_stack = []
+            self.trace = InstallTrace()
+            self.exit_event = threading.Event()
+            
+            event_reader = threading.Thread(target=self.read_events, args=(event_read,), daemon=True)
+            event_reader.start()
+            
+            # No timeouts: the dependency phase legitimately runs for most
+            # of an hour, and ProgressMonitor reports stalls
+            try:
+                result = self.runner.run(cmd, env=self.env, pass_fds=(event_write,))
+            finally:
+                os.close(event_write)
+            
+            # Wine processes may keep the pipe open, so stop at the exit event
+            self.exit_event.wait(timeout=5)
+            self.monitor.stop()
+            self.trace.stop()
+            self.log_timings(self.monitor)
+            self.write_trace()
+            if result.returncode is None:
+                self.log(f"Error: {result.output}", "error")
+                return 1
+            return result.returncode
+        
+        except Exception as e:
+            self.log(f"Error: {e}", "error")
+            return 1
+        
+        finally:
+            # Clean up temporary script
+            try:
+                os.unlink(script_path)
+            except:
+                pass
+    
+    def output_line(self, stream, line):
+        """Plain tool output (winetricks, wine, ...) is only shown, not parsed"""
+        self.monitor.feed(line)
+        self.log(line, 'info')
+    
+    def read_events(self, fd):
+        """Read JSON events from the bash script until its exit event"""
+        with os.fdopen(fd, 'rb') as stream:
+            for raw in stream:
+                try:
+                    event = json.loads(raw, strict=False)
+                except ValueError:
+                    continue
+                
+                if event.get('v') != EVENT_PROTOCOL_VERSION:
+                    continue
+                
+                self.handle_event(event)
+                if event.get('type') == 'exit':
+                    break
+        
+        self.exit_event.set()
+    
+    def handle_event(self, event):
+        """Turn one installer event into log/progress callbacks"""
+        self.trace.handle_event(event)
+        if self.event_callback:
+            self.event_callback(event)
+        
+        kind = event.get('type')
+        
+        if kind == 'progress':
+            self.progress(int(event.get('percent', 0)), event.get('message', ''))
+        
+        elif kind == 'log':
+            self.log(event.get('message', ''), event.get('level', 'info'))
+        
+        elif kind == 'phase_start':
+            # Time is charged to the innermost open phase (a verb inside
+            # dependencies), and back to its parent when it ends
+            self.phase_stack.append(event.get('phase'))
+            self.monitor.set_phase(event.get('phase'))
+        
+        elif kind == 'phase_end':
+            if self.phase_stack:
+                self.phase_stack.pop()
+            self.monitor.set_phase(self.phase_stack[-1] if self.phase_stack else None)
+            if event.get('exit_code'):
+                self.log(
+                    f"⚠️  Phase '{event.get('phase')}' finished with exit code {event['exit_code']}",
+                    'warning'
+                )
+    
+    def log_timings(self, monitor):
+        """Log per-phase durations and output throughput"""
+        status = monitor.get_status()
+        # A parent phase is resumed after each nested one; add its parts up
+        totals = {}
+        for name, seconds in status['phases']:
+            totals[name] = totals.get(name, 0.0) + seconds
+        self.log("⏱ Phase timings:", 'info')
+        for name, seconds in totals.items():
+            self.log(f"   {seconds:7.1f}s  {name}", 'info')
+        self.log(
+            f"⏱ Total {status['elapsed_seconds']:.0f}s, "
+            f"{status['lines_processed']} lines / {status['bytes_processed']} bytes of output "
+            f"({status['lines_per_second']:.1f} lines/s, {status['bytes_per_second']:.0f} B/s)",
+            'info'
+        )
+    
+    def write_trace(self):
+        """Write the install trace and log what each top-level phase cost"""
+        try:
+            path = self.trace.write()
+        except OSError as e:
+            self.log(f"Could not write install trace: {e}", 'warning')
+            return
+        if path is None:
+            return
+        
+        for name, start, end, args in self.trace.spans:
+            if name.startswith('verb:'):
+                continue
+            written = args.get('write_bytes')
+            peak = args.get('peak_rss_kb')
+            self.log(f"   {name:<14} {(f'{written / 2**20:.1f} MiB' if written is not None else '-'):>12} written, "
+                     f"peak RSS {(f'{peak / 1024:.0f} MiB' if peak else '-'):>8}", 'info')
+        self.log(f"⏱ Trace written to {path} (open in https://ui.perfetto.dev)", 'info')
+    
+    def terminate(self):
+        """Terminate the bash process"""
+        self.runner.cancel()
+
+
+# ============================================================================
+# HEADLESS MODE - Unattended Installs without Qt
+# ============================================================================
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_NO_WINE = 3
+EXIT_INTERRUPTED = 130
+
+# Settings a headless config file may contain, with their defaults
+HEADLESS_DEFAULTS = {
+    'prefix': str(Path.home() / ".AffinityOnLinux"),
+    'installer': None,
+    'enable_dxvk': True,
+    'enable_vulkan': True,
+    'enable_tahoma': False,
+    'cache_dir': None,
+    'cache_max_mb': None,
+    'offline': False,
+    'golden_dir': None,
+    'export_golden': False,
+    'shader_cache_seed': None,
+    'settings_profile': None,
+    'work_dir': None,
+    'scratch_dir': None,
+    'shortcut_name': None,
+    'resume': True,
+    'install_wine': False,
+    'package_mirror': None,
+    'sudo_password_file': None,
+}
+
+
+def read_config_file(path):
+    """Read a JSON (or, on Python 3.11+, TOML) file into a dict"""
+    path = Path(path)
+    with open(path, 'rb') as f:
+        if path.suffix == '.toml':
+            import tomllib
+            config = tomllib.load(f)
+        else:
+            config = json.load(f)
+    
+    if not isinstance(config, dict):
+        raise ValueError(f"{path}: expected a table of settings")
+    return config
+
+
+def check_settings(where, settings, allowed=HEADLESS_DEFAULTS):
+    """Reject unknown setting names"""
+    unknown = sorted(set(settings) - set(allowed))
+    if unknown:
+        raise ValueError(f"{where}: unknown setting(s): {', '.join(unknown)}")
+    return settings
+
+
+def load_headless_config(path):
+    """Read a JSON (or, on Python 3.11+, TOML) install description"""
+    return check_settings(path, read_config_file(path))
+
+
+def parse_headless_args(argv):
+    """Parse headless command line; unset options stay None so config wins"""
+    parser = argparse.ArgumentParser(
+        prog="affinity_installer_unified.py --headless",
+        description="Install Affinity on Linux without the GUI."
+    )
+    parser.add_argument('--headless', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--config', metavar='FILE', help="JSON/TOML file with install settings")
+    parser.add_argument('--prefix', help="Wine prefix to install into")
+    parser.add_argument('--installer', help="Affinity .exe or .msix installer")
+    parser.add_argument('--no-dxvk', dest='enable_dxvk', action='store_false', default=None)
+    parser.add_argument('--no-vulkan', dest='enable_vulkan', action='store_false', default=None)
+    parser.add_argument('--tahoma', dest='enable_tahoma', action='store_true', default=None)
+    parser.add_argument('--cache-dir', help="artifact cache root")
+    parser.add_argument('--cache-max-mb', type=int, help="artifact cache size limit (0 = unlimited)")
+    parser.add_argument('--offline', action='store_true', default=None, help="only use cached downloads")
+    parser.add_argument('--golden-dir', help="directory of golden prefix archives")
+    parser.add_argument('--export-golden', action='store_true', default=None,
+                        help="export the provisioned prefix as a golden archive")
+    parser.add_argument('--shader-cache-seed', metavar='ARCHIVE',
+                        help="seed the prefix's shader caches from a --shader-cache export")
+    parser.add_argument('--settings-profile', metavar='DIR',
+                        help="settings tree to merge into the prefix (default: Auxiliary/Settings of this checkout)")
+    parser.add_argument('--work-dir', metavar='DIR',
+                        help="directory for installer temp data, or 'tmpfs' to use RAM when enough is free")
+    parser.add_argument('--scratch-dir', metavar='DIR',
+                        help="fast disk directory for the prefix's TEMP and Affinity's scratch files")
+    parser.add_argument('--shortcut-name', metavar='NAME',
+                        help="menu entry name, also naming its desktop file (default: Affinity)")
+    parser.add_argument('--no-resume', dest='resume', action='store_false', default=None,
+                        help="ignore the prefix's install journal and redo every step")
+    parser.add_argument('--install-wine', action='store_true', default=None,
+                        help="install Wine 10+ with the system package manager if missing")
+    parser.add_argument('--package-mirror', metavar='DIR_OR_URL',
+                        help="install Wine from this local package mirror instead of the internet")
+    parser.add_argument('--seed-mirror', metavar='DIR',
+                        help="download Wine and its dependencies into a package mirror and exit")
+    parser.add_argument('--sudo-password-file', metavar='FILE',
+                        help="file holding the sudo password (default: passwordless sudo)")
+    parser.add_argument('--json', action='store_true',
+                        help="print the installer's JSON event stream on stdout")
+    parser.add_argument('--probe', action='store_true',
+                        help="print the detected Wine, tools, distro and GPU as JSON and exit")
+    parser.add_argument('--batch', metavar='MANIFEST',
+                        help="provision every prefix listed in a JSON/TOML manifest")
+    parser.add_argument('--jobs', type=int,
+                        help="concurrent installs in --batch mode (default: from CPUs and disk type)")
+    parser.add_argument('--report', metavar='FILE', help="write the --batch report as JSON to FILE")
+    return parser.parse_args(argv)
+
+
+def headless_settings(args):
+    """Merge defaults, config file and command line, in that order"""
+    settings = dict(HEADLESS_DEFAULTS)
+    if args.config:
+        settings.update(load_headless_config(args.config))
+    settings.update({key: value for key, value in vars(args).items()
+                     if key in HEADLESS_DEFAULTS and value is not None})
+    return settings
+
+
+def headless_main(argv):
+    """Entry point for --headless; returns a process exit code"""
+    args = parse_headless_args(argv)
+    
+    if args.probe:
+        probe = system_probe()
+        report = probe.refresh()
+        report['free_bytes'] = probe.free_bytes(Path.home())
+        print(json.dumps(report, indent=2))
+        return EXIT_OK
+    
+    try:
+        settings = headless_settings(args)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    
+    batch = None
+    if args.batch:
+        try:
+            batch = load_batch_manifest(args.batch, settings)
+        except (OSError, ValueError) as e:
+            print(f"error: {e}", file=sys.stderr)
+            return EXIT_USAGE
+    
+    installer_path = settings['installer']
+    for job in batch or [settings]:
+        if job['installer'] and not Path(job['installer']).is_file():
+            print(f"error: installer not found: {job['installer']}", file=sys.stderr)
+            return EXIT_USAGE
+    
+    # In --json mode stdout carries only events; human output goes to stderr
+    human = sys.stderr if args.json else sys.stdout
+    
+    def log(message, level='info'):
+        print(message, file=sys.stderr if level == 'error' else human, flush=True)
+    
+    def progress(percent, message):
+        print(f"[{percent:3d}%] {message}", file=human, flush=True)
+    
+    def event(event):
+        print(json.dumps(event), flush=True)
+    
+    sudo_password = ""
+    if settings['sudo_password_file']:
+        try:
+            sudo_password = Path(settings['sudo_password_file']).read_text().rstrip('\n')
+        except OSError as e:
+            print(f"error: {e}", file=sys.stderr)
+            return EXIT_USAGE
+    
+    wine = WineInstaller(sudo_password, lambda message: log(message), settings['package_mirror'])
+    if args.seed_mirror:
+        success, message = wine.seed_mirror(args.seed_mirror, progress)
+        if not success:
+            log(f"Seeding the package mirror failed: {message}", 'error')
+            return EXIT_FAILED
+        return EXIT_OK
+    
+    wine_ok, wine_version = wine.check_wine_version()
+    if not wine_ok:
+        if not settings['install_wine']:
+            log(f"Wine 10+ is required (found: {wine_version or 'none'}); "
+                "rerun with --install-wine to install it", 'error')
+            return EXIT_NO_WINE
+        success, message = wine.install(progress)
+        wine_ok, wine_version = wine.check_wine_version()
+        if not (success and wine_ok):
+            log(f"Wine installation failed: {message}", 'error')
+            return EXIT_NO_WINE
+    log(f"Using Wine {wine_version}")
+    
+    if batch:
+        return BatchProvisioner(batch, args.jobs, log, event if args.json else None).run(args.report)
+    
+    installer = BashInstaller(
+        BASH_SCRIPT,
+        settings['prefix'],
+        installer_path,
+        settings['enable_dxvk'],
+        settings['enable_vulkan'],
+        settings['enable_tahoma'],
+        cache_dir=settings['cache_dir'],
+        cache_max_mb=settings['cache_max_mb'],
+        offline=settings['offline'],
+        golden_dir=settings['golden_dir'],
+        export_golden=settings['export_golden'],
+        shader_cache_seed=settings['shader_cache_seed'],
+        settings_profile=settings['settings_profile'],
+        work_dir=settings['work_dir'],
+        scratch_dir=settings['scratch_dir'],
+        shortcut_name=settings['shortcut_name'],
+        resume=settings['resume'],
+        log_callback=log,
+        progress_callback=progress,
+        event_callback=event if args.json else None
+    )
+    
+    try:
+        exit_code = installer.run()
+    except KeyboardInterrupt:
+        installer.terminate()
+        return EXIT_INTERRUPTED
+    
+    return EXIT_OK if exit_code == 0 else EXIT_FAILED
+
+
+# ============================================================================
+# MSIX EXTRACTOR - Streaming, Verified Extraction of App/
+# ============================================================================
+
+class MsixExtractionError(Exception):
+    """Raised when an MSIX package is malformed or fails verification"""
+
+
+class MsixExtractor:
+    """Extract the App/ payload of an .msix package straight into a prefix
+    
+    Only App/ members are read, and each one is streamed from the zip into
+    its final location in 64 KiB blocks. Nothing is staged in /tmp, so every
+    byte is written once. Members are decompressed in parallel, largest
+    first, and each worker thread has its own ZipFile handle.
+    
+    Every block is checked against the SHA-256 hash in AppxBlockMap.xml as
+    it is written. The block map lists each file by its Windows path, one
+    hash per 64 KiB of uncompressed data. Zip member names are percent-
+    encoded (for example "Affinity%20Photo.exe"), so they are unquoted
+    before they are matched or written.
+    """
     
-    log "Found installer: $INSTALLER_PATH"
+    BLOCK_SIZE = 64 * 1024
+    BLOCK_MAP = 'AppxBlockMap.xml'
+    PAYLOAD = 'App/'
     
-    if [[ "$INSTALLER_PATH" =~ \.exe$ ]]; then
-        log "Using .exe installer"
-        WINEPREFIX="$WINEPREFIX" wine "$INSTALLER_PATH" 2>&1 | tee -a "$LOG_FILE"
-    elif [[ "$INSTALLER_PATH" =~ \.msix$ ]]; then
-        log "Using .msix installer (requires extraction)"
-        gui_info "Extracting MSIX package..."
-        
-        local extract_dir="/tmp/affinity_msix_$$"
-        mkdir -p "$extract_dir"
+    def __init__(self, msix_path, dest_dir, jobs=None, verify=True, log_callback=None):
+        self.msix_path = str(msix_path)
+        self.dest_dir = Path(dest_dir)
+        self.jobs = jobs or min(8, os.cpu_count() or 1)
+        self.verify = verify
+        self.log = log_callback or print
+        self.local = threading.local()
+        self.handles = []
+        self.lock = threading.Lock()
+        self.done_files = 0
+        self.done_bytes = 0
+    
+    def zip_handle(self):
+        """ZipFile owned by the calling thread"""
+        import zipfile
+        handle = getattr(self.local, 'zip', None)
+        if handle is None:
+            handle = self.local.zip = zipfile.ZipFile(self.msix_path)
+            with self.lock:
+                self.handles.append(handle)
+        return handle
+    
+    def read_block_map(self, archive):
+        """Map of payload path -> (size, [sha256 digest per block])"""
+        import base64
+        import xml.etree.ElementTree as ET
         
-        if command -v 7z &> /dev/null; then
-            7z x "$INSTALLER_PATH" -o"$extract_dir" 2>&1 | tee -a "$LOG_FILE"
-        elif command -v unzip &> /dev/null; then
-            unzip -q "$INSTALLER_PATH" -d "$extract_dir" 2>&1 | tee -a "$LOG_FILE"
-        else
-            gui_error "No extraction tool found (need 7z or unzip)"
-            log "ERROR: No extraction tool available"
-            rm -rf "$extract_dir"
-            return 1
-        fi
+        try:
+            root = ET.fromstring(archive.read(self.BLOCK_MAP))
+        except KeyError:
+            raise MsixExtractionError(f"{self.BLOCK_MAP} is missing; use --no-verify to extract anyway")
+        except ET.ParseError as e:
+            raise MsixExtractionError(f"{self.BLOCK_MAP} is not valid XML: {e}")
+        
+        files = {}
+        for entry in root.iterfind('{*}File'):
+            name = entry.get('Name', '').replace('\\', '/')
+            hashes = [base64.b64decode(block.get('Hash', '')) for block in entry.iterfind('{*}Block')]
+            files[name] = (int(entry.get('Size', '0')), hashes)
+        return files
+    
+    def payload_members(self, archive):
+        """(ZipInfo, relative path) for every App/ file, largest first"""
+        from urllib.parse import unquote
+        
+        members = []
+        for info in archive.infolist():
+            name = unquote(info.filename)
+            if not name.startswith(self.PAYLOAD) or info.is_dir():
+                continue
+            relative = name[len(self.PAYLOAD):]
+            parts = Path(relative).parts
+            if not parts or Path(relative).is_absolute() or '..' in parts:
+                raise MsixExtractionError(f"unsafe member path: {info.filename}")
+            members.append((info, name, relative))
+        
+        members.sort(key=lambda member: member[0].file_size, reverse=True)
+        return members
+    
+    def extract_member(self, info, name, relative, expected):
+        """Stream one member to disk, verifying block hashes on the way"""
+        import hashlib
         
-        local affinity_install_dir="$WINEPREFIX/drive_c/Program Files/Affinity"
-        mkdir -p "$affinity_install_dir"
+        target = self.dest_dir / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
         
-        cp -r "$extract_dir/App/"* "$affinity_install_dir/" 2>&1 | tee -a "$LOG_FILE"
+        if expected is not None:
+            size, hashes = expected
+            if size != info.file_size:
+                raise MsixExtractionError(f"{name}: size {info.file_size} does not match block map ({size})")
         
-        rm -rf "$extract_dir"
-    fi
-    
-    log "Affinity installer completed"
-    
-    # Copy helper files
-    local affinity_dir="$WINEPREFIX/drive_c/Program Files/Affinity"
+        index = 0
+        try:
+            with self.zip_handle().open(info) as source, open(target, 'wb') as sink:
+                while True:
+                    block = source.read(self.BLOCK_SIZE)
+                    if not block:
+                        break
+                    if expected is not None:
+                        if index >= len(hashes) or hashlib.sha256(block).digest() != hashes[index]:
+                            raise MsixExtractionError(f"{name}: block {index} fails hash verification")
+                    sink.write(block)
+                    index += 1
+            
+            if expected is not None and index != len(hashes):
+                raise MsixExtractionError(f"{name}: {index} blocks, block map lists {len(hashes)}")
+        except BaseException:
+            target.unlink(missing_ok=True)
+            raise
+        
+        with self.lock:
+            self.done_files += 1
+            self.done_bytes += info.file_size
     
-    if [ -d "$affinity_dir" ]; then
-        local app_dir=$(find "$affinity_dir" -maxdepth 1 -type d \( -name "Affinity*" -o -name "Affinity" \) | head -1)
+    @staticmethod
+    def store_key(msix_path):
+        """Payload store directory name: package identity and file size"""
+        import zipfile
+        import xml.etree.ElementTree as ET
         
-        if [ -n "$app_dir" ] && [ -f "$WINTYPES_DLL" ]; then
-            cp "$WINTYPES_DLL" "$app_dir/" 2>&1 | tee -a "$LOG_FILE"
-            log "wintypes.dll copied to $app_dir"
-        fi
-    fi
+        size = os.path.getsize(msix_path)
+        try:
+            with zipfile.ZipFile(msix_path) as archive:
+                identity = ET.fromstring(archive.read('AppxManifest.xml')).find('{*}Identity')
+            parts = [identity.get('Name'), identity.get('Version'), identity.get('ProcessorArchitecture')]
+        except (KeyError, AttributeError, ET.ParseError, zipfile.BadZipFile):
+            parts = [Path(msix_path).stem, str(int(os.path.getmtime(msix_path)))]
+        return re.sub(r'[^A-Za-z0-9._-]', '_', '_'.join(filter(None, parts + [str(size)])))
     
-    local winmetadata_dir="$WINEPREFIX/drive_c/windows/system32/WinMetadata"
-    mkdir -p "$winmetadata_dir"
+    @classmethod
+    def place_from_store(cls, msix_path, dest_dir, store_dir, share=False, **options):
+        """Place the payload from the shared store, extracting it there first
+        
+        The store entry is created when reflinks from the store into dest_dir
+        work (then the copy into the prefix is free) or when share is set.
+        Returns the FilePlacer used, or None if the caller should extract
+        straight into dest_dir instead.
+        """
+        import fcntl
+        
+        entry = Path(store_dir) / cls.store_key(msix_path)
+        marker = entry / '.complete'
+        Path(store_dir).mkdir(parents=True, exist_ok=True)
+        Path(dest_dir).mkdir(parents=True, exist_ok=True)
+        
+        # Concurrent batch jobs extract a given payload only once
+        with open(f"{entry}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not marker.exists():
+                if not (share or FilePlacer.reflink_supported(store_dir, dest_dir)):
+                    return None
+                shutil.rmtree(entry, ignore_errors=True)
+                try:
+                    files, size = cls(msix_path, entry / 'App', **options).extract()
+                except BaseException:
+                    shutil.rmtree(entry, ignore_errors=True)
+                    raise
+                marker.write_text(f"{size}\n")
+            else:
+                os.utime(marker)
+        
+        placer = FilePlacer(jobs=options.get('jobs'))
+        placer.place_tree(entry / 'App', dest_dir)
+        return placer
     
-    if [ -f "$WINDOWS_WINMD" ]; then
-        cp "$WINDOWS_WINMD" "$winmetadata_dir/" 2>&1 | tee -a "$LOG_FILE"
-        log "Windows.winmd copied to $winmetadata_dir"
-    fi
+    def extract(self):
+        """Extract and verify the payload; returns (files, bytes) written"""
+        import zipfile
+        
+        try:
+            return self.extract_payload()
+        except zipfile.BadZipFile as e:
+            raise MsixExtractionError(f"{self.msix_path}: {e}")
+        finally:
+            for handle in self.handles:
+                handle.close()
     
-    return 0
-}
-
-# ==========================================
-# DXVK Workarounds
-# ==========================================
-
-configure_dxvk_workarounds() {
-    # Fix black right-click/context menus and flyout popups (issue #72).
-    # DXVK leaves Affinity's D3D9 popup surfaces uninitialised until they are
-    # presented (doitsujin/dxvk#2749); deferring surface creation and pinning
-    # shader model 1 works around it.
-    log "Configuring DXVK workarounds (black context menu fix)"
+    def extract_payload(self):
+        """Body of extract(), run while the zip handles are open"""
+        from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+        
+        archive = self.zip_handle()
+        block_map = self.read_block_map(archive) if self.verify else {}
+        members = self.payload_members(archive)
+        if not members:
+            raise MsixExtractionError(f"no {self.PAYLOAD} payload in {self.msix_path}")
+        
+        total_bytes = sum(info.file_size for info, _, _ in members)
+        self.log(f"Extracting {len(members)} files ({total_bytes // (1024 * 1024)} MB) "
+                 f"with {self.jobs} threads{', verifying block hashes' if self.verify else ''}")
+        
+        for info, name, _ in members:
+            if self.verify and name not in block_map:
+                raise MsixExtractionError(f"{name} is not listed in {self.BLOCK_MAP}")
+        
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            pending = {pool.submit(self.extract_member, info, name, relative, block_map.get(name))
+                       for info, name, relative in members}
+            reported = 0
+            while pending:
+                done, pending = wait(pending, timeout=2, return_when=FIRST_EXCEPTION)
+                for future in done:
+                    if future.exception():
+                        for other in pending:
+                            other.cancel()
+                        raise future.exception()
+                percent = self.done_bytes * 100 // max(total_bytes, 1)
+                if percent >= reported + 10 or not pending:
+                    reported = percent
+                    self.log(f"Extracted {percent}% ({self.done_files}/{len(members)} files)")
+        
+        return self.done_files, self.done_bytes
 
-    local affinity_exe=$(find "$WINEPREFIX/drive_c" -name "Affinity.exe" 2>/dev/null | head -1)
 
-    if [ -z "$affinity_exe" ] || [ ! -f "$affinity_exe" ]; then
-        log "Affinity.exe not found, skipping dxvk.conf setup"
-        return 0
-    fi
+def extract_msix_main(argv):
+    """Entry point for --extract-msix, called back from BASH_SCRIPT"""
+    parser = argparse.ArgumentParser(
+        prog="affinity_installer_unified.py --extract-msix",
+        description="Extract the App/ payload of an .msix package into a directory."
+    )
+    parser.add_argument('--extract-msix', nargs=2, metavar=('MSIX', 'DEST'), required=True)
+    parser.add_argument('--jobs', type=int, help="decompression threads (default: CPU count, max 8)")
+    parser.add_argument('--no-verify', dest='verify', action='store_false',
+                        help="skip AppxBlockMap.xml hash verification")
+    parser.add_argument('--store', metavar='DIR',
+                        help="shared payload store: reuse a payload extracted there before")
+    parser.add_argument('--share', action='store_true',
+                        help="add the payload to --store even where it cannot be reflinked")
+    args = parser.parse_args(argv)
+    
+    msix_path, dest_dir = args.extract_msix
+    log = lambda message: print(message, flush=True)
+    try:
+        if args.store:
+            placer = MsixExtractor.place_from_store(msix_path, dest_dir, args.store, args.share,
+                                                    jobs=args.jobs, verify=args.verify, log_callback=log)
+            if placer:
+                print(placer.summary())
+                return EXIT_OK
+        
+        extractor = MsixExtractor(msix_path, dest_dir, jobs=args.jobs, verify=args.verify, log_callback=log)
+        files, size = extractor.extract()
+    except (MsixExtractionError, OSError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    
+    print(f"Extracted {files} files ({size // (1024 * 1024)} MB) to {dest_dir}")
+    return EXIT_OK
 
-    local affinity_dir=$(dirname "$affinity_exe")
 
-    cat > "$affinity_dir/dxvk.conf" <<EOF
-# Fix black right-click/context menus and flyout popups in Affinity under
-# Wine (doitsujin/dxvk#2749): D3D9 popup surfaces stay uninitialised (black)
-# until presented. Deferring surface creation and pinning shader model 1
-# works around it.
-d3d9.deferSurfaceCreation = True
-d3d9.shaderModel = 1
-EOF
+# ============================================================================
+# FILE PLACEMENT - Reflinks, Hardlinks and In-Kernel Copies
+# ============================================================================
 
-    log "Wrote $affinity_dir/dxvk.conf"
+class FilePlacer:
+    """Put files into prefixes with as little disk I/O as the filesystem allows
+    
+    Each file is tried with, in order:
+    
+        reflink          FICLONE (btrfs, XFS, bcachefs): extents are shared,
+                         nothing is written
+        hardlink         only with allow_links, for shared stores whose files
+                         are never modified in place (the content-addressed
+                         cache); same filesystem only
+        copy_file_range  in-kernel copy, server-side on NFS 4.2
+        copy             plain read/write
+    
+    Files are written under a temporary name and renamed into place, so a
+    destination that is itself a hardlink into a store is replaced, never
+    written through. Counts and bytes written are kept per method.
+    """
+    
+    FICLONE = 0x40049409
+    METHODS = ('reflink', 'hardlink', 'copy_file_range', 'copy')
+    
+    def __init__(self, allow_links=False, jobs=None):
+        self.allow_links = allow_links
+        self.jobs = jobs or min(8, os.cpu_count() or 1)
+        self.lock = threading.Lock()
+        self.files = dict.fromkeys(self.METHODS, 0)
+        self.bytes = dict.fromkeys(self.METHODS, 0)
+        self.bytes_written = 0
+    
+    @classmethod
+    def reflink(cls, source_fd, target_fd):
+        import fcntl
+        try:
+            fcntl.ioctl(target_fd, cls.FICLONE, source_fd)
+            return True
+        except OSError:
+            return False
+    
+    @classmethod
+    def reflink_supported(cls, source_dir, target_dir):
+        """Whether files in source_dir can be reflinked into target_dir"""
+        try:
+            with tempfile.NamedTemporaryFile(dir=source_dir) as source, \
+                    tempfile.NamedTemporaryFile(dir=target_dir) as target:
+                source.write(b'x' * 4096)
+                source.flush()
+                return cls.reflink(source.fileno(), target.fileno())
+        except OSError:
+            return False
+    
+    def copy_data(self, source, target, size):
+        """Copy size bytes between open files; returns the method used"""
+        if hasattr(os, 'copy_file_range'):
+            try:
+                copied = 0
+                while copied < size:
+                    count = os.copy_file_range(source.fileno(), target.fileno(), size - copied)
+                    if count == 0:
+                        break
+                    copied += count
+                if copied == size:
+                    return 'copy_file_range'
+            except OSError:
+                pass
+            source.seek(0)
+            target.seek(0)
+            target.truncate()
+        shutil.copyfileobj(source, target, 1024 * 1024)
+        return 'copy'
+    
+    def place(self, source, target):
+        """Place one file at target (replacing it); returns the method used"""
+        source, target = Path(source), Path(target)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp = target.with_name(f".{target.name}.place-{os.getpid()}-{threading.get_ident()}")
+        size = source.stat().st_size
+        
+        method = None
+        try:
+            with open(source, 'rb') as src, open(temp, 'wb') as dst:
+                if size and self.reflink(src.fileno(), dst.fileno()):
+                    method = 'reflink'
+            
+            if method is None and self.allow_links:
+                try:
+                    temp.unlink()
+                    os.link(source, temp)
+                    method = 'hardlink'
+                except OSError:
+                    pass
+            
+            if method is None:
+                with open(source, 'rb') as src, open(temp, 'wb') as dst:
+                    method = self.copy_data(src, dst, size)
+            
+            if method != 'hardlink':
+                shutil.copymode(source, temp)
+            os.replace(temp, target)
+        except BaseException:
+            temp.unlink(missing_ok=True)
+            raise
+        
+        with self.lock:
+            self.files[method] += 1
+            self.bytes[method] += size
+            if method in ('copy_file_range', 'copy'):
+                self.bytes_written += size
+        return method
+    
+    def place_tree(self, source_dir, target_dir):
+        """Place the contents of source_dir into target_dir"""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        source_dir, target_dir = Path(source_dir), Path(target_dir)
+        pairs = []
+        for root, dirs, files in os.walk(source_dir):
+            relative = Path(root).relative_to(source_dir)
+            (target_dir / relative).mkdir(parents=True, exist_ok=True)
+            # os.walk lists symlinked directories in dirs without following them;
+            # recreate them as links and keep the walk out of them
+            for name in [name for name in dirs if (Path(root) / name).is_symlink()]:
+                dirs.remove(name)
+                target = target_dir / relative / name
+                if target.is_symlink() or target.is_file():
+                    target.unlink()
+                target.symlink_to(os.readlink(Path(root) / name))
+            for name in files:
+                source = Path(root) / name
+                target = target_dir / relative / name
+                if source.is_symlink():
+                    target.unlink(missing_ok=True)
+                    target.symlink_to(os.readlink(source))
+                else:
+                    pairs.append((source, target))
+        
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            for future in [pool.submit(self.place, source, target) for source, target in pairs]:
+                future.result()
+    
+    def summary(self):
+        """One line: files and bytes per method, and bytes actually written"""
+        methods = ', '.join(f"{self.files[method]} by {method}" for method in self.METHODS if self.files[method])
+        total = sum(self.bytes.values())
+        return (f"Placed {sum(self.files.values())} files ({total / 2**20:.1f} MiB; {methods or 'none'}), "
+                f"{self.bytes_written / 2**20:.1f} MiB written")
+    
+    def report(self):
+        return {'files': dict(self.files), 'bytes': dict(self.bytes), 'bytes_written': self.bytes_written}
 
-    # Register the config path prefix-wide so DXVK finds it regardless of the
-    # launcher's working directory. DXVK opens the value directly as a host
-    # path, so it must be the native Linux path, not a Z:\ Windows path.
-    WINEPREFIX="$WINEPREFIX" wine reg add "HKCU\\Environment" /v DXVK_CONFIG_FILE \
-        /d "$affinity_dir/dxvk.conf" /f 2>&1 | tee -a "$LOG_FILE"
 
-    log "Registered DXVK_CONFIG_FILE in HKCU\\Environment"
+def place_main(argv):
+    """Entry point for --place, called back from BASH_SCRIPT"""
+    parser = argparse.ArgumentParser(
+        prog="affinity_installer_unified.py --place",
+        description="Copy files or directory contents using reflinks, hardlinks or in-kernel copies."
+    )
+    parser.add_argument('--place', nargs=2, metavar=('SOURCE', 'TARGET'), required=True)
+    parser.add_argument('--link', action='store_true',
+                        help="allow hardlinks (only for sources that are never modified in place)")
+    parser.add_argument('--json', action='store_true', help="print the placement report as JSON")
+    args = parser.parse_args(argv)
+    
+    source, target = args.place
+    placer = FilePlacer(allow_links=args.link)
+    try:
+        if Path(source).is_dir():
+            placer.place_tree(source, target)
+        else:
+            placer.place(source, target)
+    except OSError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    
+    print(json.dumps(placer.report()) if args.json else placer.summary())
+    return EXIT_OK
 
-    return 0
-}
 
-# ==========================================
-# Create Desktop Shortcuts
-# ==========================================
+# ============================================================================
+# SHADER CACHE - Export, Import and Seeding of a Prefix's Shader Caches
+# ============================================================================
 
-create_desktop_shortcuts() {
-    log "Creating desktop shortcuts..."
+class ShaderCache:
+    """A prefix's shader caches, as written by its generated launcher
     
-    gui_progress 90 "Creating desktop shortcuts"
+    The launcher points every cache at a subdirectory of
+    $WINEPREFIX/shader-cache:
     
-    mkdir -p "$HOME/.local/share/applications"
-    mkdir -p "$HOME/.local/share/icons"
+        dxvk     DXVK_STATE_CACHE_PATH (pipeline state, driver independent)
+        vkd3d    VKD3D_SHADER_CACHE_PATH
+        mesa     MESA_SHADER_CACHE_DIR
+        nvidia   __GL_SHADER_DISK_CACHE_PATH
     
-    # Download icons
-    log "Downloading application icons"
+    export() packs them into a tar archive together with a manifest naming
+    the GPUs and drivers they were built with; import_archive() merges an
+    archive into a prefix, keeping whichever copy of a file is larger (cache
+    files only grow). Driver caches built for another GPU or driver version
+    are ignored by the driver, so importing them is harmless, just useless.
+    """
     
-    if command -v curl &> /dev/null; then
-        curl --output "$HOME/.local/share/icons/Affinity.svg" --location --silent \
-            "https://upload.wikimedia.org/wikipedia/commons/c/cf/Affinity_%28App%29_Logo.svg" 2>&1 | tee -a "$LOG_FILE" || true
-    elif command -v wget &> /dev/null; then
-        wget -q -O "$HOME/.local/share/icons/Affinity.svg" \
-            "https://upload.wikimedia.org/wikipedia/commons/c/cf/Affinity_%28App%29_Logo.svg" 2>&1 | tee -a "$LOG_FILE" || true
-    fi
+    DIRECTORY = 'shader-cache'
+    SUBDIRS = ('dxvk', 'vkd3d', 'mesa', 'nvidia')
+    MANIFEST = 'shader-cache.json'
     
-    # Find Affinity V3 executable
-    local affinity_v3_exe=$(find "$WINEPREFIX/drive_c" -name "Affinity.exe" 2>/dev/null | head -1)
+    def __init__(self, prefix):
+        self.path = Path(prefix) / self.DIRECTORY
     
-    if [ -n "$affinity_v3_exe" ] && [ -f "$affinity_v3_exe" ]; then
-        log "Creating desktop shortcut for Affinity V3: $affinity_v3_exe"
-        
-        cat > "$HOME/.local/share/applications/Affinity.desktop" <<EOF
-[Desktop Entry]
-Name=Affinity
-Comment=Unified Affinity application for photo editing, design, and publishing
-Icon=$HOME/.local/share/icons/Affinity.svg
-Path=$WINEPREFIX
-Exec=env WINEPREFIX="$WINEPREFIX" wine "$affinity_v3_exe"
-Terminal=false
-Type=Application
-Categories=Graphics;
-StartupNotify=true
-StartupWMClass=affinity.exe
-EOF
-        chmod +x "$HOME/.local/share/applications/Affinity.desktop"
-        log "Affinity V3 desktop shortcut created"
-    fi
+    @staticmethod
+    def gpus():
+        """PCI vendor:device and kernel driver of each DRM card"""
+        gpus = []
+        for card in sorted(Path('/sys/class/drm').glob('card[0-9]')):
+            device = card / 'device'
+            try:
+                ids = [(device / name).read_text().strip().removeprefix('0x') for name in ('vendor', 'device')]
+                driver = os.path.basename(os.readlink(device / 'driver'))
+            except OSError:
+                continue
+            gpus.append(f"{':'.join(ids)} {driver}")
+        return gpus
     
-    if command -v update-desktop-database &> /dev/null; then
-        update-desktop-database "$HOME/.local/share/applications" 2>&1 | tee -a "$LOG_FILE" || true
-        log "Desktop database updated"
-    fi
+    def files(self):
+        """(relative path, absolute path) of every cache file"""
+        for subdir in self.SUBDIRS:
+            for root, dirs, names in os.walk(self.path / subdir):
+                dirs.sort()
+                for name in sorted(names):
+                    path = Path(root) / name
+                    if path.is_file() and not path.is_symlink():
+                        yield path.relative_to(self.path).as_posix(), path
     
-    log "Desktop shortcuts creation completed"
+    def export(self, archive):
+        """Write the caches to a .tar.gz archive; returns (files, bytes)"""
+        import io
+        import tarfile
+        
+        manifest = json.dumps({'gpus': self.gpus(), 'created': int(time.time())}).encode()
+        count = size = 0
+        with tarfile.open(archive, 'w:gz') as tar:
+            info = tarfile.TarInfo(self.MANIFEST)
+            info.size = len(manifest)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(manifest))
+            for name, path in self.files():
+                tar.add(path, arcname=name, recursive=False)
+                count += 1
+                size += path.stat().st_size
+        return count, size
     
-    return 0
-}
+    def import_archive(self, archive):
+        """Merge an exported archive into the prefix
+        
+        Returns {'files', 'bytes', 'skipped', 'gpus', 'same_gpu'}; 'skipped'
+        counts files the prefix already had at least as large.
+        """
+        import tarfile
+        
+        result = {'files': 0, 'bytes': 0, 'skipped': 0, 'gpus': [], 'same_gpu': None}
+        with tarfile.open(archive, 'r:*') as tar:
+            for member in tar:
+                if member.name == self.MANIFEST:
+                    manifest = json.load(tar.extractfile(member))
+                    result['gpus'] = manifest.get('gpus', [])
+                    result['same_gpu'] = sorted(result['gpus']) == sorted(self.gpus())
+                    continue
+                
+                # Only plain files inside the known cache directories
+                parts = Path(member.name).parts
+                if (not member.isfile() or len(parts) < 2 or parts[0] not in self.SUBDIRS
+                        or '..' in parts or os.path.isabs(member.name)):
+                    continue
+                
+                target = self.path.joinpath(*parts)
+                try:
+                    if target.stat().st_size >= member.size:
+                        result['skipped'] += 1
+                        continue
+                except FileNotFoundError:
+                    pass
+                
+                target.parent.mkdir(parents=True, exist_ok=True)
+                temp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+                with tar.extractfile(member) as source, open(temp, 'wb') as f:
+                    shutil.copyfileobj(source, f)
+                os.utime(temp, (member.mtime, member.mtime))
+                os.replace(temp, target)
+                result['files'] += 1
+                result['bytes'] += member.size
+        return result
 
-# ==========================================
-# Main Installation Flow
-# ==========================================
 
-main() {
-    # Parse command-line arguments for GUI mode
-    while [[ $# -gt 0 ]]; do
-        case $1 in
-            --gui-mode)
-                GUI_MODE=true
-                shift
-                ;;
-            --prefix)
-                INSTALL_DIR="$2"
-                WINEPREFIX="$INSTALL_DIR"
-                shift 2
-                ;;
-            --installer)
-                INSTALLER_PATH="$2"
-                shift 2
-                ;;
-            --enable-dxvk)
-                ENABLE_DXVK=true
-                shift
-                ;;
-            --enable-vulkan)
-                ENABLE_VULKAN=true
-                shift
-                ;;
-            --enable-tahoma)
-                ENABLE_TAHOMA=true
-                shift
-                ;;
-            *)
-                shift
-                ;;
-        esac
-    done
+def shader_cache_main(argv):
+    """Entry point for --shader-cache, also called back from BASH_SCRIPT"""
+    parser = argparse.ArgumentParser(
+        prog="affinity_installer_unified.py --shader-cache",
+        description="Export a prefix's DXVK, VKD3D and driver shader caches, or import them into another prefix."
+    )
+    parser.add_argument('--shader-cache', nargs=3, metavar=('{export,import}', 'PREFIX', 'ARCHIVE'), required=True)
+    parser.add_argument('--json', action='store_true', help="print the result as JSON")
+    args = parser.parse_args(argv)
     
-    # Only show banner in non-GUI mode
-    if [ "$GUI_MODE" = false ]; then
-        clear
-        echo -e "${GREEN}━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━${NC}"
-        echo -e "${GREEN}   Affinity Linux Installation Script - ENHANCED${NC}"
-        echo -e "${GREEN}━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━${NC}"
-        echo ""
-    fi
+    action, prefix, archive = args.shader_cache
+    if action not in ('export', 'import'):
+        parser.error(f"unknown action {action!r} (expected export or import)")
     
-    gui_progress 0 "Starting Affinity installation"
+    cache = ShaderCache(prefix)
+    try:
+        if action == 'export':
+            count, size = cache.export(archive)
+            result = {'files': count, 'bytes': size}
+            summary = f"Exported {count} cache file(s), {size / 1048576:.1f} MiB, to {archive}"
+        else:
+            result = cache.import_archive(archive)
+            summary = (f"Imported {result['files']} cache file(s), {result['bytes'] / 1048576:.1f} MiB "
+                       f"({result['skipped']} already present)")
+            if result['same_gpu'] is False:
+                summary += f"; built on {', '.join(result['gpus']) or 'unknown GPUs'}, driver caches may not apply"
+    except (OSError, ValueError, EOFError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_FAILED
     
-    log "=========================================="
-    log "Affinity Linux Installation Started"
-    log "=========================================="
+    print(json.dumps(result) if args.json else summary)
+    return EXIT_OK
+
+
+# ============================================================================
+# PERFORMANCE PREFERENCES - Affinity Memory, Undo and GPU Settings per Machine
+# ============================================================================
+
+# Auxiliary/Settings/Affinity/3.0/Settings/PerformancePreferences.xml, used
+# when the prefix has no preferences yet
+PERFORMANCE_PREFERENCES_TEMPLATE = """\ufeff<?xml version="1.0" encoding="utf-8"?>
+<Settings xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema" xsi:type="Serif.Interop.Persona.Settings.PerformanceSettings">
+\t<RAMUsageLimit>
+\t\t<UnitType>Megabyte</UnitType>
+\t\t<Value>24582</Value>
+\t</RAMUsageLimit>
+\t<DiskWarningLimit>
+\t\t<UnitType>Megabyte</UnitType>
+\t\t<Value>32768</Value>
+\t</DiskWarningLimit>
+\t<UndoLimit>1024</UndoLimit>
+\t<ViewQuality>0</ViewQuality>
+\t<AutoSaveInterval>
+\t\t<UnitType>Number</UnitType>
+\t\t<Value>50</Value>
+\t</AutoSaveInterval>
+\t<UsePerfectClipping>False</UsePerfectClipping>
+\t<UseDithering>False</UseDithering>
+\t<RetinaPassIndex>0</RetinaPassIndex>
+\t<UseHardwareAcceleration2 xsi:nil="true" />
+
+</Settings>
+"""
+
+
+class PerformancePreferences:
+    """Tune Affinity's PerformancePreferences.xml to the machine
     
-    # Check Wine first
-    gui_progress 5 "Checking Wine installation"
+    The repository's settings ship fixed values (a 24 GB RAM limit, 1024
+    undo steps) that overcommit an 8 GB laptop and leave most of a large
+    workstation unused. From the detected hardware:
     
-    if ! check_wine_version; then
-        gui_error "Wine 10.0+ is required but not found"
-        log "ERROR: Wine 10.0+ not found"
-        exit 1
-    fi
+        RAMUsageLimit             total RAM less max(2 GB, a quarter) for
+                                  Linux, Wine and other programs
+        UndoLimit                 one step per 32 MB of RAM, 128 to 1024
+        DiskWarningLimit          half the free space where Affinity keeps
+                                  its scratch files, 2 to 64 GB
+        UseHardwareAcceleration2  on with a Vulkan driver and DXVK (Affinity's
+                                  Direct3D 11 renderer then runs on Vulkan),
+                                  off otherwise
+        ViewQuality               Affinity's default (0)
     
-    log "Wine 10.0+ found"
+    Only these elements are changed in an existing file; everything else,
+    and the file's BOM and line endings, stays as Affinity wrote it.
+    """
     
-    # Install components
-    install_missing_components
+    RELATIVE_PATH = ('AppData', 'Roaming', 'Affinity', 'Affinity', '3.0', 'Settings',
+                     'PerformancePreferences.xml')
     
-    # Download helper files
-    download_helper_files || {
-        gui_error "Failed to download helper files"
-        log "ERROR: Failed to download helper files"
-    }
+    def __init__(self, prefix, scratch_dir=None, hardware_acceleration='auto'):
+        self.prefix = Path(prefix)
+        self.scratch_dir = Path(scratch_dir) if scratch_dir else self.prefix
+        self.hardware_acceleration = hardware_acceleration
     
-    # Install Affinity if installer provided
-    if [ -n "$INSTALLER_PATH" ]; then
-        install_affinity_app
-        if [ "$ENABLE_DXVK" = true ]; then
-            configure_dxvk_workarounds
-        fi
-        create_desktop_shortcuts
-    fi
+    @property
+    def path(self):
+        import pwd
+        user = os.environ.get('USER') or pwd.getpwuid(os.getuid()).pw_name
+        return self.prefix.joinpath('drive_c', 'users', user, *self.RELATIVE_PATH)
     
-    # Final summary
-    gui_progress 100 "Installation completed successfully"
-    gui_success "Affinity Linux installation completed successfully!"
+    def detect(self):
+        """RAM, free scratch space and Vulkan support"""
+        ram_mb = 0
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemTotal:'):
+                    ram_mb = int(line.split()[1]) // 1024
+                    break
+        
+        # The scratch directory may not exist yet; measure its filesystem
+        scratch = self.scratch_dir
+        while not scratch.exists() and scratch != scratch.parent:
+            scratch = scratch.parent
+        
+        return {
+            'ram_mb': ram_mb,
+            'scratch_free_mb': shutil.disk_usage(scratch).free // 1048576,
+            'vulkan': bool(system_probe().get('gpu').get('vulkan')),
+        }
+    
+    def tuned(self, hardware):
+        """Preference values for the detected hardware"""
+        ram_mb = hardware['ram_mb']
+        acceleration = self.hardware_acceleration
+        if acceleration == 'auto':
+            acceleration = 'on' if hardware['vulkan'] else 'off'
+        
+        return {
+            'RAMUsageLimit': max(1024, (ram_mb - max(2048, ram_mb // 4)) // 256 * 256),
+            'UndoLimit': max(128, min(1024, ram_mb // 32 // 64 * 64)),
+            'DiskWarningLimit': max(2048, min(65536, hardware['scratch_free_mb'] // 2 // 1024 * 1024)),
+            'ViewQuality': 0,
+            'UseHardwareAcceleration2': acceleration == 'on',
+        }
+    
+    @staticmethod
+    def apply(text, values):
+        """Return the preferences XML text with values set"""
+        newline = '\r\n' if '\r\n' in text else '\n'
+        for name, value in values.items():
+            if name == 'UseHardwareAcceleration2':
+                element = f"<{name}>{value}</{name}>"
+                pattern = rf"<{name}\b[^>]*/>|<{name}>[^<]*</{name}>"
+            elif name in ('RAMUsageLimit', 'DiskWarningLimit'):
+                element = (f"<{name}>{newline}\t\t<UnitType>Megabyte</UnitType>{newline}"
+                           f"\t\t<Value>{value}</Value>{newline}\t</{name}>")
+                pattern = rf"<{name}>.*?</{name}>"
+            else:
+                element = f"<{name}>{value}</{name}>"
+                pattern = rf"<{name}>[^<]*</{name}>"
+            
+            text, count = re.subn(pattern, lambda match: element, text, count=1, flags=re.DOTALL)
+            if not count:
+                text = text.replace('</Settings>', f"\t{element}{newline}</Settings>", 1)
+        return text
     
-    log "=========================================="
-    log "Affinity Linux Installation Completed"
-    log "=========================================="
-}
+    def current(self):
+        """Text of the prefix's preferences, or None if it has none"""
+        try:
+            with open(self.path, encoding='utf-8', newline='') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+    
+    def update(self, dry_run=False):
+        """Write the tuned preferences; returns (hardware, values, diff)"""
+        import difflib
+        
+        hardware = self.detect()
+        values = self.tuned(hardware)
+        old = self.current()
+        base = old if old is not None else PERFORMANCE_PREFERENCES_TEMPLATE.replace('\n', '\r\n')
+        new = self.apply(base, values)
+        
+        diff = ''.join(difflib.unified_diff(
+            (old or '').replace('\r\n', '\n').splitlines(keepends=True),
+            new.replace('\r\n', '\n').splitlines(keepends=True),
+            fromfile=str(self.path) if old is not None else '/dev/null',
+            tofile=str(self.path)))
+        
+        if not dry_run and new != old:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp = self.path.with_name(f".{self.path.name}.tmp")
+            with open(temp, 'w', encoding='utf-8', newline='') as f:
+                f.write(new)
+            os.replace(temp, self.path)
+        return hardware, values, diff
 
-# Run main function only if not in GUI mode
-# When GUI_MODE=true, script is being sourced to call specific functions
-if [ "$GUI_MODE" != true ]; then
-    main "$@"
-fi
-'''
+
+def performance_prefs_main(argv):
+    """Entry point for --performance-prefs, also called back from BASH_SCRIPT"""
+    parser = argparse.ArgumentParser(
+        prog="affinity_installer_unified.py --performance-prefs",
+        description="Write Affinity's memory, undo, scratch and GPU preferences for this machine into a prefix."
+    )
+    parser.add_argument('--performance-prefs', metavar='PREFIX', required=True)
+    parser.add_argument('--scratch', metavar='DIR',
+                        help="where Affinity keeps scratch files (default: the prefix)")
+    parser.add_argument('--hardware-acceleration', choices=('auto', 'on', 'off'), default='auto',
+                        help="GPU acceleration; auto turns it on when a Vulkan driver is installed")
+    parser.add_argument('--dry-run', action='store_true', help="print the changes as a diff, write nothing")
+    parser.add_argument('--json', action='store_true', help="print hardware, values and diff as JSON")
+    args = parser.parse_args(argv)
+    
+    preferences = PerformancePreferences(args.performance_prefs, args.scratch, args.hardware_acceleration)
+    try:
+        hardware, values, diff = preferences.update(args.dry_run)
+    except OSError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    
+    if args.json:
+        print(json.dumps({'path': str(preferences.path), 'hardware': hardware,
+                          'values': values, 'diff': diff, 'written': bool(diff) and not args.dry_run}))
+        return EXIT_OK
+    
+    print(f"{hardware['ram_mb']} MB RAM, {hardware['scratch_free_mb']} MB free for scratch, "
+          f"Vulkan {'available' if hardware['vulkan'] else 'not available'}")
+    if args.dry_run:
+        print(diff or f"{preferences.path} is already up to date", end='' if diff else '\n')
+    else:
+        print(f"Wrote {preferences.path}" if diff else f"{preferences.path} is already up to date")
+    return EXIT_OK
 
 
 # ============================================================================
-# PROGRESS MONITOR - Track Installation Activity
+# SETTINGS PROFILES - Deploy Auxiliary/Settings into Prefixes
 # ============================================================================
 
-class ProgressMonitor:
-    """Monitor installation progress by tracking log file growth"""
+def default_settings_profile():
+    """Auxiliary/Settings of the repository checkout this file runs from, if any"""
+    parents = Path(__file__).resolve().parents
+    if len(parents) < 4:
+        return None
+    profile = parents[3] / 'Auxiliary' / 'Settings'
+    return profile if profile.is_dir() else None
+
+
+class SettingsProfile:
+    """Merge a settings tree into prefixes' AppData/Roaming/Affinity
     
-    def __init__(self, log_file, log_callback=None, progress_callback=None):
-        self.log_file = log_file
-        self.log_callback = log_callback or print
-        self.progress_callback = progress_callback
-        self.last_size = 0
-        self.idle_seconds = 0
-        self.elapsed_seconds = 0
-        self.is_active = False
+    The profile mirrors the Roaming/Affinity layout (Affinity/3.0/Settings,
+    Photo/2.0/Settings, .../Workspaces/<id>/WindowProfile.xml). For every
+    XML file in it:
+    
+        missing in the prefix    copied as is
+        present                  merged: elements the user's file lacks are
+                                 added from the profile, everything the user
+                                 has is kept; lists (repeated elements) are
+                                 treated as single values
+    
+    A file is only rewritten if the merge added something, and then keeps
+    its prolog, root start tag (with the xmlns:xsi/xmlns:xsd declarations
+    ElementTree would otherwise drop or rename) and comments. Each prefix keeps
+    .aol_settings with the profile digest and the stat of every file as
+    deployed, so an unchanged profile over unchanged files is skipped
+    without parsing. Profile files are read and parsed once per pass,
+    however many prefixes it covers.
+    """
+    
+    STATE_FILE = '.aol_settings'
+    
+    def __init__(self, source):
+        import hashlib
+        self.source = Path(source)
+        self.files = {}  # relative path -> (bytes, digest)
+        self.trees = {}  # relative path -> parsed root, on first use
+        for path in sorted(self.source.rglob('*.xml')):
+            if path.is_file():
+                data = path.read_bytes()
+                self.files[path.relative_to(self.source).as_posix()] = (data, hashlib.sha256(data).hexdigest())
+    
+    @staticmethod
+    def roaming(prefix):
+        import pwd
+        user = os.environ.get('USER') or pwd.getpwuid(os.getuid()).pw_name
+        return Path(prefix) / 'drive_c' / 'users' / user / 'AppData' / 'Roaming' / 'Affinity'
+    
+    @staticmethod
+    def parse(data):
+        """Parse XML bytes, keeping comments"""
+        import xml.etree.ElementTree as ET
+        parser = ET.XMLParser(target=ET.TreeBuilder(insert_comments=True))
+        parser.feed(data)
+        return parser.close()
+    
+    def tree(self, name):
+        if name not in self.trees:
+            self.trees[name] = self.parse(self.files[name][0])
+        return self.trees[name]
     
-    def check_progress(self):
-        """Check if installation is making progress"""
+    @classmethod
+    def merge(cls, target, profile):
+        """Add profile's elements missing from target; returns the number added"""
+        import copy
+        
+        def elements(element):
+            # Comments have a function for a tag; they are neither merged nor copied
+            return [child for child in element if isinstance(child.tag, str)]
+        
+        def is_list(element):
+            tags = [child.tag for child in elements(element)]
+            return len(tags) != len(set(tags))
+        
+        if is_list(target) or is_list(profile):
+            return 0
+        
+        added = 0
+        existing = {child.tag: child for child in elements(target)}
+        for child in elements(profile):
+            if child.tag in existing:
+                added += cls.merge(existing[child.tag], child)
+            else:
+                target.append(copy.deepcopy(child))
+                added += 1
+        return added
+    
+    @staticmethod
+    def serialize(root, original):
+        """XML bytes the way Affinity writes them: tabs, CRLF, and the prolog
+        and root start tag of the original file"""
+        import re
+        import xml.etree.ElementTree as ET
+        ET.register_namespace('xsi', 'http://www.w3.org/2001/XMLSchema-instance')
+        ET.register_namespace('xsd', 'http://www.w3.org/2001/XMLSchema')
+        ET.indent(root, space='\t')
+        text = ET.tostring(root, encoding='unicode', short_empty_elements=True)
+        
+        # ElementTree declares only the namespaces it uses, under its own
+        # prefixes, and drops the prolog; put the original ones back
+        original = original.decode('utf-8').replace('\r\n', '\n')
+        start = re.search(r'<(?![?!])[^>]*>', original)
+        prolog, start_tag = original[:start.start()], start.group().removesuffix('/>').removesuffix('>')
+        end = text.index('>') + 1
+        for declaration in re.findall(r'\sxmlns(?::\w+)?="[^"]*"', text[:end]):
+            if declaration.split('=')[0] + '=' not in start_tag:
+                start_tag += declaration
+        text = prolog + start_tag + '>' + text[end:]
+        return text.replace('\n', '\r\n').encode('utf-8')
+    
+    def deploy(self, prefix, dry_run=False):
+        """Deploy into one prefix; returns {'copied', 'merged', 'unchanged', 'skipped', 'errors'}"""
+        import xml.etree.ElementTree as ET
+        
+        roaming = self.roaming(prefix)
+        state_path = Path(prefix) / self.STATE_FILE
         try:
-            current_size = os.path.getsize(self.log_file)
-        except:
-            current_size = 0
-        
-        if current_size > self.last_size:
-            # Progress detected!
-            bytes_added = current_size - self.last_size
-            self.last_size = current_size
-            self.idle_seconds = 0
-            self.is_active = True
-            
-            # Log activity
-            self.log_callback(f"  ✓ ACTIVE (+{bytes_added} bytes)")
-            
-            return True
-        else:
-            # No progress
-            self.idle_seconds += 5
-            self.is_active = False
+            with open(state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        
+        result = {'copied': [], 'merged': [], 'unchanged': 0, 'skipped': 0, 'errors': []}
+        for name, (data, digest) in self.files.items():
+            target = roaming / name
+            try:
+                st = target.stat()
+            except FileNotFoundError:
+                st = None
             
-            # Log idle status
-            if self.idle_seconds > 30:  # Only show after 30 seconds
-                self.log_callback(f"  ⏸ IDLE ({self.idle_seconds}s)")
+            stamp = [digest, st.st_size, st.st_mtime_ns] if st else None
+            if stamp and state.get(name) == stamp:
+                result['skipped'] += 1
+                continue
             
-            return False
+            try:
+                if st is None:
+                    new = data
+                    result['copied'].append(name)
+                else:
+                    original = target.read_bytes()
+                    current = self.parse(original)
+                    if self.merge(current, self.tree(name)):
+                        new = self.serialize(current, original)
+                        result['merged'].append(name)
+                    else:
+                        new = None
+                        result['unchanged'] += 1
+                
+                if new is not None and not dry_run:
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    temp = target.with_name(f".{target.name}.tmp")
+                    temp.write_bytes(new)
+                    os.replace(temp, target)
+                if not dry_run:
+                    st = target.stat()
+                    state[name] = [digest, st.st_size, st.st_mtime_ns]
+            except (OSError, ValueError, ET.ParseError) as e:
+                result['errors'].append(f"{name}: {e}")
+        
+        if not dry_run:
+            temp = state_path.with_name(f"{self.STATE_FILE}.tmp")
+            with open(temp, 'w') as f:
+                json.dump(state, f)
+            os.replace(temp, state_path)
+        return result
+
+
+def deploy_settings_main(argv):
+    """Entry point for --deploy-settings, also called back from BASH_SCRIPT"""
+    parser = argparse.ArgumentParser(
+        prog="affinity_installer_unified.py --deploy-settings",
+        description="Merge a settings profile (like Auxiliary/Settings) into one or more prefixes, keeping user settings."
+    )
+    parser.add_argument('--deploy-settings', nargs='+', metavar=('PROFILE', 'PREFIX'), required=True)
+    parser.add_argument('--dry-run', action='store_true', help="report what would change, write nothing")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args(argv)
     
-    def update_elapsed(self):
-        """Update elapsed time"""
-        self.elapsed_seconds += 5
+    if len(args.deploy_settings) < 2:
+        parser.error("--deploy-settings needs a PROFILE and at least one PREFIX")
+    source, *prefixes = args.deploy_settings
+    if not Path(source).is_dir():
+        parser.error(f"{source} is not a directory")
     
-    def get_status(self):
-        """Get current status"""
-        return {
-            'active': self.is_active,
-            'idle_seconds': self.idle_seconds,
-            'elapsed_seconds': self.elapsed_seconds,
-            'bytes_processed': self.last_size
-        }
+    profile = SettingsProfile(source)
+    report = {prefix: profile.deploy(prefix, args.dry_run) for prefix in prefixes}
+    
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        verb = "would be" if args.dry_run else "were"
+        for prefix, result in report.items():
+            print(f"{prefix}: {len(result['copied'])} file(s) {verb} added, {len(result['merged'])} merged, "
+                  f"{result['unchanged'] + result['skipped']} up to date")
+            for name in result['merged']:
+                print(f"  merged {name}")
+            for error in result['errors']:
+                print(f"  ❌ {error}")
+    
+    return EXIT_FAILED if any(result['errors'] for result in report.values()) else EXIT_OK
 
 
 # ============================================================================
-# WINE INSTALLER - Pure Python Implementation
+# PREFIX VERIFIER - Health Check without Launching Wine
 # ============================================================================
 
-class WineInstaller:
-    """Pure Python Wine 10+ installer for multiple Linux distributions"""
+class PrefixVerifier:
+    """Check what is installed in a prefix by reading it directly
     
-    def __init__(self, sudo_password, log_callback=None):
-        self.sudo_password = sudo_password
-        self.log = log_callback or print
-        self.distro = self._detect_distro()
+    Registry values come from system.reg/user.reg, and DLL versions from the
+    VS_FIXEDFILEINFO block in each PE file. Neither wine nor wineserver is
+    started, so a check takes milliseconds and is safe to run before every
+    launch or across many prefixes. Only registry keys under the prefixes
+    in REGISTRY_KEYS are parsed; the rest of the hive is skipped.
     
-    def _detect_distro(self):
-        """Detect Linux distribution"""
-        try:
-            with open('/etc/os-release', 'r') as f:
-                for line in f:
-                    if line.startswith('ID='):
-                        return line.split('=')[1].strip().strip('"')
-        except:
-            return None
-        return None
+    Run a prefix's registry checks after wineserver has exited; a running
+    wineserver writes the hives back lazily.
+    """
     
-    def _run_sudo_command(self, cmd, timeout=300):
-        """Run command with sudo using stored password and log output in real-time"""
-        if isinstance(cmd, str):
-            cmd = cmd.split()
-        
-        full_cmd = ['sudo', '-S'] + cmd
-        
+    DOTNET48_RELEASE = 528040
+    WIN11_BUILD = 22000
+    REGISTRY_KEYS = (
+        r'software\microsoft\net framework setup\ndp\v4\full',
+        r'software\microsoft\visualstudio\14.0\vc\runtimes',
+        r'software\wow6432node\microsoft\visualstudio\14.0\vc\runtimes',
+        r'software\microsoft\windows\currentversion\uninstall',
+        r'software\microsoft\windows nt\currentversion',
+        r'software\wine\dlloverrides',
+        r'software\wine\direct3d',
+    )
+    
+    def __init__(self, prefix):
+        self.prefix = Path(prefix).expanduser()
+        self.drive_c = self.prefix / 'drive_c'
+        self.system32 = self.drive_c / 'windows' / 'system32'
+        self.hives = {}
+    
+    def hive(self, name):
+        """Parsed 'system' or 'user' hive: {key: {value name: value}}, lower-cased"""
+        if name not in self.hives:
+            self.hives[name] = self.parse_reg(self.prefix / f'{name}.reg', self.REGISTRY_KEYS)
+        return self.hives[name]
+    
+    @staticmethod
+    def parse_reg(path, wanted):
+        """Parse the keys of a Wine .reg file that start with one of wanted
+        
+        The wanted section headers are found with one regex pass over a
+        lower-cased copy of the hive, so the bulk of it (COM classes and
+        the like) is never split into lines.
+        """
         try:
-            process = subprocess.Popen(
-                full_cmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1  # Line buffered
-            )
-            
-            # Send password
-            process.stdin.write(f"{self.sudo_password}\n")
-            process.stdin.flush()
-            
-            # Read output line by line in real-time
-            output_lines = []
-            for line in iter(process.stdout.readline, ''):
-                if not line:
-                    break
-                line = line.rstrip()
-                if line and not line.startswith('[sudo]'):  # Skip sudo password prompt
-                    self.log(f"  {line}")
-                    output_lines.append(line)
-            
-            process.wait(timeout=timeout)
-            
-            return process.returncode == 0, '\n'.join(output_lines)
+            data = Path(path).read_bytes()
+        except OSError:
+            return {}
+        
+        # bytes.lower() only touches ASCII, so offsets match the original.
+        # Key names are stored with doubled backslashes. Anchoring on "\n["
+        # rather than ^ with re.MULTILINE keeps the scan in the fast path.
+        headers = re.compile(
+            rb'\n\[((?:%s)[^\]\n]*)\]' % b'|'.join(re.escape(key.replace('\\', '\\\\').encode()) for key in wanted)
+        )
         
-        except subprocess.TimeoutExpired:
-            process.kill()
-            return False, "Command timed out"
-        except Exception as e:
-            return False, str(e)
+        keys = {}
+        for header in headers.finditer(data.lower()):
+            end = data.find(b'\n[', header.end())
+            key = header.group(1).decode('utf-8', 'replace').replace('\\\\', '\\')
+            values = keys.setdefault(key, {})
+            section = data[header.end():end if end >= 0 else None].decode('utf-8', 'replace')
+            for line in section.splitlines():
+                if not line.startswith(('"', '@')):
+                    continue
+                name, sep, raw = line.partition('=')
+                if not sep:
+                    continue
+                name = '' if name == '@' else name[1:-1].replace('\\\\', '\\').lower()
+                if raw.startswith('dword:'):
+                    values[name] = int(raw[6:], 16)
+                elif raw.startswith('"'):
+                    values[name] = raw[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+                else:
+                    values[name] = raw
+        return keys
     
-    def check_wine_version(self):
-        """Check if Wine 10+ is installed"""
-        wine_cmd = shutil.which("wine")
-        if not wine_cmd:
-            return False, None
+    def reg_value(self, hive, key, name):
+        """A registry value, or None"""
+        return self.hive(hive).get(key.lower(), {}).get(name.lower())
+    
+    @staticmethod
+    def file_version(path):
+        """(major, minor, build, revision) of a PE file, or None"""
+        import mmap
+        import struct
         
         try:
-            result = subprocess.run(
-                [wine_cmd, "--version"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            
-            if result.returncode != 0:
-                return False, None
-            
-            version_str = result.stdout.strip()
-            match = re.search(r'(\d+)\.(\d+)', version_str)
-            
-            if not match:
-                return False, None
-            
-            major = int(match.group(1))
-            minor = int(match.group(2))
-            
-            if major >= 10:
-                return True, f"{major}.{minor}"
-            else:
-                return False, f"{major}.{minor}"
-        
-        except Exception:
-            return False, None
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                # VS_FIXEDFILEINFO: signature, struct version, file version MS, LS
+                index = data.rfind(b'\xbd\x04\xef\xfe')
+                if index < 0:
+                    return None
+                ms, ls = struct.unpack_from('<II', data, index + 8)
+                return (ms >> 16, ms & 0xffff, ls >> 16, ls & 0xffff)
+        except (OSError, ValueError, struct.error):
+            return None
     
-    def install_wine_debian(self, progress_callback=None):
-        """Install Wine 10+ on Debian/Ubuntu from WineHQ"""
-        self.log("📥 Installing Wine 10+ on Debian/Ubuntu...")
-        if progress_callback:
-            progress_callback(5, "Enabling 32-bit architecture")
-        
-        # Enable 32-bit architecture
-        self.log("🔧 Enabling 32-bit architecture...")
-        success, output = self._run_sudo_command("dpkg --add-architecture i386")
-        if not success:
-            self.log(f"⚠️  Warning: {output}")
-        
-        if progress_callback:
-            progress_callback(10, "Creating keyrings directory")
-        
-        # Create keyrings directory
-        self.log("📁 Creating keyrings directory...")
-        success, output = self._run_sudo_command("mkdir -pm755 /etc/apt/keyrings")
-        
-        if progress_callback:
-            progress_callback(15, "Downloading WineHQ repository key")
-        
-        # Download WineHQ key
-        self.log("🔑 Downloading WineHQ repository key...")
-        success, output = self._run_sudo_command(
-            "wget -O /etc/apt/keyrings/winehq-archive.key https://dl.winehq.org/wine-builds/winehq.key",
-            timeout=60
-        )
-        if not success:
-            return False, "Failed to download WineHQ key"
-        
-        if progress_callback:
-            progress_callback(20, "Getting system codename")
-        
-        # Get codename for repository
+    @staticmethod
+    def is_wine_builtin(path):
+        """True for Wine's placeholder DLLs, which only forward to the builtin"""
         try:
-            result = subprocess.run(
-                ["lsb_release", "-cs"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            codename = result.stdout.strip()
-        except:
-            codename = "jammy"  # Default to Ubuntu 22.04
-        
-        if progress_callback:
-            progress_callback(25, "Adding WineHQ repository")
-        
-        # Download repository sources file
-        self.log(f"📦 Adding WineHQ repository for {codename}...")
-        
-        if self.distro == "ubuntu":
-            repo_url = f"https://dl.winehq.org/wine-builds/ubuntu/dists/{codename}/winehq-{codename}.sources"
-        else:
-            repo_url = f"https://dl.winehq.org/wine-builds/debian/dists/{codename}/winehq-{codename}.sources"
-        
-        success, output = self._run_sudo_command(
-            f"wget -NP /etc/apt/sources.list.d/ {repo_url}",
-            timeout=60
+            with open(path, 'rb') as f:
+                header = f.read(0x80)
+            return b'Wine builtin DLL' in header or b'Wine placeholder DLL' in header
+        except OSError:
+            return False
+    
+    def check_prefix(self):
+        missing = [name for name in ('system.reg', 'user.reg') if not (self.prefix / name).is_file()]
+        if missing or not self.system32.is_dir():
+            return False, f"not an initialised Wine prefix (missing {', '.join(missing) or 'system32'})"
+        return True, str(self.prefix)
+    
+    def check_remove_mono(self):
+        uninstall = r'software\microsoft\windows\currentversion\uninstall'
+        for key, values in self.hive('system').items():
+            if key.startswith(uninstall) and str(values.get('displayname', '')).startswith('Wine Mono'):
+                return False, f"{values['displayname']} is still installed"
+        return True, "Wine Mono removed"
+    
+    def check_dotnet48(self):
+        release = self.reg_value('system', r'Software\Microsoft\NET Framework Setup\NDP\v4\Full', 'Release')
+        if release is None:
+            return False, ".NET Framework 4.x not registered"
+        if release < self.DOTNET48_RELEASE:
+            return False, f".NET Framework release {release} is older than 4.8 ({self.DOTNET48_RELEASE})"
+        version = self.reg_value('system', r'Software\Microsoft\NET Framework Setup\NDP\v4\Full', 'Version')
+        return True, f".NET Framework {version} (release {release})"
+    
+    def check_vcrun2022(self):
+        details = []
+        for arch, key, dll in (
+                ('x64', r'Software\Microsoft\VisualStudio\14.0\VC\Runtimes\x64', self.system32),
+                ('x86', r'Software\Wow6432Node\Microsoft\VisualStudio\14.0\VC\Runtimes\x86',
+                 self.drive_c / 'windows' / 'syswow64')):
+            if self.reg_value('system', key, 'Installed') != 1:
+                return False, f"VC++ 2015-2022 {arch} runtime not registered"
+            version = self.file_version(dll / 'vcruntime140.dll')
+            if not version or version[:2] < (14, 30):
+                return False, f"{arch} vcruntime140.dll is {'.'.join(map(str, version)) if version else 'missing'}, need 14.30+"
+            details.append(f"{arch} {'.'.join(map(str, version))}")
+        return True, "VC++ runtime " + ", ".join(details)
+    
+    def check_corefonts(self):
+        fonts = self.drive_c / 'windows' / 'Fonts'
+        missing = [name for name in ('arial.ttf', 'times.ttf', 'verdana.ttf') if not (fonts / name).is_file()]
+        if missing:
+            return False, f"missing {', '.join(missing)} in {fonts}"
+        if self.reg_value('system', r'Software\Microsoft\Windows NT\CurrentVersion\Fonts', 'Arial (TrueType)') is None:
+            return False, "Arial is not registered in the font table"
+        return True, "core fonts installed"
+    
+    def check_tahoma(self):
+        if not (self.drive_c / 'windows' / 'Fonts' / 'tahoma.ttf').is_file():
+            return False, "tahoma.ttf not installed"
+        return True, "Tahoma installed"
+    
+    def check_win11(self):
+        build = self.reg_value('system', r'Software\Microsoft\Windows NT\CurrentVersion', 'CurrentBuild')
+        try:
+            build_number = int(build)
+        except (TypeError, ValueError):
+            return False, "Windows version not set"
+        if build_number < self.WIN11_BUILD:
+            return False, f"Windows build {build_number}, need {self.WIN11_BUILD}+ (win11)"
+        return True, f"Windows build {build_number}"
+    
+    def check_dxvk(self):
+        for dll in ('d3d11', 'dxgi'):
+            override = self.reg_value('user', r'Software\Wine\DllOverrides', dll)
+            if not override or not str(override).startswith('native'):
+                return False, f"{dll} is not overridden to native"
+            path = self.system32 / f'{dll}.dll'
+            if not path.is_file() or self.is_wine_builtin(path):
+                return False, f"{path.name} is Wine's builtin, not DXVK"
+        return True, "DXVK d3d11/dxgi installed"
+    
+    def check_renderer(self, renderer):
+        value = self.reg_value('user', r'Software\Wine\Direct3D', 'renderer')
+        if value != renderer:
+            return False, f"Direct3D renderer is {value or 'default'}, expected {renderer}"
+        return True, f"Direct3D renderer {renderer}"
+    
+    def check_app(self):
+        apps = self.drive_c / 'Program Files' / 'Affinity'
+        exe = next(apps.rglob('Affinity.exe'), None) if apps.is_dir() else None
+        if not exe:
+            return False, f"Affinity.exe not found under {apps}"
+        version = self.file_version(exe)
+        return True, f"{exe.relative_to(self.drive_c)} {'.'.join(map(str, version)) if version else ''}".rstrip()
+    
+    def verify(self, components=(), app=False):
+        """Run the checks for the given winetricks verbs; returns [(name, ok, detail)]"""
+        ok, detail = self.check_prefix()
+        results = [('prefix', ok, detail)]
+        if not ok:
+            return results
+        
+        for component in components:
+            if component.startswith('renderer='):
+                results.append((component, *self.check_renderer(component.split('=', 1)[1])))
+            elif hasattr(self, f'check_{component}'):
+                results.append((component, *getattr(self, f'check_{component}')()))
+            else:
+                results.append((component, None, "no check available"))
+        if app:
+            results.append(('app', *self.check_app()))
+        return results
+
+
+VERIFY_COMPONENTS = "remove_mono vcrun2022 dotnet48 corefonts win11"
+
+
+def verify_prefix_main(argv):
+    """Entry point for --verify-prefix; exit code 0 when every check passes"""
+    parser = argparse.ArgumentParser(
+        prog="affinity_installer_unified.py --verify-prefix",
+        description="Check the components installed in Wine prefixes without starting Wine."
+    )
+    parser.add_argument('--verify-prefix', nargs='+', metavar='PREFIX', required=True)
+    parser.add_argument('--components', default=VERIFY_COMPONENTS,
+                        help=f"winetricks verbs to check (default: {VERIFY_COMPONENTS!r})")
+    parser.add_argument('--app', action='store_true', help="also check that Affinity is installed")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args(argv)
+    
+    report = {}
+    for prefix in args.verify_prefix:
+        started = time.monotonic()
+        results = PrefixVerifier(prefix).verify(args.components.split(), args.app)
+        report[prefix] = {
+            'ok': all(ok is not False for _, ok, _ in results),
+            'seconds': round(time.monotonic() - started, 3),
+            'checks': [{'name': name, 'ok': ok, 'detail': detail} for name, ok, detail in results],
+        }
+    
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        marks = {True: '✅', False: '❌', None: '➖'}
+        for prefix, result in report.items():
+            print(f"{prefix} ({result['seconds'] * 1000:.0f} ms)")
+            for check in result['checks']:
+                print(f"  {marks[check['ok']]} {check['name']}: {check['detail']}")
+    
+    return EXIT_OK if all(result['ok'] for result in report.values()) else EXIT_FAILED
+
+
+# ============================================================================
+# BATCH PROVISIONING - Many Prefixes from One Manifest
+# ============================================================================
+
+# Per-job settings that only make sense once per batch
+BATCH_GLOBAL_SETTINGS = ('install_wine', 'package_mirror', 'sudo_password_file')
+
+
+def load_batch_manifest(path, settings):
+    """Expand a batch manifest into one settings dict per prefix
+    
+    The manifest holds a "prefixes" list and an optional "defaults" table,
+    both using the headless setting names plus "name" per prefix:
+    
+        {"defaults": {"installer": "Affinity.msix"},
+         "prefixes": [{"name": "design", "prefix": "/srv/wine/design"},
+                      {"prefix": "/srv/wine/print", "enable_dxvk": false}]}
+    
+    Values are layered as settings (defaults, --config, command line), then
+    manifest defaults, then the entry itself. All jobs share $HOME, so each
+    gets its own menu entry, "Affinity (<name>)" unless shortcut_name is set.
+    """
+    manifest = read_config_file(path)
+    check_settings(path, manifest, ('defaults', 'prefixes'))
+    per_job = set(HEADLESS_DEFAULTS) - set(BATCH_GLOBAL_SETTINGS)
+    defaults = check_settings(f"{path}: defaults", manifest.get('defaults', {}), per_job)
+    entries = manifest.get('prefixes')
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path}: expected a non-empty \"prefixes\" list")
+    
+    jobs = []
+    seen = {}
+    shortcut_names = set()
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict) or 'prefix' not in entry:
+            raise ValueError(f"{path}: prefixes[{index}] needs a \"prefix\"")
+        check_settings(f"{path}: prefixes[{index}]", entry, per_job | {'name'})
+        
+        job = {key: value for key, value in settings.items() if key in per_job}
+        job.update(defaults)
+        job.update(entry)
+        job['prefix'] = str(Path(job['prefix']).expanduser().absolute())
+        job.setdefault('name', Path(job['prefix']).name)
+        job['shortcut_name'] = job.get('shortcut_name') or f"Affinity ({job['name']})"
+        if job['prefix'] in seen:
+            raise ValueError(f"{path}: prefix {job['prefix']} is listed twice")
+        if job['name'] in seen.values():
+            raise ValueError(f"{path}: job name {job['name']!r} is used twice")
+        if job['shortcut_name'] in shortcut_names:
+            raise ValueError(f"{path}: shortcut name {job['shortcut_name']!r} is used twice")
+        seen[job['prefix']] = job['name']
+        shortcut_names.add(job['shortcut_name'])
+        jobs.append(job)
+    return jobs
+
+
+def default_batch_jobs(path):
+    """Concurrent installs: half the CPUs, at most 2 on a rotational disk
+    
+    Winetricks installers are mostly single-threaded but write heavily, so
+    a spinning disk, not the CPU, limits how many run well at once.
+    """
+    jobs = max(1, (os.cpu_count() or 2) // 2)
+    path = Path(path)
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    try:
+        device = os.stat(path).st_dev
+        block = Path(f'/sys/dev/block/{os.major(device)}:{os.minor(device)}')
+        queue = block / 'queue' if (block / 'queue').exists() else block.resolve().parent / 'queue'
+        if (queue / 'rotational').read_text().strip() == '1':
+            jobs = min(jobs, 2)
+    except OSError:
+        pass
+    return jobs
+
+
+class BatchProvisioner:
+    """Provision several prefixes concurrently with a bounded worker pool
+    
+    Each job is a BashInstaller with its own log file and environment.
+    WINEPREFIX is pinned per job, so every job talks to its own wineserver.
+    Progress from all jobs is interleaved with a [name] tag, and the
+    per-phase timings of every job are collected into one report.
+    """
+    
+    def __init__(self, jobs, max_workers=None, log_callback=None, event_callback=None):
+        self.jobs = jobs
+        self.max_workers = min(len(jobs), max_workers or default_batch_jobs(jobs[0]['prefix']))
+        self.log = log_callback or (lambda message, level='info': print(message))
+        self.event_callback = event_callback
+        self.log_dir = default_cache_dir() / 'logs' / f"batch_{time.strftime('%Y%m%d_%H%M%S')}"
+        self.lock = threading.Lock()
+        self.installers = {}
+        self.results = {}
+        self.stopping = False
+    
+    def run_job(self, job):
+        """Run one job and return its report entry"""
+        name = job['name']
+        report = {'name': name, 'prefix': job['prefix'], 'log': str(self.log_dir / f"{name}.log"),
+                  'exit_code': None, 'seconds': None, 'phases': {}}
+        phase_started = {}
+        
+        def event(event):
+            kind = event.get('type')
+            if kind == 'phase_start':
+                phase_started[event.get('phase')] = event.get('ts')
+            elif kind == 'phase_end' and event.get('phase') in phase_started:
+                start = phase_started.pop(event['phase'])
+                report['phases'][event['phase']] = round(event.get('ts', start) - start, 1)
+            if self.event_callback:
+                self.event_callback(dict(event, job=name))
+        
+        def progress(percent, message):
+            self.log(f"[{name}] [{percent:3d}%] {message}")
+        
+        def log(message, level='info'):
+            if level == 'error':
+                self.log(f"[{name}] {message}", level)
+        
+        env = dict(os.environ, WINEPREFIX=job['prefix'])
+        installer = BashInstaller(
+            BASH_SCRIPT,
+            job['prefix'],
+            job['installer'],
+            job['enable_dxvk'],
+            job['enable_vulkan'],
+            job['enable_tahoma'],
+            cache_dir=job['cache_dir'],
+            cache_max_mb=job['cache_max_mb'],
+            offline=job['offline'],
+            golden_dir=job['golden_dir'],
+            export_golden=job['export_golden'],
+            shader_cache_seed=job['shader_cache_seed'],
+            settings_profile=job['settings_profile'],
+            work_dir=job['work_dir'],
+            scratch_dir=job['scratch_dir'],
+            shortcut_name=job['shortcut_name'],
+            resume=job['resume'],
+            log_file=report['log'],
+            env=env,
+            share_payload=len(self.jobs) > 1,
+            log_callback=log,
+            progress_callback=progress,
+            event_callback=event
         )
-        if not success:
-            self.log(f"⚠️  Warning: {output}")
-        
-        if progress_callback:
-            progress_callback(30, "Updating package list")
         
-        # Update package list
-        self.log("🔄 Updating package list...")
-        success, output = self._run_sudo_command("apt update", timeout=180)
-        if not success:
-            return False, "Failed to update package list"
+        with self.lock:
+            if self.stopping:
+                return report
+            self.installers[name] = installer
+        
+        started = time.monotonic()
+        report['exit_code'] = installer.run()
+        report['seconds'] = round(time.monotonic() - started, 1)
+        
+        with self.lock:
+            del self.installers[name]
+            self.results[name] = report
+            done = len(self.results)
+        mark = '✅' if report['exit_code'] == 0 else '❌'
+        self.log(f"{mark} [{name}] finished in {report['seconds']:.0f}s "
+                 f"with exit code {report['exit_code']} ({done}/{len(self.jobs)} done)")
+        return report
+    
+    def run(self, report_path=None):
+        """Run every job; returns EXIT_OK only if all of them succeeded"""
+        from concurrent.futures import ThreadPoolExecutor
         
-        if progress_callback:
-            progress_callback(40, "Installing Wine 10+ and winetricks")
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.log(f"Provisioning {len(self.jobs)} prefixes, {self.max_workers} at a time "
+                 f"(logs in {self.log_dir})")
         
-        # Install Wine and winetricks
-        self.log("📥 Installing Wine 10+ and winetricks (this may take several minutes)...")
-        success, output = self._run_sudo_command(
-            "apt install --install-recommends winehq-stable winetricks -y",
-            timeout=600
-        )
+        started = time.monotonic()
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = [pool.submit(self.run_job, job) for job in self.jobs]
+        try:
+            reports = [future.result() for future in futures]
+        except KeyboardInterrupt:
+            with self.lock:
+                self.stopping = True
+                running = list(self.installers.values())
+            for installer in running:
+                installer.terminate()
+            pool.shutdown(wait=True, cancel_futures=True)
+            return EXIT_INTERRUPTED
+        pool.shutdown()
+        
+        summary = {
+            'seconds': round(time.monotonic() - started, 1),
+            'workers': self.max_workers,
+            'succeeded': sum(1 for report in reports if report['exit_code'] == 0),
+            'failed': sum(1 for report in reports if report['exit_code'] != 0),
+            'jobs': reports,
+        }
+        self.print_summary(summary)
         
-        if progress_callback:
-            progress_callback(90, "Verifying installation")
+        for path in filter(None, (report_path, self.log_dir / 'report.json')):
+            try:
+                Path(path).write_text(json.dumps(summary, indent=2) + '\n')
+            except OSError as e:
+                self.log(f"Could not write report {path}: {e}", 'error')
         
-        if success:
-            self.log("✅ Wine 10+ installed successfully!")
-            if progress_callback:
-                progress_callback(100, "Wine installation complete")
-            return True, "Wine installed"
-        else:
-            return False, output
+        return EXIT_OK if summary['failed'] == 0 else EXIT_FAILED
     
-    def install_wine_fedora(self, progress_callback=None):
-        """Install Wine on Fedora"""
-        self.log("📥 Installing Wine on Fedora...")
-        
-        if progress_callback:
-            progress_callback(30, "Installing Wine and winetricks")
-        
-        success, output = self._run_sudo_command(
-            "dnf install wine winetricks -y",
-            timeout=600
+    def print_summary(self, summary):
+        """Log a table of per-job, per-phase durations"""
+        phases = []
+        for report in summary['jobs']:
+            phases.extend(phase for phase in report['phases']
+                          if phase not in phases and not phase.startswith('verb:'))
+        width = max(len(report['name']) for report in summary['jobs'])
+        
+        self.log("⏱ Batch report:")
+        self.log(f"   {'job':<{width}}  {'exit':>4}  {'total':>7}" +
+                 ''.join(f"  {phase[:12]:>12}" for phase in phases))
+        for report in summary['jobs']:
+            seconds = report['seconds']
+            self.log(f"   {report['name']:<{width}}  {str(report['exit_code']):>4}  "
+                     f"{(f'{seconds:.1f}s' if seconds is not None else '-'):>7}" +
+                     ''.join(f"  {report['phases'].get(phase, '-')!s:>12}" for phase in phases))
+        self.log(f"⏱ {summary['succeeded']} succeeded, {summary['failed']} failed, "
+                 f"{summary['seconds']:.0f}s wall clock with {summary['workers']} workers")
+
+
+# ============================================================================
+# BENCHMARK - Installer Phases against Stub Wine
+# ============================================================================
+
+# Output lines and seconds of each stubbed step at --scale 1, roughly what a
+# real install prints and takes; --scale only shortens the delays
+BENCHMARK_PROFILE = {
+    'wineboot': (400, 8.0),
+    'remove_mono': (60, 2.0),
+    'vcrun2022': (900, 25.0),
+    'dotnet48': (6000, 600.0),
+    'corefonts': (300, 20.0),
+    'tahoma': (30, 2.0),
+    'win11': (40, 3.0),
+    'dxvk': (150, 6.0),
+    'renderer=vulkan': (20, 2.0),
+    'installer': (2500, 60.0),
+    'wine': (10, 1.0),
+    'download': (0, 2.0),
+}
+
+# Verbs whose stub load_VERB() lists a download, so the prefetcher has work
+BENCHMARK_DOWNLOAD_VERBS = ('vcrun2022', 'dotnet48', 'corefonts')
+
+# Metrics where a larger value is an improvement
+BENCHMARK_HIGHER_IS_BETTER = ('replay_lines_per_second',)
+
+
+class InstallerBenchmark:
+    """Time BASH_SCRIPT and the BashInstaller pipeline against stub tools
+    
+    wine, wineboot, wineserver, winetricks, curl and wget are replaced by
+    one stub script that prints BENCHMARK_PROFILE's volume of Wine-style
+    output at a paced rate and creates the files the next step looks for.
+    Every run uses a fresh prefix, cache and HOME in a scratch directory.
+    
+    The callbacks that BashInstallerThread turns into Qt signals are counted
+    here directly, so the GUI signal rate is measured without Qt. Metrics
+    are the median over all runs:
+    
+        total_seconds, phase:<name>      wall-clock latency
+        lines, pipeline_cpu_seconds      output volume and Python CPU spent
+        replay_lines_per_second          ProgressMonitor parse throughput
+        signals_per_second, peak_signals_per_100ms
+    """
+    
+    FORMAT = 1
+    
+    def __init__(self, runs=3, scale=0.01, installer_path=None, work_dir=None, log_callback=None):
+        self.runs = runs
+        self.scale = scale
+        self.installer_path = installer_path
+        self.work_dir = work_dir
+        self.log = log_callback or (lambda message, level='info': print(message))
+    
+    def stub_script(self):
+        """Bash source of the multi-call stub (dispatches on $0)"""
+        def emit(step, text):
+            lines, seconds = BENCHMARK_PROFILE[step]
+            return f'emit {lines} {seconds * self.scale / 10:.4f} "{text}"'
+        
+        verbs = '\n'.join(
+            f'            {verb}) {emit(verb, f"0024:fixme:msi:installer {verb} step")} ;;'
+            for verb in BENCHMARK_PROFILE
+            if verb not in ('wineboot', 'installer', 'wine', 'download')
         )
-        
-        if progress_callback:
-            progress_callback(90, "Verifying installation")
-        
-        if success:
-            self.log("✅ Wine installed successfully!")
-            if progress_callback:
-                progress_callback(100, "Wine installation complete")
-            return True, "Wine installed"
-        else:
-            return False, output
+        loaders = '\n'.join(
+            f'load_{verb}()\n{{\n    w_download https://bench.invalid/{verb}/{verb}_setup.exe\n}}'
+            for verb in BENCHMARK_DOWNLOAD_VERBS
+        )
+        return f'''#!/bin/bash
+# Benchmark stand-in for wine, wineboot, wineserver, winetricks, curl and wget
+
+# emit LINES DELAY TEXT - print LINES lines in ten bursts, DELAY seconds apart
+emit() {{
+    local i
+    for ((i = 0; i < 10; i++)); do
+        yes "$3" | head -n $(($1 / 10))
+        sleep "$2"
+    done
+}}
+
+case "$(basename "$0")" in
+    wine)
+        if [ "$1" = "--version" ]; then
+            echo "wine-10.0"
+        elif [[ "$1" == *.exe ]]; then
+            {emit("installer", "0130:fixme:ole:CoInitializeSecurity stub")}
+            mkdir -p "$WINEPREFIX/drive_c/Program Files/Affinity/Affinity"
+            : > "$WINEPREFIX/drive_c/Program Files/Affinity/Affinity/Affinity.exe"
+        else
+            {emit("wine", "0024:fixme:reg:stub")}
+        fi
+        ;;
+    wineboot)
+        {emit("wineboot", "0024:fixme:ntdll:NtQuerySystemInformation stub")}
+        mkdir -p "$WINEPREFIX/drive_c/windows/system32"
+        for hive in system user userdef; do
+            echo "WINE REGISTRY Version 2" > "$WINEPREFIX/$hive.reg"
+        done
+        ;;
+    wineserver)
+        # A persistent server is a socket under /tmp/.wine-UID, like Wine's
+        socket=$(stat -L -c '%d %i' "$WINEPREFIX" 2>/dev/null | {{
+            read -r dev ino
+            printf '/tmp/.wine-%d/server-%x-%x/socket' "$UID" "$dev" "$ino"
+        }})
+        case "$1" in
+            -p*)
+                mkdir -p "${{socket%/*}}"
+                rm -f "$socket"
+                {shlex.quote(sys.executable)} -c 'import socket, sys; socket.socket(socket.AF_UNIX).bind(sys.argv[1])' "$socket"
+                ;;
+            -k*)
+                rm -f "$socket"
+                ;;
+        esac
+        ;;
+    winetricks)
+        verb="${{@: -1}}"
+        echo "Executing w_do_call $verb"
+        case "$verb" in
+{verbs}
+        esac
+        ;;
+    curl|wget)
+        while [ $# -gt 0 ]; do
+            case "$1" in
+                --output|-O|-o) out="$2"; shift ;;
+            esac
+            shift
+        done
+        sleep {BENCHMARK_PROFILE['download'][1] * self.scale:.4f}
+        head -c 65536 /dev/urandom > "$out"
+        ;;
+esac
+exit 0
+
+# Parsed (not run) by the installer's prefetcher
+{loaders}
+'''
     
-    def install_wine_arch(self, progress_callback=None):
-        """Install Wine on Arch Linux"""
-        self.log("📥 Installing Wine on Arch Linux...")
-        
-        if progress_callback:
-            progress_callback(30, "Installing Wine and winetricks")
-        
-        success, output = self._run_sudo_command(
-            "pacman -S --needed wine winetricks",
-            timeout=600
+    def make_stubs(self, directory):
+        """Write the stub and link every tool name to it"""
+        directory.mkdir(parents=True, exist_ok=True)
+        stub = directory / 'bench-stub'
+        stub.write_text(self.stub_script())
+        stub.chmod(0o755)
+        for name in ('wine', 'wineboot', 'wineserver', 'winetricks', 'curl', 'wget'):
+            (directory / name).symlink_to(stub.name)
+        return directory
+    
+    def run_once(self, root, stub_dir):
+        """One install into root; returns its metrics"""
+        home = root / 'home'
+        home.mkdir(parents=True)
+        installer_path = self.installer_path
+        if not installer_path:
+            installer_path = root / 'Affinity.exe'
+            installer_path.write_bytes(b'MZ')
+        
+        signal_times = []
+        lines = []
+        phase_started = {}
+        phases = {}
+        
+        def log(message, level='info'):
+            signal_times.append(time.monotonic())
+            lines.append(message)
+        
+        def progress(percent, message):
+            signal_times.append(time.monotonic())
+        
+        def event(event):
+            kind = event.get('type')
+            if kind == 'phase_start':
+                phase_started[event.get('phase')] = event.get('ts')
+            elif kind == 'phase_end' and event.get('phase') in phase_started:
+                start = phase_started.pop(event['phase'])
+                phases[f"phase:{event['phase']}"] = event.get('ts', start) - start
+        
+        env = dict(os.environ, PATH=f"{stub_dir}:{os.environ.get('PATH', '')}", HOME=str(home),
+                   WINEPREFIX=str(root / 'prefix'))
+        installer = BashInstaller(
+            BASH_SCRIPT,
+            root / 'prefix',
+            installer_path,
+            enable_tahoma=True,
+            cache_dir=root / 'cache',
+            resume=False,
+            log_file=root / 'install.log',
+            env=env,
+            use_probe=False,  # the host's probe describes its real Wine, not the stubs
+            log_callback=log,
+            progress_callback=progress,
+            event_callback=event
         )
         
-        if progress_callback:
-            progress_callback(90, "Verifying installation")
-        
-        if success:
-            self.log("✅ Wine installed successfully!")
-            if progress_callback:
-                progress_callback(100, "Wine installation complete")
-            return True, "Wine installed"
-        else:
-            return False, output
+        cpu_started = time.process_time()
+        started = time.monotonic()
+        exit_code = installer.run()
+        total = time.monotonic() - started
+        cpu = time.process_time() - cpu_started
+        
+        # Signals in the busiest 100 ms window
+        peak = 0
+        first = 0
+        for last, stamp in enumerate(signal_times):
+            while stamp - signal_times[first] > 0.1:
+                first += 1
+            peak = max(peak, last - first + 1)
+        
+        metrics = {
+            'exit_code': exit_code,
+            'total_seconds': total,
+            'lines': len(lines),
+            'pipeline_cpu_seconds': cpu,
+            'replay_lines_per_second': self.replay(lines),
+            'signals_per_second': len(signal_times) / total if total else 0.0,
+            'peak_signals_per_100ms': peak,
+        }
+        metrics.update(phases)
+        return metrics
     
-    def install(self, progress_callback=None):
-        """Install Wine 10+ based on detected distribution"""
-        if not self.distro:
-            return False, "Could not detect Linux distribution"
-        
-        self.log(f"🐧 Detected distribution: {self.distro}")
+    def replay(self, lines):
+        """Lines per second ProgressMonitor handles when fed back to back"""
+        if not lines:
+            return 0.0
+        monitor = ProgressMonitor(log_callback=lambda message: None)
+        monitor.started_at = monitor.last_activity = time.monotonic()
+        rounds = max(1, 200000 // len(lines))
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for line in lines:
+                monitor.feed(line)
+        return rounds * len(lines) / (time.perf_counter() - started)
+    
+    def run(self):
+        """Run the benchmark; returns the result dict"""
+        import statistics
         
-        if progress_callback:
-            progress_callback(0, "Starting Wine installation")
+        root = Path(tempfile.mkdtemp(prefix='affinity-bench-', dir=self.work_dir))
+        stub_dir = self.make_stubs(root / 'bin')
+        runs = []
+        try:
+            for index in range(self.runs):
+                metrics = self.run_once(root / f"run{index}", stub_dir)
+                self.log(f"Run {index + 1}/{self.runs}: {metrics['total_seconds']:.1f}s, "
+                         f"exit code {metrics['exit_code']}")
+                runs.append(metrics)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
         
-        if self.distro in ["ubuntu", "debian", "linuxmint", "pop", "zorin"]:
-            return self.install_wine_debian(progress_callback)
-        elif self.distro in ["fedora", "nobara", "rhel", "centos"]:
-            return self.install_wine_fedora(progress_callback)
-        elif self.distro in ["arch", "manjaro", "endeavouros"]:
-            return self.install_wine_arch(progress_callback)
-        else:
-            return False, f"Unsupported distribution: {self.distro}"
+        names = []
+        for metrics in runs:
+            names.extend(name for name in metrics if name not in names and name != 'exit_code')
+        return {
+            'format': self.FORMAT,
+            'scale': self.scale,
+            'runs': self.runs,
+            'failed_runs': sum(1 for metrics in runs if metrics['exit_code'] != 0),
+            'metrics': {name: statistics.median(metrics[name] for metrics in runs if name in metrics)
+                        for name in names},
+        }
+    
+    @staticmethod
+    def compare(result, baseline, threshold):
+        """Rows of (metric, baseline, current, change %, regressed)"""
+        rows = []
+        for name, current in result['metrics'].items():
+            before = baseline['metrics'].get(name)
+            if not before:
+                continue
+            change = (current - before) / before * 100
+            worse = -change if name in BENCHMARK_HIGHER_IS_BETTER else change
+            rows.append((name, before, current, change, worse > threshold))
+        return rows
+
+
+def benchmark_main(argv):
+    """Entry point for --benchmark; returns a process exit code"""
+    parser = argparse.ArgumentParser(
+        prog="affinity_installer_unified.py --benchmark",
+        description="Time the installer's phases against stub Wine/winetricks binaries."
+    )
+    parser.add_argument('--benchmark', action='store_true', required=True)
+    parser.add_argument('--runs', type=int, default=3, help="installs to run (default: 3)")
+    parser.add_argument('--scale', type=float, default=0.01,
+                        help="multiplier for the stubs' delays; 1 is real-install pacing (default: 0.01)")
+    parser.add_argument('--installer', help="real .exe/.msix to install instead of a stub installer")
+    parser.add_argument('--work-dir', help="where to create the scratch prefixes (default: system temp)")
+    parser.add_argument('--baseline', metavar='FILE', help="compare against a saved result")
+    parser.add_argument('--save-baseline', metavar='FILE', help="save this result as a baseline")
+    parser.add_argument('--threshold', type=float, default=20,
+                        help="percent change counted as a regression (default: 20)")
+    parser.add_argument('--json', action='store_true', help="print the result as JSON")
+    args = parser.parse_args(argv)
+    
+    baseline = None
+    if args.baseline:
+        try:
+            baseline = json.loads(Path(args.baseline).read_text())
+        except (OSError, ValueError) as e:
+            print(f"error: {e}", file=sys.stderr)
+            return EXIT_USAGE
+        if baseline.get('format') != InstallerBenchmark.FORMAT or baseline.get('scale') != args.scale:
+            print(f"error: {args.baseline} was recorded with another format or --scale "
+                  f"({baseline.get('scale')})", file=sys.stderr)
+            return EXIT_USAGE
+    
+    human = sys.stderr if args.json else sys.stdout
+    
+    def log(message, level='info'):
+        print(message, file=human, flush=True)
+    
+    result = InstallerBenchmark(args.runs, args.scale, args.installer, args.work_dir, log).run()
+    
+    regressions = 0
+    if baseline:
+        rows = InstallerBenchmark.compare(result, baseline, args.threshold)
+        result['comparison'] = [{'metric': name, 'baseline': before, 'current': current,
+                                 'change_percent': round(change, 1), 'regressed': regressed}
+                                for name, before, current, change, regressed in rows]
+        regressions = sum(1 for row in rows if row[4])
+        width = max(len(row[0]) for row in rows) if rows else 0
+        log(f"   {'metric':<{width}}  {'baseline':>12}  {'current':>12}  {'change':>8}")
+        for name, before, current, change, regressed in rows:
+            log(f"   {name:<{width}}  {before:>12.3f}  {current:>12.3f}  {change:>+7.1f}%"
+                f"{'  ❌' if regressed else ''}")
+        log(f"⏱ {regressions} regression(s) over {args.threshold:g}%")
+    else:
+        width = max(len(name) for name in result['metrics'])
+        for name, value in result['metrics'].items():
+            log(f"   {name:<{width}}  {value:>12.3f}")
+    
+    if args.json:
+        print(json.dumps(result, indent=2))
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(result, indent=2) + '\n')
+        log(f"Baseline saved to {args.save_baseline}")
+    
+    if result['failed_runs'] or regressions:
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+# Non-GUI entry points, checked in this order. They are dispatched here,
+# before the GUI section below imports PyQt6, so headless installs work
+# on machines without Qt
+ENTRY_POINTS = {
+    '--headless': headless_main,
+    '--extract-msix': extract_msix_main,
+    '--place': place_main,
+    '--verify-prefix': verify_prefix_main,
+    '--shader-cache': shader_cache_main,
+    '--performance-prefs': performance_prefs_main,
+    '--deploy-settings': deploy_settings_main,
+    '--benchmark': benchmark_main,
+}
+
+if __name__ == "__main__":
+    for flag, entry_point in ENTRY_POINTS.items():
+        if flag in sys.argv[1:]:
+            sys.exit(entry_point(sys.argv[1:]))
+
+
+# ============================================================================
+# GUI FRONTEND
+# ============================================================================
+
+class StartupProfile:
+    """Wall-clock breakdown of GUI startup, printed with --profile-startup
+    
+    Times are measured from process start (read from /proc), so the first
+    phase includes interpreter startup and the stdlib imports above.
+    """
+    
+    def __init__(self):
+        self.enabled = "--profile-startup" in sys.argv[1:]
+        self.origin = time.perf_counter() - self.process_age()
+        self.last = self.origin
+        self.marks = []  # (phase, seconds)
+    
+    @staticmethod
+    def process_age():
+        """Seconds since this process was started"""
+        try:
+            with open('/proc/self/stat') as f:
+                start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+            with open('/proc/uptime') as f:
+                uptime = float(f.read().split()[0])
+            return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+        except (OSError, ValueError, IndexError):
+            return 0.0
+    
+    def mark(self, phase):
+        """Close the current phase"""
+        now = time.perf_counter()
+        self.marks.append((phase, now - self.last))
+        self.last = now
+    
+    def report(self):
+        """Print the breakdown to stderr"""
+        if not self.enabled:
+            return
+        print("Startup profile:", file=sys.stderr)
+        for phase, seconds in self.marks:
+            print(f"  {seconds * 1000:8.1f} ms  {phase}", file=sys.stderr)
+        print(f"  {(self.last - self.origin) * 1000:8.1f} ms  time to first paint",
+              file=sys.stderr)
+
+
+STARTUP = StartupProfile()
+STARTUP.mark("interpreter, stdlib imports, module body")
+
+# Auto-install PyQt6 if missing. Only the classes used below are imported;
+# the wildcard imports pulled in every QtWidgets/QtGui symbol at startup.
+try:
+    import PyQt6.QtWidgets  # noqa: F401
+except ImportError:
+    print("Installing PyQt6...")
+    subprocess.check_call([sys.executable, "-m", "pip", "install", "--user", "PyQt6"])
+
+from PyQt6.QtCore import QEvent, QObject, Qt, QThread, QTimer, QUrl, pyqtSignal
+from PyQt6.QtGui import QBrush, QColor, QDesktopServices, QTextCharFormat, QTextCursor
+from PyQt6.QtWidgets import (
+    QApplication, QCheckBox, QFileDialog, QGroupBox, QHBoxLayout, QInputDialog,
+    QLabel, QLineEdit, QMainWindow, QMessageBox, QPlainTextEdit, QProgressBar,
+    QPushButton, QScrollArea, QVBoxLayout, QWidget,
+)
+
+STARTUP.mark("PyQt6 imports")
+
+
+class FirstPaintProbe(QObject):
+    """Application event filter that closes the startup profile on first paint"""
+    
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint:
+            QApplication.instance().removeEventFilter(self)
+            STARTUP.mark("show, first event loop turn")
+            STARTUP.report()
+        return False
+
+
+class WineProbeThread(QThread):
+    """Runs the Wine version check off the GUI thread"""
+    result = pyqtSignal(str, str)  # status ('ok', 'missing', 'old'), version
+    
+    def __init__(self, probe):
+        super().__init__()
+        self.probe = probe
+    
+    def run(self):
+        status, version = self.probe()
+        self.result.emit(status, version or "")
+
+
+class SudoCheckThread(QThread):
+    """Validates the sudo password off the GUI thread"""
+    result = pyqtSignal(bool, str)  # valid, error ('' unless sudo could not run)
+    
+    def __init__(self, password):
+        super().__init__()
+        self.password = password
+    
+    def run(self):
+        try:
+            result = CommandRunner().run(
+                ['sudo', '-S', '-p', '', 'echo', 'Password validated'],
+                input=f"{self.password}\n",
+                timeout=5
+            )
+            self.result.emit(result.ok, "")
+        except Exception as e:
+            self.result.emit(False, str(e) or type(e).__name__)
 
 
 class WineInstallerThread(QThread):
@@ -997,128 +5869,37 @@ class WineInstallerThread(QThread):
             self.finished_signal.emit(False)
 
 
-# ============================================================================
-# GUI FRONTEND
-# ============================================================================
-
 class BashInstallerThread(QThread):
     """Background thread for running embedded bash installer"""
     log_output = pyqtSignal(str, str)  # message, level
     progress_update = pyqtSignal(int, str)  # percentage, message
     finished_signal = pyqtSignal(int)  # exit code
     
-    def __init__(self, bash_script, prefix_path, installer_path=None, enable_dxvk=True, enable_vulkan=True, enable_tahoma=True):
+    def __init__(self, bash_script, prefix_path, installer_path=None, enable_dxvk=True, enable_vulkan=True, enable_tahoma=True,
+                 **options):
         super().__init__()
-        self.bash_script = bash_script
-        self.prefix_path = prefix_path
-        self.installer_path = installer_path
-        self.enable_dxvk = enable_dxvk
-        self.enable_vulkan = enable_vulkan
-        self.enable_tahoma = enable_tahoma
-        self.process = None
+        self.installer = BashInstaller(
+            bash_script, prefix_path, installer_path, enable_dxvk, enable_vulkan, enable_tahoma,
+            log_callback=self.log_output.emit,
+            progress_callback=self.progress_update.emit,
+            **options
+        )
     
     def run(self):
         """Run bash installer in background"""
-        # Create temporary bash script file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.sh', delete=False) as f:
-            f.write(self.bash_script)
-            script_path = f.name
-        
-        try:
-            # Make script executable
-            os.chmod(script_path, 0o755)
-            
-            cmd = [
-                'bash',
-                script_path,
-                '--gui-mode',
-                '--prefix', str(self.prefix_path)
-            ]
-            
-            if self.installer_path:
-                cmd.extend(['--installer', str(self.installer_path)])
-            
-            # Add optional component flags
-            if self.enable_dxvk:
-                cmd.append('--enable-dxvk')
-            if self.enable_vulkan:
-                cmd.append('--enable-vulkan')
-            if self.enable_tahoma:
-                cmd.append('--enable-tahoma')
-            
-            self.process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
-            )
-            
-            for line in iter(self.process.stdout.readline, ''):
-                if line:
-                    line = line.rstrip()
-                    
-                    # Parse structured output
-                    if line.startswith('PROGRESS:'):
-                        parts = line.split(':', 2)
-                        if len(parts) == 3:
-                            try:
-                                percent = int(parts[1])
-                                message = parts[2]
-                                self.progress_update.emit(percent, message)
-                            except ValueError:
-                                pass
-                    
-                    elif line.startswith('SUCCESS:'):
-                        message = line.split(':', 1)[1] if ':' in line else line
-                        self.log_output.emit(message, 'success')
-                    
-                    elif line.startswith('ERROR:'):
-                        message = line.split(':', 1)[1] if ':' in line else line
-                        self.log_output.emit(message, 'error')
-                    
-                    elif line.startswith('INFO:'):
-                        message = line.split(':', 1)[1] if ':' in line else line
-                        self.log_output.emit(message, 'info')
-                    
-                    else:
-                        # Regular output
-                        if '✓' in line or 'success' in line.lower():
-                            level = 'success'
-                        elif '✗' in line or 'error' in line.lower() or 'failed' in line.lower():
-                            level = 'error'
-                        elif '⚠' in line or 'warning' in line.lower():
-                            level = 'warning'
-                        else:
-                            level = 'info'
-                        
-                        self.log_output.emit(line, level)
-            
-            self.process.wait()
-            self.finished_signal.emit(self.process.returncode)
-        
-        except Exception as e:
-            self.log_output.emit(f"Error: {e}", "error")
-            self.finished_signal.emit(1)
-        
-        finally:
-            # Clean up temporary script
-            try:
-                os.unlink(script_path)
-            except:
-                pass
+        self.finished_signal.emit(self.installer.run())
     
     def terminate(self):
         """Terminate the bash process"""
-        if self.process:
-            self.process.terminate()
-            self.process.wait()
-
-
+        self.installer.terminate()
 
 
 class AffinityInstallerGUI(QMainWindow):
+    LOG_FLUSH_MS = 33  # ~30 log repaints per second at most
+    LOG_MAX_BLOCKS = 5000  # older lines stay in the on-disk transcript
+    LOG_PAGE_LINES = 1000  # transcript lines paged back in per "Load Earlier Lines"
+    LOG_TRANSCRIPTS_KEPT = 10
+    
     def __init__(self):
         super().__init__()
         
@@ -1151,12 +5932,31 @@ class AffinityInstallerGUI(QMainWindow):
         self.enable_vulkan = True
         self.enable_tahoma = False
         
-        # Setup UI
+        # Log sink: lines are buffered and rendered in batches at most
+        # LOG_FLUSH_MS apart. The complete transcript is kept on disk once an
+        # installer starts; until then the last lines wait in log_preamble
+        from array import array
+        from collections import deque
+        self.log_buffer = []
+        self.log_preamble = deque(maxlen=self.LOG_MAX_BLOCKS)
+        self.log_transcript = None
+        self.log_transcript_wanted = False
+        self.log_transcript_path = (default_cache_dir() / "logs" /
+                                    f"installer_{time.strftime('%Y%m%d_%H%M%S')}.log")
+        self.log_line_offsets = array('Q')  # byte offset of every transcript line
+        self.log_view_empty = True
+        self.log_flush_timer = QTimer(self)
+        self.log_flush_timer.setSingleShot(True)
+        self.log_flush_timer.setInterval(self.LOG_FLUSH_MS)
+        self.log_flush_timer.timeout.connect(self.flush_log)
+        self.log_text = None
+        
+        self.wine_probe_thread = None
+        self.sudo_check_thread = None
+        
+        # Setup UI: the header now, the panels once the event loop runs
         self.create_ui()
         self.center_window()
-        
-        # Prompt for password first, then check Wine
-        QTimer.singleShot(500, self.prompt_for_password)
     
     def center_window(self):
         """Center window on screen"""
@@ -1206,6 +6006,31 @@ class AffinityInstallerGUI(QMainWindow):
         subtitle.setOpenExternalLinks(True)
         subtitle.setAlignment(Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(subtitle)
+        self.main_layout = layout
+        
+        # Each panel is built in its own event loop turn, so the window
+        # paints first and stays responsive; then the password prompt opens
+        self.pending_sections = [
+            self.create_config_section,
+            self.create_optional_section,
+            self.create_resources_section,
+            self.create_progress_section,
+            self.create_log_section,
+            self.create_buttons,
+        ]
+        QTimer.singleShot(0, self.build_next_section)
+    
+    def build_next_section(self):
+        """Build one deferred panel; prompt for the password after the last"""
+        self.pending_sections.pop(0)()
+        if self.pending_sections:
+            QTimer.singleShot(0, self.build_next_section)
+        else:
+            QTimer.singleShot(0, self.prompt_for_password)
+    
+    def create_config_section(self):
+        """Wine prefix and installer fields"""
+        layout = self.main_layout
         
         # Configuration section
         config_group = QGroupBox("📋 Configuration")
@@ -1296,6 +6121,10 @@ class AffinityInstallerGUI(QMainWindow):
         config_layout.addLayout(installer_layout)
         
         layout.addWidget(config_group)
+    
+    def create_optional_section(self):
+        """DXVK, Vulkan and Tahoma checkboxes"""
+        layout = self.main_layout
         
         # Optional Components section
         optional_group = QGroupBox("⚙️ Optional Components")
@@ -1354,6 +6183,10 @@ class AffinityInstallerGUI(QMainWindow):
         optional_layout.addLayout(checkboxes_layout)
         
         layout.addWidget(optional_group)
+    
+    def create_resources_section(self):
+        """Links to the plugin loader and credits"""
+        layout = self.main_layout
         
         # Resources section
         resources_group = QGroupBox("📚 Resources")
@@ -1398,6 +6231,10 @@ class AffinityInstallerGUI(QMainWindow):
         resources_layout.addWidget(credits_label)
         
         layout.addWidget(resources_group)
+    
+    def create_progress_section(self):
+        """Progress bar and current step"""
+        layout = self.main_layout
         
         # Progress section
         progress_group = QGroupBox("📊 Installation Progress")
@@ -1469,6 +6306,10 @@ class AffinityInstallerGUI(QMainWindow):
         progress_layout.addWidget(self.step_label)
         
         layout.addWidget(progress_group)
+    
+    def create_log_section(self):
+        """Log view; messages logged before it existed are rendered now"""
+        layout = self.main_layout
         
         # Log output
         log_group = QGroupBox("📝 Installation Log")
@@ -1493,10 +6334,11 @@ class AffinityInstallerGUI(QMainWindow):
         log_layout.setContentsMargins(2, 2, 2, 2)
         log_layout.setSpacing(0)
         
-        self.log_text = QTextEdit()
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(self.LOG_MAX_BLOCKS)
         self.log_text.setStyleSheet("""
-            QTextEdit {
+            QPlainTextEdit {
                 background: #1a1a1a;
                 color: #d4d4d4;
                 font-family: 'Consolas', 'Monaco', 'Courier New', monospace;
@@ -1508,7 +6350,52 @@ class AffinityInstallerGUI(QMainWindow):
         """)
         log_layout.addWidget(self.log_text)
         
+        self.log_formats = {}
+        for level, color in {
+            'success': '#4CAF50',
+            'error': '#f44336',
+            'warning': '#FF9800',
+            'info': '#d4d4d4'
+        }.items():
+            text_format = QTextCharFormat()
+            text_format.setForeground(QBrush(QColor(color)))
+            self.log_formats[level] = text_format
+        
+        full_log_layout = QHBoxLayout()
+        full_log_layout.addStretch()
+        link_style = """
+            QPushButton {
+                padding: 2px 8px;
+                background: transparent;
+                color: #FFC107;
+                border: none;
+                font-size: 8pt;
+            }
+            QPushButton:hover {
+                text-decoration: underline;
+            }
+            QPushButton:disabled {
+                color: #666666;
+            }
+        """
+        self.earlier_log_button = QPushButton("⬆ Load Earlier Lines")
+        self.earlier_log_button.setStyleSheet(link_style)
+        self.earlier_log_button.setEnabled(False)
+        self.earlier_log_button.clicked.connect(self.load_earlier_log)
+        full_log_layout.addWidget(self.earlier_log_button)
+        full_log_button = QPushButton("📄 Open Full Log")
+        full_log_button.setStyleSheet(link_style)
+        full_log_button.clicked.connect(self.open_full_log)
+        full_log_layout.addWidget(full_log_button)
+        log_layout.addLayout(full_log_layout)
+        
         layout.addWidget(log_group)
+        if self.log_buffer:
+            self.log_flush_timer.start()
+    
+    def create_buttons(self):
+        """Start, stop and uninstall buttons"""
+        layout = self.main_layout
         
         # Buttons
         button_layout = QHBoxLayout()
@@ -1613,43 +6500,21 @@ class AffinityInstallerGUI(QMainWindow):
             self.log(f"Selected installer: {file_path}", "info")
     
     def check_wine_version(self):
-        """Check if Wine 10+ is installed - returns 'ok', 'missing', or 'old'"""
-        wine_cmd = shutil.which("wine")
-        if not wine_cmd:
-            return "missing"
-        
-        try:
-            result = subprocess.run(
-                [wine_cmd, "--version"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            
-            if result.returncode != 0:
-                return "missing"
-            
-            version_str = result.stdout.strip()
-            match = re.search(r'(\d+)\.(\d+)', version_str)
-            
-            if not match:
-                return "missing"
-            
-            major = int(match.group(1))
-            minor = int(match.group(2))
-            
-            if major < 10:
-                return "old"
-            
-            return "ok"
+        """Check if Wine 10+ is installed - returns (status, version)
         
-        except Exception as e:
-            return "missing"
+        status is 'ok', 'missing', or 'old'. The first call may run the
+        system probe, so the GUI calls it through probe_wine().
+        """
+        return system_probe().wine_status()
+    
+    def probe_wine(self, callback):
+        """Run check_wine_version() in a worker thread, then call callback(status, version)"""
+        self.wine_probe_thread = WineProbeThread(self.check_wine_version)
+        self.wine_probe_thread.result.connect(callback)
+        self.wine_probe_thread.start()
     
     def prompt_for_password(self):
         """Prompt for sudo password at startup"""
-        from PyQt6.QtWidgets import QInputDialog, QLineEdit
-        
         # Show password dialog
         password, ok = QInputDialog.getText(
             self,
@@ -1661,45 +6526,12 @@ class AffinityInstallerGUI(QMainWindow):
         )
         
         if ok and password:
-            # Validate password by running a simple sudo command
+            # Validate password by running a simple sudo command in a
+            # worker thread; sudo may take seconds to answer
             self.log("🔐 Validating password...", "info")
-            
-            try:
-                # Test sudo password
-                result = subprocess.run(
-                    ['sudo', '-S', 'echo', 'Password validated'],
-                    input=f"{password}\n",
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                
-                if result.returncode == 0:
-                    self.sudo_password = password
-                    self.log("✅ Password validated successfully", "success")
-                    self.log("", "info")
-                    
-                    # Now check Wine
-                    self.check_wine_on_startup()
-                else:
-                    self.log("❌ Invalid password", "error")
-                    QMessageBox.critical(
-                        self,
-                        "Invalid Password",
-                        "The password you entered is incorrect.\n\n"
-                        "The application will close. Please restart and enter the correct password."
-                    )
-                    QTimer.singleShot(100, self.close)
-            
-            except Exception as e:
-                self.log(f"❌ Password validation failed: {e}", "error")
-                QMessageBox.critical(
-                    self,
-                    "Password Validation Failed",
-                    f"Failed to validate password:\n\n{e}\n\n"
-                    "The application will close."
-                )
-                QTimer.singleShot(100, self.close)
+            self.sudo_check_thread = SudoCheckThread(password)
+            self.sudo_check_thread.result.connect(self.password_checked)
+            self.sudo_check_thread.start()
         else:
             # User cancelled password prompt
             QMessageBox.warning(
@@ -1710,10 +6542,41 @@ class AffinityInstallerGUI(QMainWindow):
             )
             QTimer.singleShot(100, self.close)
     
+    def password_checked(self, valid, error):
+        """Handle the sudo password check result"""
+        if valid:
+            self.sudo_password = self.sudo_check_thread.password
+            self.log("✅ Password validated successfully", "success")
+            self.log("", "info")
+            
+            # Now check Wine
+            self.check_wine_on_startup()
+        elif error:
+            self.log(f"❌ Password validation failed: {error}", "error")
+            QMessageBox.critical(
+                self,
+                "Password Validation Failed",
+                f"Failed to validate password:\n\n{error}\n\n"
+                "The application will close."
+            )
+            QTimer.singleShot(100, self.close)
+        else:
+            self.log("❌ Invalid password", "error")
+            QMessageBox.critical(
+                self,
+                "Invalid Password",
+                "The password you entered is incorrect.\n\n"
+                "The application will close. Please restart and enter the correct password."
+            )
+            QTimer.singleShot(100, self.close)
+    
     def check_wine_on_startup(self):
         """Check Wine on startup and prompt to install if missing/old"""
-        status = self.check_wine_version()
-        
+        self.log("🔍 Checking Wine installation...", "info")
+        self.probe_wine(self.wine_checked)
+    
+    def wine_checked(self, status, version):
+        """Handle the startup Wine check result"""
         if status == "missing":
             self.log("⚠️  Wine is not installed on your system", "warning")
             
@@ -1751,23 +6614,7 @@ class AffinityInstallerGUI(QMainWindow):
                 self.log("⚠️  Wine upgrade skipped - you'll need to upgrade it manually", "warning")
         
         else:
-            # Get version for display
-            wine_cmd = shutil.which("wine")
-            try:
-                result = subprocess.run(
-                    [wine_cmd, "--version"],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                version_str = result.stdout.strip()
-                match = re.search(r'(\d+)\.(\d+)', version_str)
-                if match:
-                    major = int(match.group(1))
-                    minor = int(match.group(2))
-                    self.log(f"✅ Wine {major}.{minor} detected (meets requirements)", "success")
-            except:
-                self.log("✅ Wine 10+ detected", "success")
+            self.log(f"✅ Wine {version} detected (meets requirements)", "success")
     
     def install_wine(self):
         """Install Wine 10+ using pure Python installer"""
@@ -1795,6 +6642,7 @@ class AffinityInstallerGUI(QMainWindow):
             return
         
         # Start Wine installation thread
+        self.start_transcript()
         self.wine_thread = WineInstallerThread(self.sudo_password)
         self.wine_thread.log_output.connect(self.log)
         self.wine_thread.progress_update.connect(self.update_progress)
@@ -1807,51 +6655,7 @@ class AffinityInstallerGUI(QMainWindow):
         
         if success:
             # Check if Wine is now installed
-            status = self.check_wine_version()
-            if status == "ok":
-                wine_cmd = shutil.which("wine")
-                try:
-                    ver_result = subprocess.run(
-                        [wine_cmd, "--version"],
-                        capture_output=True,
-                        text=True,
-                        timeout=5
-                    )
-                    version_str = ver_result.stdout.strip()
-                    match = re.search(r'(\d+)\.(\d+)', version_str)
-                    if match:
-                        major = int(match.group(1))
-                        minor = int(match.group(2))
-                        self.log(f"✅ Wine {major}.{minor} successfully installed!", "success")
-                except:
-                    self.log("✅ Wine 10+ successfully installed!", "success")
-                
-                QMessageBox.information(
-                    self,
-                    "Wine Installed",
-                    "Wine 10+ has been successfully installed!\n\n"
-                    "You can now start the Affinity installation."
-                )
-            else:
-                # Wine installation reported success but Wine 10+ not detected
-                self.log("⚠️  Wine installed but version check failed", "warning")
-                self.log("", "info")
-                self.log("💡 This might mean:", "info")
-                self.log("   • Wine was already installed (older version)", "info")
-                self.log("   • Installation didn't complete properly", "info")
-                self.log("   • Password prompt was cancelled", "info")
-                self.log("", "info")
-                self.log("📝 To install Wine 10+ manually, run:", "info")
-                self.log("   sudo apt update && sudo apt install -y wine", "info")
-                
-                QMessageBox.warning(
-                    self,
-                    "Wine 10+ Not Detected",
-                    "Wine installation completed, but Wine 10+ was not detected.\n\n"
-                    "Please install Wine 10+ manually:\n\n"
-                    "sudo apt update && sudo apt install -y wine\n\n"
-                    "Then restart this application."
-                )
+            self.probe_wine(self.wine_install_verified)
         else:
             # Installation failed
             self.log("", "info")
@@ -1868,6 +6672,38 @@ class AffinityInstallerGUI(QMainWindow):
                 "Then restart this application."
             )
     
+    def wine_install_verified(self, status, version):
+        """Handle the Wine check that follows a Wine installation"""
+        if status == "ok":
+            self.log(f"✅ Wine {version} successfully installed!", "success")
+            
+            QMessageBox.information(
+                self,
+                "Wine Installed",
+                "Wine 10+ has been successfully installed!\n\n"
+                "You can now start the Affinity installation."
+            )
+        else:
+            # Wine installation reported success but Wine 10+ not detected
+            self.log("⚠️  Wine installed but version check failed", "warning")
+            self.log("", "info")
+            self.log("💡 This might mean:", "info")
+            self.log("   • Wine was already installed (older version)", "info")
+            self.log("   • Installation didn't complete properly", "info")
+            self.log("   • Password prompt was cancelled", "info")
+            self.log("", "info")
+            self.log("📝 To install Wine 10+ manually, run:", "info")
+            self.log("   sudo apt update && sudo apt install -y wine", "info")
+            
+            QMessageBox.warning(
+                self,
+                "Wine 10+ Not Detected",
+                "Wine installation completed, but Wine 10+ was not detected.\n\n"
+                "Please install Wine 10+ manually:\n\n"
+                "sudo apt update && sudo apt install -y wine\n\n"
+                "Then restart this application."
+            )
+    
     def browse_prefix(self):
         """Browse for Wine prefix directory"""
         path = QFileDialog.getExistingDirectory(
@@ -1890,21 +6726,130 @@ class AffinityInstallerGUI(QMainWindow):
             self.installer_edit.setText(path)
     
     def log(self, message, level="info"):
-        """Add log message with color coding"""
-        colors = {
-            'success': '#4CAF50',
-            'error': '#f44336',
-            'warning': '#FF9800',
-            'info': '#d4d4d4'
-        }
+        """Queue a log message; it is rendered with the next batch"""
+        self.log_buffer.append((message, level))
+        if not self.log_flush_timer.isActive():
+            self.log_flush_timer.start()
+    
+    def flush_log(self):
+        """Render all queued log messages in one edit block"""
+        if not self.log_buffer or self.log_text is None:
+            return
         
-        color = colors.get(level, colors['info'])
-        formatted = f'<span style="color: {color};">{message}</span>'
-        self.log_text.append(formatted)
+        batch, self.log_buffer = self.log_buffer, []
         
-        self.log_text.verticalScrollBar().setValue(
-            self.log_text.verticalScrollBar().maximum()
-        )
+        # Only follow the tail if the user has not scrolled up
+        scrollbar = self.log_text.verticalScrollBar()
+        follow = scrollbar.value() >= scrollbar.maximum() - 2
+        
+        cursor = QTextCursor(self.log_text.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.beginEditBlock()
+        for message, level in batch:
+            if not self.log_view_empty:
+                cursor.insertBlock()
+            cursor.insertText(message, self.log_formats.get(level, self.log_formats['info']))
+            self.log_view_empty = False
+        cursor.endEditBlock()
+        
+        if follow:
+            scrollbar.setValue(scrollbar.maximum())
+        
+        self.write_transcript(line for message, _ in batch for line in message.split('\n'))
+        self.earlier_log_button.setEnabled(self.earlier_log_lines() > 0)
+    
+    def start_transcript(self):
+        """Keep an on-disk transcript from the next rendered line on
+        
+        Called when an installer starts, so opening the GUI without
+        installing anything leaves no log file behind.
+        """
+        self.log_transcript_wanted = True
+    
+    def open_transcript(self):
+        """Create the transcript file, dropping the oldest ones beyond LOG_TRANSCRIPTS_KEPT"""
+        log_dir = self.log_transcript_path.parent
+        log_dir.mkdir(parents=True, exist_ok=True)
+        for old in sorted(log_dir.glob("installer_*.log"))[:-(self.LOG_TRANSCRIPTS_KEPT - 1) or None]:
+            old.unlink(missing_ok=True)
+        self.log_transcript = open(self.log_transcript_path, 'ab')
+        self.log_line_offsets = self.log_line_offsets[:0]
+    
+    def write_transcript(self, lines):
+        """Append rendered lines to the on-disk transcript, indexing where each starts"""
+        if not self.log_transcript_wanted:
+            self.log_preamble.extend(lines)
+            return
+        
+        try:
+            if self.log_transcript is None:
+                self.open_transcript()
+                lines = [*self.log_preamble, *lines]
+                self.log_preamble.clear()
+            offset = self.log_transcript.tell()
+            data = []
+            for line in lines:
+                self.log_line_offsets.append(offset)
+                encoded = f"{line}\n".encode('utf-8')
+                offset += len(encoded)
+                data.append(encoded)
+            self.log_transcript.write(b''.join(data))
+            self.log_transcript.flush()
+        except OSError:
+            pass
+    
+    def earlier_log_lines(self):
+        """Transcript lines before the first one in the view"""
+        shown = 0 if self.log_view_empty else self.log_text.document().blockCount()
+        return len(self.log_line_offsets) - shown
+    
+    def load_earlier_log(self):
+        """Page the LOG_PAGE_LINES transcript lines before the view back into it"""
+        self.flush_log()
+        end = self.earlier_log_lines()
+        if end <= 0:
+            return
+        start = max(0, end - self.LOG_PAGE_LINES)
+        try:
+            with open(self.log_transcript_path, 'rb') as f:
+                f.seek(self.log_line_offsets[start])
+                data = f.read(self.log_line_offsets[end] - self.log_line_offsets[start])
+        except OSError as e:
+            self.log(f"⚠️  Could not read {self.log_transcript_path}: {e}", "warning")
+            return
+        lines = data.decode('utf-8', errors='replace').split('\n')[:-1]
+        
+        # Make room, or the block limit would trim the lines just inserted
+        document = self.log_text.document()
+        self.log_text.setMaximumBlockCount(max(self.log_text.maximumBlockCount(),
+                                               document.blockCount() + len(lines)))
+        scrollbar = self.log_text.verticalScrollBar()
+        position = scrollbar.value()
+        cursor = QTextCursor(document)
+        cursor.movePosition(QTextCursor.MoveOperation.Start)
+        cursor.beginEditBlock()
+        text = '\n'.join(lines) + ('' if self.log_view_empty else '\n')
+        cursor.insertText(text, self.log_formats['info'])
+        cursor.endEditBlock()
+        self.log_view_empty = False
+        
+        # Keep the lines that were on screen in place
+        scrollbar.setValue(position + len(lines))
+        self.earlier_log_button.setEnabled(start > 0)
+    
+    def clear_log(self):
+        """Clear the log view; the transcript on disk is kept"""
+        self.flush_log()
+        self.log_text.clear()
+        self.log_text.setMaximumBlockCount(self.LOG_MAX_BLOCKS)
+        self.log_view_empty = True
+        self.earlier_log_button.setEnabled(self.earlier_log_lines() > 0)
+    
+    def open_full_log(self):
+        """Open the complete transcript in the desktop's text viewer"""
+        self.flush_log()
+        if self.log_transcript_path.exists():
+            QDesktopServices.openUrl(QUrl.fromLocalFile(str(self.log_transcript_path)))
     
     def update_progress(self, percent, message):
         """Update progress bar and step label"""
@@ -1945,7 +6890,8 @@ class AffinityInstallerGUI(QMainWindow):
             return
         
         # Clear log and reset progress
-        self.log_text.clear()
+        self.start_transcript()
+        self.clear_log()
         self.progress_bar.setValue(0)
         self.percentage_label.setText("0%")
         self.step_label.setText("Starting installation...")
@@ -2107,8 +7053,14 @@ def main():
     app = QApplication(sys.argv)
     app.setApplicationName("Affinity Installer - Unified")
     app.setStyle("Fusion")
+    STARTUP.mark("QApplication")
+    
+    if STARTUP.enabled:
+        first_paint = FirstPaintProbe(app)
+        app.installEventFilter(first_paint)
     
     window = AffinityInstallerGUI()
+    STARTUP.mark("main window (header; panels follow the first paint)")
     window.show()
     
     sys.exit(app.exec())